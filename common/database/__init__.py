@@ -1,5 +1,26 @@
 # import the PostgresDatabase class
 from .postgres_database import PostgresDatabase
 from .base_database import BaseDatabase
+from .async_base_database import AsyncBaseDatabase
+from .duckdb_database import DuckDBDatabase
+from .connection_pool import ConnectionPool, PoolTimeoutError
+from .query_metrics import QueryMetricsCollector
 
-__all__ = ["BaseDatabase", "PostgresDatabase"]
+__all__ = [
+    "BaseDatabase",
+    "PostgresDatabase",
+    "AsyncBaseDatabase",
+    "AsyncPostgresDatabase",
+    "DuckDBDatabase",
+    "ConnectionPool",
+    "PoolTimeoutError",
+    "QueryMetricsCollector",
+]
+
+
+def __getattr__(name):
+    # asyncpg is only needed by asyncio code, so it is imported on first use
+    if name == "AsyncPostgresDatabase":
+        from .async_postgres_database import AsyncPostgresDatabase
+        return AsyncPostgresDatabase
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,103 @@
+from abc import ABC, abstractmethod
+from typing import Tuple, AsyncIterator, List
+from contextlib import asynccontextmanager
+from pathlib import Path
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+class AsyncBaseDatabase(ABC):
+    """Base database for asyncio code, the async sibling of BaseDatabase"""
+
+    @asynccontextmanager
+    @abstractmethod
+    async def get_connection(self):
+        """Get database connection as async context manager.
+
+        Yields:
+            Connection: Database connection
+        """
+        yield
+
+    @abstractmethod
+    async def query_all(self, query: str, params: Tuple = ()) -> pd.DataFrame:
+        """Execute a query and return all results.
+
+        Args:
+            query: SQL query to execute
+            params: Query parameters
+
+        Returns:
+            pd.DataFrame: Query result
+        """
+        pass
+
+    @abstractmethod
+    def query_iter(self, query: str, params: Tuple = (), chunk_rows: int = 100_000) -> AsyncIterator[pd.DataFrame]:
+        """Execute a query and asynchronously yield chunks of at most chunk_rows rows.
+
+        Args:
+            query: SQL query to execute
+            params: Query parameters
+            chunk_rows: Maximum number of rows per chunk
+
+        Yields:
+            pd.DataFrame: Consecutive chunks of the query result
+        """
+        pass
+
+    async def export_parquet(self, query: str, output_path, params: Tuple = (),
+                             partition_cols: List[str] = None, chunk_rows: int = 1_000_000) -> int:
+        """Stream a query result into Parquet without holding it in memory.
+
+        Writes the chunks of query_iter, like BaseDatabase.export_parquet.
+
+        Args:
+            query: SQL query to execute
+            output_path: Parquet file, or dataset directory when partition_cols is given;
+                an existing dataset directory is replaced
+            params: Query parameters
+            partition_cols: Columns to hive-partition the output by
+            chunk_rows: Rows per chunk read from the database
+
+        Returns:
+            int: Number of rows written
+        """
+        output_path = Path(output_path)
+        if partition_cols:
+            # files of an earlier export would otherwise be read alongside the new ones
+            shutil.rmtree(output_path, ignore_errors=True)
+        total_rows = 0
+        schema = None
+        writer = None
+        i = 0
+        try:
+            async for chunk in self.query_iter(query, params, chunk_rows=chunk_rows):
+                table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                schema = table.schema
+                if partition_cols:
+                    ds.write_dataset(
+                        table, output_path, format="parquet",
+                        partitioning=partition_cols, partitioning_flavor="hive",
+                        basename_template=f"part-{i}-{{i}}.parquet",
+                        existing_data_behavior="overwrite_or_ignore",
+                    )
+                else:
+                    if writer is None:
+                        output_path.parent.mkdir(parents=True, exist_ok=True)
+                        writer = pq.ParquetWriter(output_path, schema)
+                    writer.write_table(table)
+                total_rows += table.num_rows
+                i += 1
+        finally:
+            if writer is not None:
+                writer.close()
+        return total_rows
+
+    async def close(self) -> None:
+        """Release all connections held by the database."""
+        pass
@@ -0,0 +1,176 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Tuple
+
+import asyncpg
+import pandas as pd
+
+from common.database import pg_types
+from common.database.async_base_database import AsyncBaseDatabase
+from common.database.query_metrics import QueryMetricsCollector, Stopwatch, fingerprint
+from common.database.sql_utils import numbered_placeholders, describe_params
+from common.utils.logging import get_logger
+
+# Initialize logger
+logger = get_logger(__name__)
+
+
+async def _init_connection(conn) -> None:
+    """Decode NUMERIC and temporal columns as text, matching PostgresDatabase's typecasters."""
+    await conn.set_type_codec("numeric", schema="pg_catalog", encoder=str, decoder=float, format="text")
+    for type_name in ("date", "timestamp", "timestamptz"):
+        await conn.set_type_codec(type_name, schema="pg_catalog", encoder=str, decoder=str, format="text")
+
+
+class AsyncPostgresDatabase(AsyncBaseDatabase):
+    """Asyncio Postgres database on an asyncpg connection pool.
+
+    Queries use the same ``%s`` placeholders as PostgresDatabase and return the
+    same typed DataFrames. At most ``max_concurrency`` queries run at a time, so
+    hundreds of coroutines can be fanned out without exhausting the server.
+    asyncpg prepares and caches every statement per connection.
+    """
+
+    def __init__(self, dbname: str, user: str, password: str = "", host: str = "localhost", port: int = 5432,
+                 min_pool_size: int = 1, max_pool_size: int = 10, max_concurrency: int = None,
+                 metrics: QueryMetricsCollector = None):
+        """Initialize database with configuration. The pool is opened on first use.
+
+        Args:
+            dbname: Database name
+            user: Database user
+            password: Password, ignored for localhost
+            host: Database host
+            port: Database port
+            min_pool_size: Connections opened when the pool is created
+            max_pool_size: Maximum number of pooled connections
+            max_concurrency: Maximum number of queries in flight, defaults to max_pool_size
+            metrics: Collector for per-query timings and sizes
+        """
+        self.metrics = metrics or QueryMetricsCollector()
+        if host == "localhost":
+            # connect over the local socket like psycopg2 does without a host
+            self.config = dict(database=dbname, user=user)
+        else:
+            self.config = dict(database=dbname, user=user, password=password, host=host, port=port)
+        self.min_pool_size = min_pool_size
+        self.max_pool_size = max_pool_size
+        self.max_concurrency = max_concurrency or max_pool_size
+        self.pool = None
+        self._pool_lock = None
+        self._limiter = None
+
+    async def _get_pool(self):
+        if self.pool is None:
+            if self._pool_lock is None:
+                self._pool_lock = asyncio.Lock()
+                self._limiter = asyncio.Semaphore(self.max_concurrency)
+            async with self._pool_lock:
+                if self.pool is None:
+                    self.pool = await asyncpg.create_pool(
+                        min_size=self.min_pool_size,
+                        max_size=self.max_pool_size,
+                        init=_init_connection,
+                        **self.config,
+                    )
+                    logger.info(f"Successfully connected to database {self.config['database']}")
+        return self.pool
+
+    @asynccontextmanager
+    async def get_connection(self):
+        """Acquire a pooled connection, waiting for the concurrency limiter first.
+
+        Yields:
+            asyncpg.Connection: Database connection
+        """
+        pool = await self._get_pool()
+        async with self._limiter:
+            async with pool.acquire() as conn:
+                yield conn
+
+    @staticmethod
+    def _to_frame(rows, attributes, dtypes: Dict = None) -> pd.DataFrame:
+        description = [(attr.name, attr.type.oid) for attr in attributes]
+        df = pd.DataFrame([tuple(row) for row in rows], columns=[name for name, _ in description])
+        return pg_types.decode_frame(df, description, dtypes)
+
+    def _record(self, query: str, execute_s: float, fetch_s: float, build_s: float, rows: int, nbytes: int) -> None:
+        metrics = self.metrics.record(query, execute_s, fetch_s, build_s, rows, nbytes)
+        logger.info(
+            f"Query executed successfully! Total rows: {rows} in {metrics.total_s:.3f}s",
+            extra={"extra": {k: v for k, v in metrics.to_dict().items() if k not in ("query", "explain")}},
+        )
+
+    async def query_all(self, query: str, params: Tuple = (), dtypes: Dict = None) -> pd.DataFrame:
+        """Execute a query and return all results.
+
+        Args:
+            query: SQL query to execute, with %s placeholders for params
+            params: Query parameters; lists are sent as Postgres arrays
+            dtypes: Column name to dtype overrides for this query
+
+        Returns:
+            pd.DataFrame: Query result with typed columns
+        """
+        numbered, _ = numbered_placeholders(query)
+        async with self.get_connection() as conn:
+            logger.debug(f"Executing query {fingerprint(query)} with params {describe_params(params)}:\n{query}")
+            stopwatch = Stopwatch()
+            statement = await conn.prepare(numbered)
+            # asyncpg executes and transfers the whole result in one call, like
+            # psycopg2's client-side execute, so both count as execution
+            rows = await statement.fetch(*params)
+            execute_s = stopwatch.lap()
+            df = self._to_frame(rows, statement.get_attributes(), dtypes)
+            build_s = stopwatch.lap()
+            self._record(query, execute_s, 0.0, build_s, len(df), int(df.memory_usage(index=False).sum()))
+            return df
+
+    async def query_iter(self, query: str, params: Tuple = (), chunk_rows: int = 100_000,
+                         dtypes: Dict = None) -> AsyncIterator[pd.DataFrame]:
+        """Execute a query on a server-side cursor and asynchronously yield bounded-size chunks.
+
+        Args:
+            query: SQL query to execute, with %s placeholders for params
+            params: Query parameters
+            chunk_rows: Maximum number of rows per chunk
+            dtypes: Column name to dtype overrides applied to every chunk
+
+        Yields:
+            pd.DataFrame: Consecutive chunks of the query result
+        """
+        numbered, _ = numbered_placeholders(query)
+        async with self.get_connection() as conn:
+            logger.debug(f"Executing streaming query {fingerprint(query)} with params {describe_params(params)}:\n{query}")
+            # cursors only live inside a transaction
+            async with conn.transaction():
+                stopwatch = Stopwatch()
+                statement = await conn.prepare(numbered)
+                cursor = await statement.cursor(*params)
+                attributes = statement.get_attributes()
+                execute_s = stopwatch.lap()
+                fetch_s = build_s = 0.0
+                total_rows = total_bytes = 0
+                n_chunks = 0
+                while True:
+                    rows = await cursor.fetch(chunk_rows)
+                    fetch_s += stopwatch.lap()
+                    if not rows:
+                        break
+                    total_rows += len(rows)
+                    n_chunks += 1
+                    chunk = self._to_frame(rows, attributes, dtypes)
+                    total_bytes += int(chunk.memory_usage(index=False).sum())
+                    build_s += stopwatch.lap()
+                    yield chunk
+                    # time spent by the consumer is not attributed to the query
+                    stopwatch.lap()
+            logger.info(f"Streaming query finished in {n_chunks} chunks")
+            self._record(query, execute_s, fetch_s, build_s, total_rows, total_bytes)
+
+    async def close(self) -> None:
+        """Close the connection pool."""
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+            logger.info("Connection pool closed")
@@ -1,6 +1,12 @@
 from abc import ABC, abstractmethod
-from typing import Tuple, List
+from typing import Tuple, List, Iterator
 from contextlib import contextmanager
+from pathlib import Path
+import shutil
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 
 class BaseDatabase(ABC):
     """Base database"""
@@ -29,3 +35,67 @@ class BaseDatabase(ABC):
         """
         pass
 
+    def query_iter(self, query: str, params: Tuple = (), chunk_rows: int = 100_000) -> Iterator:
+        """Execute a query and yield the results in chunks of at most chunk_rows rows.
+
+        The default implementation materializes the full result with query_all and
+        slices it; backends that can stream should override it.
+
+        Args:
+            query: SQL query to execute
+            params: Query parameters
+            chunk_rows: Maximum number of rows per chunk
+
+        Yields:
+            pd.DataFrame: Consecutive chunks of the query result
+        """
+        result = self.query_all(query, params)
+        for start in range(0, len(result), chunk_rows):
+            yield result.iloc[start:start + chunk_rows].reset_index(drop=True)
+
+    def export_parquet(self, query: str, output_path, params: Tuple = (),
+                       partition_cols: List[str] = None, chunk_rows: int = 1_000_000) -> int:
+        """Stream a query result into Parquet without holding it in memory.
+
+        The default implementation writes the chunks of query_iter; backends with
+        a native bulk export path should override it.
+
+        Args:
+            query: SQL query to execute
+            output_path: Parquet file, or dataset directory when partition_cols is given;
+                an existing dataset directory is replaced
+            params: Query parameters
+            partition_cols: Columns to hive-partition the output by
+            chunk_rows: Rows per chunk read from the database
+
+        Returns:
+            int: Number of rows written
+        """
+        output_path = Path(output_path)
+        if partition_cols:
+            # files of an earlier export would otherwise be read alongside the new ones
+            shutil.rmtree(output_path, ignore_errors=True)
+        total_rows = 0
+        schema = None
+        writer = None
+        try:
+            for i, chunk in enumerate(self.query_iter(query, params, chunk_rows=chunk_rows)):
+                table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                schema = table.schema
+                if partition_cols:
+                    ds.write_dataset(
+                        table, output_path, format="parquet",
+                        partitioning=partition_cols, partitioning_flavor="hive",
+                        basename_template=f"part-{i}-{{i}}.parquet",
+                        existing_data_behavior="overwrite_or_ignore",
+                    )
+                else:
+                    if writer is None:
+                        output_path.parent.mkdir(parents=True, exist_ok=True)
+                        writer = pq.ParquetWriter(output_path, schema)
+                    writer.write_table(table)
+                total_rows += table.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+        return total_rows
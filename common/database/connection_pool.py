@@ -0,0 +1,241 @@
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List
+
+from common.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be checked out before the timeout."""
+
+
+@dataclass
+class PoolStats:
+    """Counters collected by a ConnectionPool."""
+
+    checkouts: int = 0
+    wait_time: float = 0.0
+    max_wait_time: float = 0.0
+    connections_created: int = 0
+    connections_closed: int = 0
+    health_check_failures: int = 0
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class ConnectionPool:
+    """Thread-safe pool of DB-API connections.
+
+    Connections are created lazily up to ``max_size``; callers block when the pool
+    is exhausted until a connection is returned or ``timeout`` seconds pass.
+    Connections that sat idle for longer than ``health_check_interval`` seconds are
+    pinged with ``SELECT 1`` before being handed out again.
+    """
+
+    def __init__(
+        self,
+        connect: Callable,
+        min_size: int = 1,
+        max_size: int = 5,
+        timeout: float = 30.0,
+        health_check_interval: float = 30.0,
+    ):
+        """Initialize the pool and open ``min_size`` connections.
+
+        Args:
+            connect: Zero-argument callable returning a new connection
+            min_size: Number of connections opened up front
+            max_size: Maximum number of connections open at the same time
+            timeout: Seconds to wait for a free connection before giving up
+            health_check_interval: Idle seconds after which a connection is pinged
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("pool sizes must satisfy 0 <= min_size <= max_size, max_size >= 1")
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._cond = threading.Condition()
+        self._idle: List = []  # (connection, last_used) pairs
+        self._size = 0
+        self._closed = False
+        self._stats = PoolStats()
+        self._on_discard: List[Callable] = []
+
+        try:
+            for _ in range(min_size):
+                conn = self._create()
+                self._idle.append((conn, time.monotonic()))
+        except Exception:
+            # do not leak the connections opened before the failing one
+            self.close()
+            raise
+
+    def _create(self):
+        conn = self._connect()
+        with self._cond:
+            self._size += 1
+            self._stats.connections_created += 1
+        return conn
+
+    def _discard(self, conn) -> None:
+        for callback in self._on_discard:
+            callback(conn)
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats.connections_closed += 1
+            self._cond.notify()
+
+    def add_discard_callback(self, callback: Callable) -> None:
+        """Register a callable invoked with every connection the pool closes."""
+        self._on_discard.append(callback)
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        if getattr(conn, "closed", 0):
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"Discarding pooled connection that failed health check: {e}")
+            return False
+
+    def getconn(self):
+        """Check out a connection, blocking until one is available.
+
+        Returns:
+            Connection: A healthy database connection
+
+        Raises:
+            PoolTimeoutError: If no connection became available within the timeout
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            conn = None
+            create = False
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("connection pool is closed")
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(
+                            f"no connection available after {self.timeout:.1f}s "
+                            f"(max_size={self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+                    if self._closed:
+                        raise RuntimeError("connection pool is closed")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                else:
+                    create = True
+                    # reserve the slot before connecting outside the lock
+                    self._size += 1
+
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats.connections_created += 1
+            elif not self._is_healthy(conn, last_used):
+                with self._cond:
+                    self._stats.health_check_failures += 1
+                self._discard(conn)
+                continue
+
+            waited = time.monotonic() - start
+            with self._cond:
+                self._stats.checkouts += 1
+                self._stats.wait_time += waited
+                self._stats.max_wait_time = max(self._stats.max_wait_time, waited)
+            return conn
+
+    def putconn(self, conn, discard: bool = False) -> None:
+        """Return a connection to the pool.
+
+        Any open transaction is rolled back so the next user starts clean.
+
+        Args:
+            conn: Connection previously obtained from ``getconn``
+            discard: Close the connection instead of keeping it for reuse
+        """
+        if not discard and not getattr(conn, "closed", 0):
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        else:
+            discard = True
+
+        with self._cond:
+            keep = not discard and not self._closed
+            if keep:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+        if not keep:
+            self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection as context manager.
+
+        Yields:
+            Connection: Pooled database connection
+        """
+        conn = self.getconn()
+        failed = False
+        try:
+            yield conn
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            # a connection that errored mid-transaction is still reusable after
+            # rollback, only a closed one has to go
+            self.putconn(conn, discard=failed and bool(getattr(conn, "closed", 0)))
+
+    def stats(self) -> Dict:
+        """Return a snapshot of the pool counters.
+
+        Returns:
+            dict: Counters plus the current number of open and idle connections
+        """
+        with self._cond:
+            snapshot = self._stats.to_dict()
+            snapshot["open_connections"] = self._size
+            snapshot["idle_connections"] = len(self._idle)
+        return snapshot
+
+    def close(self) -> None:
+        """Close all idle connections and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
@@ -1,22 +1,260 @@
-from datetime import date, timedelta
+import asyncio
+import re
+from typing import Dict
 
 from common.utils.logging import get_logger
 from common.database.base_database import BaseDatabase
+from common.database.async_base_database import AsyncBaseDatabase
+from common.database.sharding import shard_ids, shard_date_range, run_sharded
+from common.database.query_cache import QueryCache
+from common.database.query_metrics import labelled
+from common.database.div_adjustment import apply_div_adj_factors
 import pandas as pd
 logger = get_logger(__name__)
 
 
+def _int_list(values) -> list:
+    """Convert an iterable of ids (list, numpy array, Series) to plain ints for array binding."""
+    return [int(value) for value in values]
+
+
+_IDENTIFIER = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+def _select_list(columns, expressions: Dict[str, str], passthrough: str = None) -> str:
+    """Build the SELECT list of a query, pruned to the requested columns.
+
+    Args:
+        columns: Requested output columns, None for all of them
+        expressions: Output column -> SELECT item, in default order; the key "*" marks
+            a wildcard item that is only part of the default list
+        passthrough: Table alias whose other columns may be requested by name, e.g. "EP"
+
+    Returns:
+        str: Comma separated SELECT items
+    """
+    if columns is None:
+        return "\n            , ".join(expressions.values())
+    items = []
+    for column in dict.fromkeys(str(column).lower() for column in columns):
+        if column in expressions and column != "*":
+            items.append(expressions[column])
+        elif passthrough is not None and _IDENTIFIER.match(column):
+            items.append(f"{passthrough}.{column}")
+        else:
+            available = [name for name in expressions if name != "*"]
+            raise ValueError(f"Unknown column {column!r}, available columns: {available}")
+    if not items:
+        raise ValueError("columns must not be empty")
+    return "\n            , ".join(items)
+
+
+def _wants(columns, *names) -> bool:
+    """Whether any of names is part of the projection (always true without one)."""
+    return columns is None or any(str(column).lower() in names for column in columns)
+
+
+_MARKET_CAP_COLUMNS = {
+    "companyid": "ciqmarketcap.companyid",
+    "marketcap": "ciqmarketcap.marketcap",
+    "pricingdate": "ciqmarketcap.pricingdate",
+    "usdmarketcap": "round(ciqmarketcap.marketcap / ciqexchangerate.priceclose, 2) as usdmarketcap",
+    "companyname": "ciqcompany.companyname",
+    "tickersymbol": "ciqtradingitem.tickersymbol",
+    "currency": "ciqcurrency.isocode as currency",
+    "exchange": "ciqexchange.exchangesymbol as exchange",
+    "country": "ciqcountrygeo.isocountry2 as country",
+}
+
+_RAW_PRICING_COLUMNS = {
+    "companyid": "c.companyid",
+    "tradingitemid": "ti.tradingItemId",
+    "currencyid": "ti.currencyid",
+    "pricedate": "mi.priceDate",
+    "priceclose": "mi.priceClose",
+    "priceopen": "mi.priceOpen",
+    "pricehigh": "mi.priceHigh",
+    "pricelow": "mi.priceLow",
+    "volume": "mi.volume",
+    "vwap": "mi.vwap",
+}
+
+_PRICING_COLUMNS = {
+    **_RAW_PRICING_COLUMNS,
+    "divadjclose": "(mi.priceClose*COALESCE(daf.divAdjFactor,1)) divAdjClose",
+    "divadjfactor": "COALESCE(daf.divAdjFactor,1) as divAdjFactor",
+}
+
+_AFL_FACTOR_COLUMNS = {
+    "factorvalue": "dly.factorvalue",
+    "factorid": "dly.factorid",
+    "objectid": "gvk.objectId",
+    "asofdate": "dly.asofdate",
+    "securityid": "d.securityid",
+    "gvkey": "gvk.gvkey",
+    "iid": "gvk.iid",
+    "companyid": "c.companyid",
+}
+
+# other ciqEstimatePeriod columns can be requested by name
+_ESTIMATE_DIFF_COLUMNS = {
+    "*": "EP.*",
+    "dataitemid": "ED.dataitemid",
+    "currencyid": "ED.currencyId",
+    "dataitemvalue": "ED.dataItemValue",
+    "asofdate": "ED.asofdate",
+    "tradingitemid": "EC.tradingitemid",
+    "scaleid": "ED.scaleid",
+}
+
+_ACT_Q_COLUMNS = {
+    "*": "EP.*",
+    "dataitemid": "ED.dataitemid",
+    "currencyid": "ED.currencyId",
+    "dataitemvalue": "ED.dataItemValue",
+    "effectivedate": "ED.effectiveDate",
+    "todate": "ED.toDate",
+    "tradingitemid": "EC.tradingitemid",
+    "estimatescaleid": "ED.estimatescaleid",
+}
+
+
 class TaskManagerRepository:
     """Repository for handling task operations with api."""
 
-    def __init__(self, database: BaseDatabase):
+    def __init__(self, database: BaseDatabase, shard_size: int = None, shard_date_freq: str = None,
+                 max_workers: int = 4, cache: QueryCache = None):
         """Initialize repository with database connection.
 
+        With shard_size (and optionally shard_date_freq) set, pulls over a list of
+        company ids are split into id x date-window shards that run concurrently.
+        Use a pooled PostgresDatabase with max_pool_size >= max_workers so the
+        shards do not queue for connections.
+
         Args:
             database: Database instance for data access
+            shard_size: Maximum company ids per shard, None disables sharding
+            shard_date_freq: pandas offset alias splitting the date range, e.g. 'YS'
+            max_workers: Maximum number of shards running at the same time
+            cache: Optional QueryCache; results of non-streaming pulls are looked up
+                there before going to the database
         """
         self.database = database
+        self.shard_size = shard_size
+        self.shard_date_freq = shard_date_freq
+        self.max_workers = max_workers
+        self.cache = cache
+
+    def _cached(self, query: str, params: tuple, compute, use_cache: bool = True):
+        """Return compute() through the cache, keyed by the query and its parameters."""
+        if self.cache is None or not use_cache:
+            return compute()
+        return self.cache.get_or_compute(query, params, compute)
+
+    def _div_adjust(self, prices: pd.DataFrame, factors: pd.DataFrame, columns=None) -> pd.DataFrame:
+        """Apply dividend adjustment factor intervals to raw prices, then project to columns."""
+        adjusted = apply_div_adj_factors(prices, factors)
+        return adjusted if columns is None else adjusted[[str(c).lower() for c in dict.fromkeys(columns)]]
+
+    def _split_by_dataitem(self, data: pd.DataFrame, dataitem_map: Dict[str, int]) -> Dict[str, pd.DataFrame]:
+        """Split a multi-dataitem result into one frame per dataitem key, keeping row order."""
+        groups = dict(list(data.groupby("dataitemid", sort=False)))
+        return {
+            key: groups[dataitemid].reset_index(drop=True) if dataitemid in groups else data.iloc[:0].copy()
+            for key, dataitemid in dataitem_map.items()
+        }
+
+    def _fetch(self, query: str, params: tuple = (), chunk_rows: int = None, export_path=None, partition_cols=None,
+               use_cache: bool = True):
+        """Run a query in one go, stream it when chunk_rows is given,
+        or bulk export it to Parquet when export_path is given.
+
+        Args:
+            query: SQL query to execute, with %s placeholders
+            params: Query parameters bound to the placeholders
+            chunk_rows: If set, return an iterator of DataFrames of at most this many rows
+            export_path: If set, write the result to this Parquet file or dataset directory
+            partition_cols: Columns to hive-partition the export by
+            use_cache: False to query the database even if the repository has a cache
+
+        Returns:
+            pd.DataFrame, Iterator[pd.DataFrame] or int: Query result, or number of rows exported
+        """
+        if export_path is not None:
+            return self.database.export_parquet(query, export_path, params, partition_cols=partition_cols)
+        if chunk_rows:
+            return self.database.query_iter(query, params, chunk_rows=chunk_rows)
+        return self._cached(query, params, lambda: self.database.query_all(query, params), use_cache)
+
+    def _shard_plan(self, ls_ids, start=None, end=None) -> list:
+        """Return the (ids, (window_start, window_end)) shards of a pull."""
+        if start is None:
+            windows = [(None, None)]
+        else:
+            windows = shard_date_range(start, end, self.shard_date_freq)
+        return [(ids, window) for ids in shard_ids(ls_ids, self.shard_size) for window in windows]
+
+    @staticmethod
+    def _restore_order(df: pd.DataFrame, order_by, n_shards: int) -> pd.DataFrame:
+        """Re-apply the query's ORDER BY after concatenating shard results."""
+        if order_by is not None and n_shards > 1:
+            column = df.columns[order_by] if isinstance(order_by, int) else order_by
+            # a projection may have dropped the ordering column, then shards stay in shard order
+            if column in df.columns:
+                df = df.sort_values(column, kind="stable", ignore_index=True)
+        return df
 
+    def _fetch_sharded(self, query: str, make_params, ls_ids, start=None, end=None, order_by=None,
+                       chunk_rows: int = None, export_path=None, partition_cols=None, use_cache: bool = True):
+        """Run a query over company ids, sharded by ids and date windows when enabled.
+
+        Streaming and export requests are not sharded and run as a single query.
+
+        Args:
+            query: SQL query to execute, with %s placeholders
+            make_params: Callable (ids, start, end) -> params tuple for one shard
+            ls_ids: Company ids to query
+            start: First date of the range, None if the query has no range
+            end: Last date of the range
+            order_by: Column name (or position) to restore the query's ORDER BY after concatenation
+            chunk_rows: If set, return an iterator of DataFrames (unsharded)
+            export_path: If set, bulk export to Parquet (unsharded)
+            partition_cols: Columns to hive-partition the export by
+            use_cache: False to query the database even if the repository has a cache
+
+        Returns:
+            pd.DataFrame, Iterator[pd.DataFrame] or int: Query result, or number of rows exported
+        """
+        if not self.shard_size or chunk_rows or export_path is not None:
+            return self._fetch(query, make_params(_int_list(ls_ids), start, end), chunk_rows, export_path, partition_cols,
+                               use_cache)
+
+        shards = self._shard_plan(ls_ids, start, end)
+
+        def _fetch_shard(shard):
+            ids, (window_start, window_end) = shard
+            return self.database.query_all(query, make_params(ids, window_start, window_end))
+
+        def _fetch_all():
+            df = run_sharded(_fetch_shard, shards, self.max_workers)
+            return self._restore_order(df, order_by, len(shards))
+
+        # cache the assembled result under the unsharded parameters
+        return self._cached(query, make_params(_int_list(ls_ids), start, end), _fetch_all, use_cache)
+
+    @staticmethod
+    def _market_cap_lookup_joins(columns, all_countries: bool) -> str:
+        """Joins of the market cap queries that only provide output columns or the country filter."""
+        joins = []
+        if _wants(columns, "currency"):
+            joins.append("JOIN\n                ciqcurrency on ciqtradingitem.currencyid = ciqcurrency.currencyid")
+        if _wants(columns, "exchange"):
+            joins.append("JOIN\n                ciqexchange on ciqtradingitem.exchangeid = ciqexchange.exchangeid")
+        if _wants(columns, "country") or not all_countries:
+            joins.append("JOIN \n                ciqcountrygeo on ciqcompany.countryid = ciqcountrygeo.countryid")
+        return "\n            ".join(joins)
+
+    @labelled
     def test_connection_query(self) -> pd.DataFrame:
         """Test the connection to the database.
 
@@ -25,7 +263,9 @@ class TaskManagerRepository:
         """
         return self.database.query_all("SELECT * from ciqcompany limit 10;")
 
-    def query_global_market_cap(self, asofdate: str, mktcap_thres: float, country: str = "US", allow_fuzzy: bool = False) -> pd.DataFrame:
+    @labelled
+    def query_global_market_cap(self, asofdate: str, mktcap_thres: float, country: str = "US", allow_fuzzy: bool = False,
+                                columns=None) -> pd.DataFrame:
         """Query the global market cap that is above the threshold and at a given date.
 
         we do not really need the fuzzy, as the marketcap is pretty dense over vacations and holidays
@@ -35,6 +275,8 @@ class TaskManagerRepository:
             mktcap_thres: The market cap threshold (in million USD)
             country: The country code to filter companies (default: "US")
             allow_fuzzy: If True, look for data within 5 days of asofdate if exact date not available
+            columns: Subset of the output columns to select; the currency, exchange and
+                country lookups are only joined when needed
         Returns:
             pd.DataFrame: A dataframe with the company ID and market cap
         """
@@ -48,17 +290,9 @@ class TaskManagerRepository:
             all_countries = False
 
         # Common SELECT fields and table joins for both scenarios
-        query = """
+        query = f"""
             SELECT 
-                ciqmarketcap.companyid,
-                ciqmarketcap.marketcap,
-                ciqmarketcap.pricingdate,
-                round(ciqmarketcap.marketcap / ciqexchangerate.priceclose, 2) as usdmarketcap,
-                ciqcompany.companyname,
-                ciqtradingitem.tickersymbol,
-                ciqcurrency.isocode as currency,
-                ciqexchange.exchangesymbol as exchange,
-                ciqcountrygeo.isocountry2 as country
+            {_select_list(columns, _MARKET_CAP_COLUMNS)}
             FROM
                 ciqmarketcap
             JOIN
@@ -69,42 +303,41 @@ class TaskManagerRepository:
                 ciqtradingitem on ciqsecurity.securityid = ciqtradingitem.securityid
             JOIN 
                 ciqexchangerate on ciqtradingitem.currencyid = ciqexchangerate.currencyid
-            JOIN
-                ciqcurrency on ciqtradingitem.currencyid = ciqcurrency.currencyid
-            JOIN
-                ciqexchange on ciqtradingitem.exchangeid = ciqexchange.exchangeid
-            JOIN 
-                ciqcountrygeo on ciqcompany.countryid = ciqcountrygeo.countryid
+            {self._market_cap_lookup_joins(columns, all_countries)}
             WHERE
         """
 
+        params = []
         # Date conditions differ based on allow_fuzzy
         if allow_fuzzy:
-            query += f"""
-                ciqmarketcap.pricingdate BETWEEN DATE('{asofdate}') - INTERVAL '3 days' AND '{asofdate}'
+            query += """
+                ciqmarketcap.pricingdate BETWEEN %s::date - INTERVAL '3 days' AND %s::date
             """
+            params += [asofdate, asofdate]
         else:
-            query += f"""
-                ciqmarketcap.pricingdate = '{asofdate}'
+            query += """
+                ciqmarketcap.pricingdate = %s::date
             """
+            params.append(asofdate)
 
         # add country filter if not all countries
         if all_countries:
             pass
         else:
-            query += f"""
+            query += """
                 AND 
-                    ciqcountrygeo.isocountry2 = '{country}'
+                    ciqcountrygeo.isocountry2 = %s
             """
+            params.append(country)
 
         # Common WHERE conditions for both scenarios
-        query += f"""
+        query += """
             AND
-                ciqexchangerate.pricedate = '{asofdate}'
+                ciqexchangerate.pricedate = %s::date
             AND
                 ciqexchangerate.latestsnapflag = 1
             AND
-                ciqmarketcap.marketcap / ciqexchangerate.priceclose >= {mktcap_thres}
+                ciqmarketcap.marketcap / ciqexchangerate.priceclose >= %s
             AND
                 ciqcompany.companytypeid in (4, 5)
             AND 
@@ -112,13 +345,94 @@ class TaskManagerRepository:
             AND 
                 ciqtradingitem.primaryflag = 1
             ORDER BY
-                ciqmarketcap.pricingdate DESC, usdmarketcap DESC
+                ciqmarketcap.pricingdate DESC, round(ciqmarketcap.marketcap / ciqexchangerate.priceclose, 2) DESC
         """
+        params += [asofdate, mktcap_thres]
 
-        return self.database.query_all(query)
+        return self.database.query_all(query, tuple(params))
 
+    @labelled
+    def query_global_market_cap_multi(self, asofdates, mktcap_thres: float, country: str = "US", allow_fuzzy: bool = False,
+                                      columns=None) -> pd.DataFrame:
+        """Query the global market cap above the threshold at several dates in one round trip.
 
-    def get_hist_miadj_pricing(self,start, end, ls_ids):
+        Same semantics as query_global_market_cap, evaluated for every asofdate in a
+        single set-based query: the dates are unnested into a derived table that
+        drives the market cap and exchange rate joins, so the tables are scanned
+        once instead of once per date.
+
+        Args:
+            asofdates: The dates to query the market cap for (str or date-like)
+            mktcap_thres: The market cap threshold (in million USD)
+            country: The country code to filter companies (default: "US"), "Global" for all
+            allow_fuzzy: If True, look for data within 3 days before each asofdate
+            columns: Subset of the query_global_market_cap columns to select besides asofdate
+        Returns:
+            pd.DataFrame: Long dataframe of query_global_market_cap results with an
+                asofdate column, ordered by asofdate
+        """
+        asofdates = list(dict.fromkeys(pd.Timestamp(d).date().isoformat() for d in asofdates))
+        if not asofdates:
+            raise ValueError("asofdates must not be empty")
+
+        if allow_fuzzy:
+            date_condition = "ciqmarketcap.pricingdate BETWEEN asofdates.asofdate - INTERVAL '3 days' AND asofdates.asofdate"
+        else:
+            date_condition = "ciqmarketcap.pricingdate = asofdates.asofdate"
+
+        query = f"""
+            WITH asofdates AS (
+                SELECT unnest(%s::date[]) AS asofdate
+            )
+            SELECT 
+            asofdates.asofdate
+            , {_select_list(columns, _MARKET_CAP_COLUMNS)}
+            FROM
+                asofdates
+            JOIN
+                ciqmarketcap ON {date_condition}
+            JOIN
+                ciqcompany ON ciqmarketcap.companyID = ciqcompany.companyID
+            JOIN
+                ciqsecurity ON ciqmarketcap.companyID = ciqsecurity.companyID
+            JOIN 
+                ciqtradingitem on ciqsecurity.securityid = ciqtradingitem.securityid
+            JOIN 
+                ciqexchangerate on ciqtradingitem.currencyid = ciqexchangerate.currencyid
+                    AND ciqexchangerate.pricedate = asofdates.asofdate
+            {self._market_cap_lookup_joins(columns, country == "Global")}
+            WHERE
+                ciqexchangerate.latestsnapflag = 1
+            AND
+                ciqmarketcap.marketcap / ciqexchangerate.priceclose >= %s
+            AND
+                ciqcompany.companytypeid in (4, 5)
+            AND 
+                ciqsecurity.primaryflag = 1
+            AND 
+                ciqtradingitem.primaryflag = 1
+        """
+        params = [asofdates, mktcap_thres]
+
+        # add country filter if not all countries
+        if country != "Global":
+            query += """
+            AND
+                ciqcountrygeo.isocountry2 = %s
+            """
+            params.append(country)
+
+        query += """
+            ORDER BY
+                asofdates.asofdate, ciqmarketcap.pricingdate DESC, round(ciqmarketcap.marketcap / ciqexchangerate.priceclose, 2) DESC
+        """
+
+        return self.database.query_all(query, tuple(params))
+
+
+    @labelled
+    def get_hist_miadj_pricing(self,start, end, ls_ids, chunk_rows=None, export_path=None, partition_cols=None,
+                               local_div_adjust=False, columns=None):
         """
         Get a historical price data given a series of company ids, using miadjusted table 
         instead of ciqpeequity table 
@@ -127,67 +441,185 @@ class TaskManagerRepository:
             start (str): '2020-05-05'
             end (str): '2020-06-06'
             ls_ids (list): list of companyid   [24937, ]
-            connection (None, optional): Description
+            chunk_rows (int, optional): stream the result as DataFrames of at most this many rows
+            export_path (str, optional): bulk export the result to this Parquet file / dataset directory
+            partition_cols (list, optional): columns to hive-partition the export by, e.g. ['companyid']
+            local_div_adjust (bool, optional): fetch the raw prices and the dividend adjustment
+                factor intervals as two separately cached queries and adjust on the client,
+                instead of range-joining ciqPriceEquityDivAdjFactor on the server
+            columns (list, optional): subset of the output columns to select, e.g. ['pricedate', 'divadjclose'];
+                the dividend adjustment factors are only joined when divadjclose or divadjfactor is requested
         
         Returns:
-            sample ouput: 
-            companyid  tradingitemid   pricedate      priceclose       priceopen       pricehigh        pricelow                 volume       vwap               divadjclose  divadjfactor
-        0       24937        2590360  2020-05-05  74.39000000000  73.76500000000  75.25000000000  73.61500000000  147751200.00000000000  74.637500  73.273994703436000000000  0.9849979124
-        1       24937        2590360  2020-05-06  75.15750000000  75.11500000000  75.81000000000  74.71750000000  142333760.00000000000  75.437500  74.029980601203000000000  0.9849979124
-        2       24937        2590360  2020-05-07  75.93500000000  75.80500000000  76.29250000000  75.49250000000  115215040.00000000000  75.927500  74.795816478094000000000  0.9849979124
-        3       24937        2590360  2020-05-08  77.53250000000  76.41000000000  77.58750000000  76.07250000000  134047960.00000000000  76.947500  76.576081355087250000000  0.9876642873
+            sample ouput (numeric columns are float64, pricedate is datetime64): 
+            companyid  tradingitemid   pricedate  priceclose  priceopen  pricehigh  pricelow       volume     vwap  divadjclose  divadjfactor
+        0       24937        2590360  2020-05-05    74.39000   73.76500   75.25000  73.61500  147751200.0  74.6375    73.273995      0.984998
+        1       24937        2590360  2020-05-06    75.15750   75.11500   75.81000  74.71750  142333760.0  75.4375    74.029981      0.984998
+        2       24937        2590360  2020-05-07    75.93500   75.80500   76.29250  75.49250  115215040.0  75.9275    74.795816      0.984998
+        3       24937        2590360  2020-05-08    77.53250   76.41000   77.58750  76.07250  134047960.0  76.9475    76.576081      0.987664
 
         """
-        startstr = pd.to_datetime(start)
-        endstr = pd.to_datetime(end)
+        if local_div_adjust:
+            if chunk_rows or export_path is not None:
+                raise ValueError("local_div_adjust cannot be combined with chunk_rows or export_path")
+            raw_columns = None
+            if columns is not None:
+                raw_columns = [c for c in columns if str(c).lower() not in ("divadjclose", "divadjfactor")]
+                raw_columns += ["tradingitemid", "pricedate", "priceclose"]
+            prices = self.get_miadj_pricing_raw(start, end, ls_ids, columns=raw_columns)
+            factors = self.get_div_adj_factors(start, end, ls_ids)
+            return self._div_adjust(prices, factors, columns)
+
+        startstr = pd.to_datetime(start).date()
+        endstr = pd.to_datetime(end).date()
         
+        div_adj_join = ""
+        if _wants(columns, "divadjclose", "divadjfactor"):
+            div_adj_join = """
+        left join ciqPriceEquityDivAdjFactor daf on mi.tradingItemId=daf.tradingItemId
+        and daf.fromDate<=mi.priceDate --Find dividend adjustment factor on pricing date
+        and (daf.toDate is null or daf.toDate>=mi.priceDate)
+        """
+
         query = f"""
         SELECT 
-        c.companyid
-        ,ti.tradingItemId
-        ,ti.currencyid
-        ,mi.priceDate
-        ,mi.priceClose
-        ,mi.priceOpen
-        ,mi.priceHigh
-        ,mi.priceLow
-        ,mi.volume
-        ,mi.vwap
-
-        ,(mi.priceClose*COALESCE(daf.divAdjFactor,1)) divAdjClose
-        ,COALESCE(daf.divAdjFactor,1) as divAdjFactor
+            {_select_list(columns, _PRICING_COLUMNS)}
 
         FROM ciqCompany c
         JOIN ciqSecurity s on s.companyid = c.companyid
         JOIN ciqTradingItem ti on ti.securityId=s.securityId
         JOIN miadjprice mi on mi.tradingItemId=ti.tradingItemId
+        {div_adj_join}
+        WHERE c.companyId = ANY(%s)
+        AND s.primaryflag=1 -- empirically makes sense to have these primary flag, lost about 0.03%% data
+        AND ti.primaryflag=1
+        AND mi.priceDate >= %s
+        AND mi.priceDate <= %s
+        ORDER BY mi.priceDate asc
+        """
+        df = self._fetch_sharded(
+            query, lambda ids, s, e: (ids, s, e), ls_ids, startstr, endstr, order_by="pricedate",
+            chunk_rows=chunk_rows, export_path=export_path, partition_cols=partition_cols,
+        )
+        return df
 
-        left join ciqPriceEquityDivAdjFactor daf on mi.tradingItemId=daf.tradingItemId
-        and daf.fromDate<=mi.priceDate --Find dividend adjustment factor on pricing date
-        and (daf.toDate is null or daf.toDate>=mi.priceDate)
 
-        WHERE c.companyId in ({', '.join([str(id) for id in ls_ids])})  
-        AND s.primaryflag=1 -- empirically makes sense to have these primary flag, lost about 0.03% data
+    @labelled
+    def get_miadj_pricing_raw(self, start, end, ls_ids, chunk_rows=None, export_path=None, partition_cols=None,
+                              columns=None, use_cache=True):
+        """
+        Get unadjusted miadjprice rows of the primary trading items of a series of
+        company ids, i.e. get_hist_miadj_pricing without divadjclose and divadjfactor.
+
+        Args:
+            start (str): '2020-05-05'
+            end (str): '2020-06-06'
+            ls_ids (list): list of companyid   [24937, ]
+            chunk_rows (int, optional): stream the result as DataFrames of at most this many rows
+            export_path (str, optional): bulk export the result to this Parquet file / dataset directory
+            partition_cols (list, optional): columns to hive-partition the export by
+            columns (list, optional): subset of the output columns to select
+            use_cache (bool, optional): False to bypass the repository's query cache
+
+        Returns:
+            pd.DataFrame: companyid, tradingitemid, currencyid, pricedate and the price columns, ordered by pricedate
+        """
+        startstr = pd.to_datetime(start).date()
+        endstr = pd.to_datetime(end).date()
+
+        query = f"""
+        SELECT 
+            {_select_list(columns, _RAW_PRICING_COLUMNS)}
+
+        FROM ciqCompany c
+        JOIN ciqSecurity s on s.companyid = c.companyid
+        JOIN ciqTradingItem ti on ti.securityId=s.securityId
+        JOIN miadjprice mi on mi.tradingItemId=ti.tradingItemId
+
+        WHERE c.companyId = ANY(%s)
+        AND s.primaryflag=1
         AND ti.primaryflag=1
-        AND mi.priceDate >= '{startstr}'
-        AND mi.priceDate <= '{endstr}'
-        ORDER BY mi.priceDate asc;
+        AND mi.priceDate >= %s
+        AND mi.priceDate <= %s
+        ORDER BY mi.priceDate asc
         """
-        df = self.database.query_all(query)
-        return df
+        return self._fetch_sharded(
+            query, lambda ids, s, e: (ids, s, e), ls_ids, startstr, endstr, order_by="pricedate",
+            chunk_rows=chunk_rows, export_path=export_path, partition_cols=partition_cols, use_cache=use_cache,
+        )
+
+
+    @labelled
+    def get_div_adj_factors(self, start, end, ls_ids, use_cache=True):
+        """
+        Get the dividend adjustment factor intervals overlapping [start, end] of the
+        primary trading items of a series of company ids. The table is small compared
+        to the prices, so refetching it after new dividends is cheap, and the cached
+        raw prices can be re-adjusted locally with apply_div_adj_factors.
+
+        Args:
+            start (str): '2020-05-05'
+            end (str): '2020-06-06'
+            ls_ids (list): list of companyid   [24937, ]
+            use_cache (bool, optional): False to bypass the repository's query cache
+
+        Returns:
+            pd.DataFrame: tradingitemid, fromdate, todate (NaT when open) and divadjfactor
+        """
+        startstr = pd.to_datetime(start).date()
+        endstr = pd.to_datetime(end).date()
+
+        query = """
+        SELECT 
+        daf.tradingItemId
+        ,daf.fromDate
+        ,daf.toDate
+        ,daf.divAdjFactor
+
+        FROM ciqSecurity s
+        JOIN ciqTradingItem ti on ti.securityId=s.securityId
+        JOIN ciqPriceEquityDivAdjFactor daf on daf.tradingItemId=ti.tradingItemId
+
+        WHERE s.companyId = ANY(%s)
+        AND s.primaryflag=1
+        AND ti.primaryflag=1
+        AND daf.fromDate <= %s
+        AND (daf.toDate is null or daf.toDate >= %s)
+        ORDER BY daf.tradingItemId, daf.fromDate
+        """
+        # intervals span date windows, so only shard by company ids
+        return self._fetch_sharded(query, lambda ids, s, e: (ids, endstr, startstr), ls_ids, use_cache=use_cache)
+
+
+    @labelled
+    def sync_hist_miadj_pricing(self, start, end, ls_ids, store, columns=None):
+        """
+        Incrementally sync raw miadjprice rows into a local PricingStore and return the
+        requested window from it, dividend-adjusted on load. Only (company, date-range)
+        gaps that the store has not fetched before are queried, so a daily refresh pulls
+        one day of prices; the small dividend adjustment factor table is refetched every
+        time, so earlier prices are re-adjusted after new dividends.
 
+        Args:
+            start (str): '2020-05-05'
+            end (str): '2020-06-06'
+            ls_ids (list): list of companyid   [24937, ]
+            store (PricingStore): local store holding previously fetched prices
+            columns (list, optional): subset of columns to return
 
-    def get_afl_factor_monthly_period(self, begin, end, factorids, ls_ids):
+        Returns:
+            pd.DataFrame: same layout as get_hist_miadj_pricing, ordered by pricedate
+        """
+        store.sync(self, start, end, ls_ids)
+        return store.load(start, end, ls_ids, columns=columns)
+
+
+    @labelled
+    def get_afl_factor_monthly_period(self, begin, end, factorids, ls_ids, chunk_rows=None, export_path=None, partition_cols=None,
+                                     columns=None):
         sql = f"""
                 select 
-                dly.factorvalue
-                , dly.factorid
-                , gvk.objectId
-                , dly.asofdate
-                , d.securityid
-                , gvk.gvkey
-                , gvk.iid
-                , c.companyid
+            {_select_list(columns, _AFL_FACTOR_COLUMNS)}
                 from ciqafvaluemonthlyna dly
 
                 join ciqgvkeyiid gvk 
@@ -198,26 +630,25 @@ class TaskManagerRepository:
                 JOIN ciqSecurity s ON d.securityid = s.securityid
                 JOIN ciqCompany c ON c.companyid = s.companyid
 
-                where dly.factorId in ({', '.join([str(factor_id) for factor_id in factorids])})
-                and asOfDate >= '{begin}'
-                and asOfDate <= '{end}'
-                and c.companyid in ({', '.join([str(id) for id in ls_ids])})
+                where dly.factorId = ANY(%s)
+                and asOfDate >= %s::date
+                and asOfDate <= %s::date
+                and c.companyid = ANY(%s)
                 """
+        factorids = _int_list(factorids)
 
-        return self.database.query_all(sql)
+        return self._fetch_sharded(
+            sql, lambda ids, s, e: (factorids, s, e, ids), ls_ids, begin, end,
+            chunk_rows=chunk_rows, export_path=export_path, partition_cols=partition_cols,
+        )
 
 
-    def get_afl_factor_daily_period(self, begin, end, factorids, ls_ids):
+    @labelled
+    def get_afl_factor_daily_period(self, begin, end, factorids, ls_ids, chunk_rows=None, export_path=None, partition_cols=None,
+                                     columns=None):
         sql = f"""
                 select 
-                dly.factorvalue
-                , dly.factorid
-                , gvk.objectId
-                , dly.asofdate
-                , d.securityid
-                , gvk.gvkey
-                , gvk.iid
-                , c.companyid
+            {_select_list(columns, _AFL_FACTOR_COLUMNS)}
                 from ciqafvaluedailyna dly
 
                 join ciqgvkeyiid gvk 
@@ -228,25 +659,27 @@ class TaskManagerRepository:
                 JOIN ciqSecurity s ON d.securityid = s.securityid
                 JOIN ciqCompany c ON c.companyid = s.companyid
 
-                where dly.factorId in ({', '.join([str(factor_id) for factor_id in factorids])})
-                and asOfDate >= '{begin}'
-                and asOfDate <= '{end}'
-                and c.companyid in ({', '.join([str(id) for id in ls_ids])})
+                where dly.factorId = ANY(%s)
+                and asOfDate >= %s::date
+                and asOfDate <= %s::date
+                and c.companyid = ANY(%s)
                 """
+        factorids = _int_list(factorids)
 
-        return self.database.query_all(sql)
+        return self._fetch_sharded(
+            sql, lambda ids, s, e: (factorids, s, e, ids), ls_ids, begin, end,
+            chunk_rows=chunk_rows, export_path=export_path, partition_cols=partition_cols,
+        )
 
 
-    def get_estimatediff_ref_co(self, ls_ids, dataitemids, startdate, enddate):
+    @labelled
+    def get_estimatediff_ref_co(self, ls_ids, dataitemids, startdate, enddate, chunk_rows=None, export_path=None, partition_cols=None,
+                                columns=None):
+        # with a projection the positional ORDER BY over EP.* is not available, order by period end instead
+        order_sql, order_by = ("4", 3) if columns is None else ("EP.periodEndDate", "periodenddate")
         sql = f"""
             select 
-            EP.*
-            , ED.dataitemid
-            , ED.currencyId
-            , ED.dataItemValue
-            , ED.asofdate
-            , EC.tradingitemid
-            , ED.scaleid
+            {_select_list(columns, _ESTIMATE_DIFF_COLUMNS, passthrough="EP")}
 
             from ciqEstimatePeriod EP
             --- link the core estimate table to data table
@@ -256,29 +689,29 @@ class TaskManagerRepository:
             join ciqEstimateanalysisdata ED
             on ED.estimateConsensusId = EC.estimateConsensusId
             --------------------------------------------------------------
-            where EP.companyId IN ({', '.join([str(id) for id in ls_ids])})
+            where EP.companyId = ANY(%s)
             and EP.periodTypeId = 2 -- Quarter 
-            and ED.dataItemId in ({', '.join([str(id) for id in dataitemids])})
-            and ED.asofdate >= '{startdate}'
-            and ED.asofdate <= '{enddate}'
-            order by 4
+            and ED.dataItemId = ANY(%s)
+            and ED.asofdate >= %s::date
+            and ED.asofdate <= %s::date
+            order by {order_sql}
         """
+        dataitemids = _int_list(dataitemids)
         
-        return self.database.query_all(sql)
+        return self._fetch_sharded(
+            sql, lambda ids, s, e: (ids, dataitemids, s, e), ls_ids, startdate, enddate, order_by=order_by,
+            chunk_rows=chunk_rows, export_path=export_path, partition_cols=partition_cols,
+        )
 
 
-    def get_act_q_ref_co(self, ls_ids, dataitemids, fromdate):
-
+    @labelled
+    def get_act_q_ref_co(self, ls_ids, dataitemids, fromdate, chunk_rows=None, export_path=None, partition_cols=None,
+                         columns=None):
+        # with a projection the positional ORDER BY over EP.* is not available, order by period end instead
+        order_sql, order_by = ("4", 3) if columns is None else ("EP.periodEndDate", "periodenddate")
         sql = f"""
             select 
-            EP.*
-            , ED.dataitemid
-            , ED.currencyId
-            , ED.dataItemValue
-            , ED.effectiveDate
-            , ED.toDate
-            , EC.tradingitemid
-            , ED.estimatescaleid
+            {_select_list(columns, _ACT_Q_COLUMNS, passthrough="EP")}
 
             from ciqEstimatePeriod EP
             --- link the core estimate table to data table
@@ -288,13 +721,185 @@ class TaskManagerRepository:
             join ciqEstimateNumericData ED
             on ED.estimateConsensusId = EC.estimateConsensusId
             --------------------------------------------------------------
-            where EP.companyId IN ({', '.join([str(id) for id in ls_ids])})
+            where EP.companyId = ANY(%s)
             and EP.periodTypeId = 2 -- Quarter 
-            and ED.dataItemId in ({', '.join([str(id) for id in dataitemids])})
-            and EP.periodenddate > '{fromdate}'
+            and ED.dataItemId = ANY(%s)
+            and EP.periodenddate > %s::date
             and ED.toDate > '2030-01-01'
 
-            order by 4
+            order by {order_sql}
         """
+        dataitemids = _int_list(dataitemids)
         
-        return self.database.query_all(sql)
\ No newline at end of file
+        return self._fetch_sharded(
+            sql, lambda ids, s, e: (ids, dataitemids, fromdate), ls_ids, order_by=order_by,
+            chunk_rows=chunk_rows, export_path=export_path, partition_cols=partition_cols,
+        )
+
+
+    @labelled
+    def get_estimatediff_ref_co_bulk(self, ls_ids, dataitem_map: Dict[str, int], startdate, enddate, export_path=None,
+                                     columns=None):
+        """Fetch several analyst estimate dataitems with one scan of the estimate tables.
+
+        Instead of one get_estimatediff_ref_co call per dataitem, which re-joins
+        ciqEstimatePeriod, ciqEstimateConsensus and ciqEstimateanalysisdata for
+        the same companies every time, all dataitems are fetched together and
+        split afterwards.
+
+        Args:
+            ls_ids: Company ids
+            dataitem_map: Key -> dataitemid, e.g. {"EPSDiff": 100360, "EPS_Surprise": 100361}
+            startdate: First asofdate
+            enddate: Last asofdate
+            export_path: If set, write a Parquet dataset partitioned by dataitemid there
+                instead and return the number of rows written
+            columns: Subset of the get_estimatediff_ref_co columns to select; dataitemid is always included
+
+        Returns:
+            dict: Key -> rows of that dataitem, same layout as get_estimatediff_ref_co
+        """
+        dataitemids = list(dict.fromkeys(dataitem_map.values()))
+        columns = None if columns is None else list(columns) + ["dataitemid"]
+        if export_path is not None:
+            return self.get_estimatediff_ref_co(ls_ids, dataitemids, startdate, enddate,
+                                                export_path=export_path, partition_cols=["dataitemid"], columns=columns)
+        data = self.get_estimatediff_ref_co(ls_ids, dataitemids, startdate, enddate, columns=columns)
+        return self._split_by_dataitem(data, dataitem_map)
+
+    @labelled
+    def get_act_q_ref_co_bulk(self, ls_ids, dataitem_map: Dict[str, int], fromdate, export_path=None, columns=None):
+        """Fetch several consensus/guidance dataitems with one scan of the estimate tables.
+
+        The bulk counterpart of get_act_q_ref_co, see get_estimatediff_ref_co_bulk.
+
+        Args:
+            ls_ids: Company ids
+            dataitem_map: Key -> dataitemid, e.g. {"EPS": 100284, "EPS_count": 100282}
+            fromdate: Only periods ending after this date
+            export_path: If set, write a Parquet dataset partitioned by dataitemid there
+                instead and return the number of rows written
+            columns: Subset of the get_act_q_ref_co columns to select; dataitemid is always included
+
+        Returns:
+            dict: Key -> rows of that dataitem, same layout as get_act_q_ref_co
+        """
+        dataitemids = list(dict.fromkeys(dataitem_map.values()))
+        columns = None if columns is None else list(columns) + ["dataitemid"]
+        if export_path is not None:
+            return self.get_act_q_ref_co(ls_ids, dataitemids, fromdate,
+                                         export_path=export_path, partition_cols=["dataitemid"], columns=columns)
+        data = self.get_act_q_ref_co(ls_ids, dataitemids, fromdate, columns=columns)
+        return self._split_by_dataitem(data, dataitem_map)
+
+
+class AsyncTaskManagerRepository(TaskManagerRepository):
+    """TaskManagerRepository for asyncio code on top of an AsyncBaseDatabase.
+
+    Every query method has the same signature as in TaskManagerRepository but
+    returns an awaitable; with chunk_rows it returns an async iterator instead.
+    Shards run concurrently as coroutines, bounded by the database's limiter.
+
+    Example:
+        repo = AsyncTaskManagerRepository(AsyncPostgresDatabase("targetdb", "ubuntu"), shard_size=100)
+        prices = await repo.get_hist_miadj_pricing("2020-01-01", "2020-12-31", ids)
+    """
+
+    def __init__(self, database: AsyncBaseDatabase, shard_size: int = None, shard_date_freq: str = None,
+                 cache: QueryCache = None):
+        """Initialize repository with an async database.
+
+        Args:
+            database: Async database instance for data access
+            shard_size: Maximum company ids per shard, None disables sharding
+            shard_date_freq: pandas offset alias splitting the date range, e.g. 'YS'
+            cache: Optional QueryCache consulted before going to the database
+        """
+        super().__init__(database, shard_size=shard_size, shard_date_freq=shard_date_freq, cache=cache)
+
+    async def _cached(self, query: str, params: tuple, compute, use_cache: bool = True):
+        """Await compute() through the cache, keyed by the query and its parameters."""
+        if self.cache is None or not use_cache:
+            return await compute()
+        df = self.cache.get(query, params)
+        if df is None:
+            df = await compute()
+            self.cache.put(query, params, df)
+            df = df.copy()
+        return df
+
+    async def _div_adjust(self, prices, factors, columns=None) -> pd.DataFrame:
+        """Await the raw prices and factor intervals concurrently and adjust the prices."""
+        prices, factors = await asyncio.gather(prices, factors)
+        return TaskManagerRepository._div_adjust(self, prices, factors, columns)
+
+    async def _split_by_dataitem(self, data, dataitem_map: Dict[str, int]) -> Dict[str, pd.DataFrame]:
+        """Await a multi-dataitem result and split it into one frame per dataitem key."""
+        return TaskManagerRepository._split_by_dataitem(self, await data, dataitem_map)
+
+    def _fetch(self, query: str, params: tuple = (), chunk_rows: int = None, export_path=None, partition_cols=None,
+               use_cache: bool = True):
+        """Return an awaitable query result or number of rows exported,
+        or an async iterator of chunks when chunk_rows is given."""
+        if export_path is not None:
+            return self.database.export_parquet(query, export_path, params, partition_cols=partition_cols)
+        if chunk_rows:
+            return self.database.query_iter(query, params, chunk_rows=chunk_rows)
+        return self._cached(query, params, lambda: self.database.query_all(query, params), use_cache)
+
+    async def sync_hist_miadj_pricing(self, start, end, ls_ids, store, columns=None):
+        """Await TaskManagerRepository.sync_hist_miadj_pricing.
+
+        PricingStore reads and writes its files with blocking calls, so the sync and
+        the load run in a worker thread; the queries of the sync are sent back to
+        the event loop and run on the async database like any other query.
+
+        Returns:
+            pd.DataFrame: same layout as get_hist_miadj_pricing, ordered by pricedate
+        """
+        repository = _BlockingRepository(self, asyncio.get_running_loop())
+        await asyncio.to_thread(store.sync, repository, start, end, ls_ids)
+        return await asyncio.to_thread(store.load, start, end, ls_ids, columns=columns)
+
+    def _fetch_sharded(self, query: str, make_params, ls_ids, start=None, end=None, order_by=None,
+                       chunk_rows: int = None, export_path=None, partition_cols=None, use_cache: bool = True):
+        """Return an awaitable result of a company-id pull, sharded when enabled."""
+        if not self.shard_size or chunk_rows or export_path is not None:
+            return self._fetch(query, make_params(_int_list(ls_ids), start, end), chunk_rows, export_path, partition_cols,
+                               use_cache)
+
+        shards = self._shard_plan(ls_ids, start, end)
+
+        async def _fetch_all():
+            frames = await asyncio.gather(*[
+                self.database.query_all(query, make_params(ids, window_start, window_end))
+                for ids, (window_start, window_end) in shards
+            ])
+            df = pd.concat(frames, ignore_index=True)
+            return self._restore_order(df, order_by, len(shards))
+
+        return self._cached(query, make_params(_int_list(ls_ids), start, end), _fetch_all, use_cache)
+
+
+class _BlockingRepository:
+    """Blocking view of an AsyncTaskManagerRepository for code running in a worker thread.
+
+    Every method call is awaited on the repository's event loop and the calling
+    thread waits for its result, so synchronous helpers like PricingStore can
+    query through the async database.
+    """
+
+    def __init__(self, repository: AsyncTaskManagerRepository, loop: asyncio.AbstractEventLoop):
+        self._repository = repository
+        self._loop = loop
+
+    def __getattr__(self, name):
+        method = getattr(self._repository, name)
+
+        async def _call(*args, **kwargs):
+            return await method(*args, **kwargs)
+
+        def call(*args, **kwargs):
+            return asyncio.run_coroutine_threadsafe(_call(*args, **kwargs), self._loop).result()
+
+        return call
@@ -0,0 +1,50 @@
+"""Client-side dividend adjustment of raw prices with CIQ dividend adjustment factor intervals."""
+
+import numpy as np
+import pandas as pd
+
+from common.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def apply_div_adj_factors(prices: pd.DataFrame, factors: pd.DataFrame) -> pd.DataFrame:
+    """Add divadjfactor and divadjclose to raw prices, like the range join in get_hist_miadj_pricing.
+
+    Each price row gets the factor of the interval of its trading item with
+    ``fromdate <= pricedate <= todate`` (an open ``todate`` runs forever), or 1
+    when no interval covers the date. The lookup is vectorized: factor intervals
+    are sorted by fromdate and every price is matched to the last interval of
+    its trading item starting on or before its date, then dropped if that
+    interval already ended.
+
+    Args:
+        prices: Rows with at least tradingitemid, pricedate and priceclose
+        factors: Intervals with tradingitemid, fromdate, todate and divadjfactor
+
+    Returns:
+        pd.DataFrame: Copy of prices, in the same row order, with divadjclose and divadjfactor appended
+    """
+    lookup = pd.DataFrame({
+        "_row": np.arange(len(prices)),
+        "tradingitemid": prices["tradingitemid"].to_numpy(dtype="int64"),
+        "pricedate": pd.to_datetime(prices["pricedate"]).to_numpy(dtype="datetime64[ns]"),
+    }).sort_values("pricedate", kind="stable")
+    intervals = pd.DataFrame({
+        "tradingitemid": factors["tradingitemid"].to_numpy(dtype="int64"),
+        "fromdate": pd.to_datetime(factors["fromdate"]).to_numpy(dtype="datetime64[ns]"),
+        "todate": pd.to_datetime(factors["todate"]).to_numpy(dtype="datetime64[ns]"),
+        "divadjfactor": factors["divadjfactor"].to_numpy(dtype="float64"),
+    }).dropna(subset=["fromdate"]).sort_values("fromdate", kind="stable")
+
+    matched = pd.merge_asof(lookup, intervals, left_on="pricedate", right_on="fromdate",
+                            by="tradingitemid", direction="backward")
+    expired = matched["todate"].notna() & (matched["todate"] < matched["pricedate"])
+    factor = np.empty(len(prices))
+    factor[matched["_row"].to_numpy()] = matched["divadjfactor"].mask(expired).fillna(1.0).to_numpy()
+
+    adjusted = prices.copy()
+    adjusted["divadjclose"] = prices["priceclose"].to_numpy(dtype="float64") * factor
+    adjusted["divadjfactor"] = factor
+    logger.info(f"Dividend-adjusted {len(prices)} prices with {len(intervals)} factor intervals")
+    return adjusted
@@ -0,0 +1,211 @@
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from common.database.base_database import BaseDatabase
+from common.database.query_metrics import QueryMetricsCollector, Stopwatch, fingerprint
+from common.database.sql_utils import qmark_placeholders
+from common.utils.logging import get_logger, log_execution_time
+
+# Initialize logger
+logger = get_logger(__name__)
+
+def translate_postgres_sql(query: str) -> str:
+    """Translate the Postgres dialect used by TaskManagerRepository to DuckDB.
+
+    DuckDB already understands ``= ANY(list)``, ``::date`` casts, ``INTERVAL '3 days'``
+    and positional ORDER BY, so the shim only has to rewrite pyformat ``%s``
+    placeholders to ``?`` and ``%%`` escapes back to ``%``.
+
+    Args:
+        query: SQL written for psycopg2
+
+    Returns:
+        str: Equivalent DuckDB SQL
+    """
+    return qmark_placeholders(query)
+
+
+class DuckDBDatabase(BaseDatabase):
+    """DuckDB database executing repository SQL against local Parquet snapshots.
+
+    Every ``<table>.parquet`` file and every ``<table>/`` directory of Parquet files
+    (hive partitioned or not) under ``snapshot_dir`` is exposed as a view named
+    after it, e.g. ``ciqmarketcap.parquet`` -> ``ciqmarketcap``. Table names are
+    case-insensitive, like unquoted identifiers in Postgres, and result columns are
+    lower-cased the way Postgres folds them, so TaskManagerRepository works
+    unchanged without network access.
+    """
+
+    def __init__(self, snapshot_dir, database: str = ":memory:", threads: int = None,
+                 metrics: QueryMetricsCollector = None):
+        """Initialize database and register the snapshot views.
+
+        Args:
+            snapshot_dir: Directory holding the Parquet snapshots of the CIQ tables
+            database: DuckDB database file, in-memory by default
+            threads: Number of DuckDB worker threads, DuckDB's default when None
+            metrics: Collector for per-query timings and sizes
+        """
+        self.metrics = metrics or QueryMetricsCollector()
+        self.snapshot_dir = Path(snapshot_dir)
+        self._con = duckdb.connect(database=database)
+        if threads:
+            self._con.execute(f"SET threads TO {int(threads)}")
+        self.tables = self._register_snapshots()
+        logger.info(f"Registered {len(self.tables)} snapshot tables from {self.snapshot_dir}: {sorted(self.tables)}")
+
+    def _register_snapshots(self) -> Dict[str, Path]:
+        tables = {}
+        if not self.snapshot_dir.exists():
+            logger.warning(f"Snapshot directory {self.snapshot_dir} does not exist")
+            return tables
+        for path in sorted(self.snapshot_dir.iterdir()):
+            if path.is_file() and path.suffix == ".parquet":
+                source = f"read_parquet('{path.as_posix()}')"
+            elif path.is_dir() and any(path.rglob("*.parquet")):
+                source = f"read_parquet('{path.as_posix()}/**/*.parquet', hive_partitioning = true)"
+            else:
+                continue
+            name = path.stem.lower()
+            self._con.execute(f'CREATE OR REPLACE VIEW "{name}" AS SELECT * FROM {source}')
+            tables[name] = path
+        return tables
+
+    @contextmanager
+    def get_connection(self):
+        """Get a DuckDB cursor as context manager; cursors are safe to use per thread.
+
+        Yields:
+            duckdb.DuckDBPyConnection: Database cursor
+        """
+        cur = self._con.cursor()
+        try:
+            yield cur
+        finally:
+            cur.close()
+
+    @staticmethod
+    def _lower_columns(df: pd.DataFrame) -> pd.DataFrame:
+        df.columns = [str(column).lower() for column in df.columns]
+        return df
+
+    def query_all(self, query: str, params: Tuple = (), dtypes: Dict = None) -> pd.DataFrame:
+        """Execute a query and return all results.
+
+        Args:
+            query: SQL query in the Postgres dialect, with %s placeholders
+            params: Query parameters; lists bind as DuckDB lists
+            dtypes: Column name to dtype overrides for this query
+
+        Returns:
+            pd.DataFrame: Query result
+        """
+        with self.get_connection() as cur:
+            logger.debug(f"Executing query {fingerprint(query)}:\n{query}")
+            stopwatch = Stopwatch()
+            cur.execute(translate_postgres_sql(query), list(params))
+            execute_s = stopwatch.lap()
+            df = self._lower_columns(cur.df())
+            fetch_s = stopwatch.lap()
+        if dtypes:
+            df = df.astype(dtypes)
+        metrics = self.metrics.record(query, execute_s, fetch_s, stopwatch.lap(),
+                                      len(df), int(df.memory_usage(index=False).sum()))
+        logger.info(f"Query executed successfully! Total rows: {len(df)} in {metrics.total_s:.3f}s")
+        return df
+
+    def query_iter(self, query: str, params: Tuple = (), chunk_rows: int = 100_000,
+                   dtypes: Dict = None) -> Iterator[pd.DataFrame]:
+        """Execute a query and yield bounded-size chunks from DuckDB's Arrow stream.
+
+        Args:
+            query: SQL query in the Postgres dialect, with %s placeholders
+            params: Query parameters
+            chunk_rows: Maximum number of rows per chunk
+            dtypes: Column name to dtype overrides applied to every chunk
+
+        Yields:
+            pd.DataFrame: Consecutive chunks of the query result
+        """
+        with self.get_connection() as cur:
+            logger.debug(f"Executing streaming query {fingerprint(query)}:\n{query}")
+            reader = cur.execute(translate_postgres_sql(query), list(params)).fetch_record_batch(chunk_rows)
+            for batch in reader:
+                df = self._lower_columns(batch.to_pandas())
+                yield df.astype(dtypes) if dtypes else df
+
+    def export_parquet(self, query: str, output_path, params: Tuple = (),
+                       partition_cols: List[str] = None, chunk_rows: int = 1_000_000) -> int:
+        """Stream a query result into Parquet straight from DuckDB's Arrow batches.
+
+        Args:
+            query: SQL query in the Postgres dialect, with %s placeholders
+            output_path: Parquet file, or dataset directory when partition_cols is given;
+                an existing dataset directory is replaced
+            params: Query parameters
+            partition_cols: Columns to hive-partition the output by
+            chunk_rows: Rows per record batch
+
+        Returns:
+            int: Number of rows written
+        """
+        output_path = Path(output_path)
+        if partition_cols:
+            # files of an earlier export would otherwise be read alongside the new ones
+            shutil.rmtree(output_path, ignore_errors=True)
+        total_rows = 0
+        with self.get_connection() as cur:
+            reader = cur.execute(translate_postgres_sql(query), list(params)).fetch_record_batch(chunk_rows)
+            # lower-case column names like query_all does
+            names = [name.lower() for name in reader.schema.names]
+            schema = pa.schema([field.with_name(name) for field, name in zip(reader.schema, names)])
+            if partition_cols:
+                for i, batch in enumerate(reader):
+                    ds.write_dataset(
+                        batch.rename_columns(names), output_path, format="parquet",
+                        partitioning=partition_cols, partitioning_flavor="hive",
+                        basename_template=f"part-{i}-{{i}}.parquet",
+                        existing_data_behavior="overwrite_or_ignore",
+                    )
+                    total_rows += batch.num_rows
+            else:
+                output_path.parent.mkdir(parents=True, exist_ok=True)
+                with pq.ParquetWriter(output_path, schema) as writer:
+                    for batch in reader:
+                        writer.write_batch(batch.rename_columns(names))
+                        total_rows += batch.num_rows
+        logger.info(f"Export finished! Total rows: {total_rows} written to {output_path}")
+        return total_rows
+
+    def close(self) -> None:
+        """Close the DuckDB connection."""
+        self._con.close()
+
+    @staticmethod
+    @log_execution_time
+    def snapshot_tables(source: BaseDatabase, snapshot_dir, tables: Dict[str, str]) -> Dict[str, int]:
+        """Write Parquet snapshots of tables from another database, e.g. the live CIQ server.
+
+        Args:
+            source: Database to read from, typically a PostgresDatabase
+            snapshot_dir: Directory to write ``<table>.parquet`` files to
+            tables: Table name -> SELECT producing its snapshot, e.g.
+                {"ciqmarketcap": "SELECT * FROM ciqmarketcap WHERE pricingdate >= '2020-01-01'"}
+
+        Returns:
+            dict: Table name -> number of rows written
+        """
+        snapshot_dir = Path(snapshot_dir)
+        snapshot_dir.mkdir(parents=True, exist_ok=True)
+        return {
+            name: source.export_parquet(query, snapshot_dir / f"{name.lower()}.parquet")
+            for name, query in tables.items()
+        }
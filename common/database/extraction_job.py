@@ -0,0 +1,242 @@
+"""Resumable, checkpointed extraction of repository results into per-chunk files."""
+
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from common.utils.logging import get_logger, log_execution_time
+
+logger = get_logger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Chunk parameter of type {type(value).__name__} is not JSON serializable")
+
+
+def _normalize_params(params: Dict) -> Dict:
+    """Round-trip chunk parameters through JSON so they compare equal to the manifest."""
+    return json.loads(json.dumps(params, default=_json_default, sort_keys=True))
+
+
+def file_checksum(path, block_size: int = 1 << 20) -> str:
+    """Return the sha256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class ChunkRecord:
+    """Manifest entry of one extraction chunk."""
+
+    params: Dict
+    file: str
+    status: str = PENDING
+    rows: Optional[int] = None
+    checksum: Optional[str] = None
+    seconds: Optional[float] = None
+    finished_at: Optional[str] = None
+    error: Optional[str] = field(default=None)
+
+
+class ExtractionJob:
+    """Run a repository extraction as named chunks with a manifest, so it can resume.
+
+    Every chunk is one call of ``fetch(**params)``, returning a DataFrame or an
+    iterator of DataFrames (e.g. a repository method called with chunk_rows),
+    written to ``<output_dir>/<name>.<format>``. Files are written to a temporary
+    name and renamed when complete, so a file under its final name is always
+    whole. ``<output_dir>/manifest.json`` records each chunk's parameters, status,
+    row count and checksum; a rerun skips chunks whose file is still intact and
+    whose parameters did not change, and runs the rest.
+
+    Example:
+        job = ExtractionJob(
+            "data/affactor",
+            fetch=lambda factorids: repo.get_afl_factor_monthly_period(begin, end, factorids, ids, chunk_rows=500_000),
+            chunks={f"affactor_{i}": {"factorids": group} for i, group in enumerate(groups)},
+        )
+        job.run(max_workers=2)
+    """
+
+    def __init__(self, output_dir, fetch: Callable[..., Union[pd.DataFrame, Iterable[pd.DataFrame]]],
+                 chunks: Dict[str, Dict], file_format: str = "csv"):
+        """Initialize the job and load the manifest of a previous run, if any.
+
+        Args:
+            output_dir: Directory for the chunk files and manifest.json
+            fetch: Callable run with each chunk's parameters as keyword arguments
+            chunks: Chunk name -> parameters, in run order
+            file_format: "csv" or "parquet"
+        """
+        if file_format not in ("csv", "parquet"):
+            raise ValueError(f"Unsupported file format: {file_format}")
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.fetch = fetch
+        self.file_format = file_format
+        self.chunks = {name: _normalize_params(params) for name, params in chunks.items()}
+        self.manifest_path = self.output_dir / "manifest.json"
+        self._lock = threading.Lock()
+        self.records: Dict[str, ChunkRecord] = self._load_manifest()
+        # chunks written by this process, as opposed to skipped as done by an earlier run
+        self.extracted = set()
+
+    def _load_manifest(self) -> Dict[str, ChunkRecord]:
+        if not self.manifest_path.exists():
+            return {}
+        with open(self.manifest_path) as f:
+            raw = json.load(f)
+        return {name: ChunkRecord(**record) for name, record in raw["chunks"].items()}
+
+    def _save_manifest(self) -> None:
+        """Write the manifest atomically; callers hold the lock."""
+        raw = {
+            "updated_at": datetime.now().isoformat(),
+            "chunks": {name: asdict(record) for name, record in self.records.items()},
+        }
+        tmp_path = self.manifest_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(raw, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _is_done(self, name: str) -> bool:
+        """Whether a chunk finished with the current parameters and its file is unchanged."""
+        record = self.records.get(name)
+        if record is None or record.status != DONE or record.params != self.chunks[name]:
+            return False
+        path = self.output_dir / record.file
+        if not path.exists() or file_checksum(path) != record.checksum:
+            logger.warning(f"Chunk {name}: {path} is missing or modified, it will be extracted again")
+            return False
+        return True
+
+    def _write(self, result, tmp_path: Path) -> int:
+        """Write a DataFrame or iterator of DataFrames to tmp_path and return the row count."""
+        frames = [result] if isinstance(result, pd.DataFrame) else result
+        rows = 0
+        writer = None
+        try:
+            for i, frame in enumerate(frames):
+                if self.file_format == "csv":
+                    frame.to_csv(tmp_path, index=False, mode="w" if i == 0 else "a", header=(i == 0))
+                else:
+                    table = pa.Table.from_pandas(frame, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(tmp_path, table.schema)
+                    writer.write_table(table.cast(writer.schema))
+                rows += len(frame)
+        finally:
+            if writer is not None:
+                writer.close()
+        if not tmp_path.exists():
+            # fetch yielded no frame at all, so there are no columns to write; leave an empty
+            # file so the chunk counts as done, recorded with rows == 0 for readers to skip
+            tmp_path.touch()
+        return rows
+
+    def _run_chunk(self, name: str) -> None:
+        params = self.chunks[name]
+        file_name = f"{name}.{self.file_format}"
+        path = self.output_dir / file_name
+        tmp_path = self.output_dir / f".{file_name}.tmp"
+        with self._lock:
+            self.records[name] = ChunkRecord(params=params, file=file_name, status=RUNNING)
+            self._save_manifest()
+
+        logger.info(f"Chunk {name}: extracting with {params}")
+        start = time.perf_counter()
+        try:
+            rows = self._write(self.fetch(**params), tmp_path)
+            checksum = file_checksum(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            tmp_path.unlink(missing_ok=True)
+            logger.error(f"Chunk {name} failed: {e}")
+            with self._lock:
+                self.records[name] = ChunkRecord(params=params, file=file_name, status=FAILED, error=repr(e),
+                                                 seconds=round(time.perf_counter() - start, 3))
+                self._save_manifest()
+            return
+
+        seconds = round(time.perf_counter() - start, 3)
+        logger.info(f"Chunk {name}: wrote {rows} rows to {path} in {seconds}s")
+        with self._lock:
+            self.records[name] = ChunkRecord(params=params, file=file_name, status=DONE, rows=rows,
+                                             checksum=checksum, seconds=seconds,
+                                             finished_at=datetime.now().isoformat())
+            self.extracted.add(name)
+            self._save_manifest()
+
+    @log_execution_time
+    def run(self, max_workers: int = 1) -> pd.DataFrame:
+        """Extract every chunk that is not done yet.
+
+        Args:
+            max_workers: Number of chunks extracted concurrently; use a pooled database
+                with at least as many connections
+
+        Returns:
+            pd.DataFrame: The manifest, one row per chunk
+
+        Raises:
+            RuntimeError: If any chunk failed; rerun to retry only the failed chunks
+        """
+        remaining = [name for name in self.chunks if not self._is_done(name)]
+        logger.info(f"Extraction job {self.output_dir}: {len(self.chunks) - len(remaining)} chunks done, "
+                    f"{len(remaining)} to run on {max_workers} workers")
+        if max_workers <= 1:
+            for name in remaining:
+                self._run_chunk(name)
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(contextvars.copy_context().run, self._run_chunk, name) for name in remaining]
+                for future in futures:
+                    future.result()
+
+        status = self.status()
+        failed = status.index[status["status"] == FAILED].tolist()
+        if failed:
+            raise RuntimeError(f"{len(failed)} chunks failed: {failed}; rerun the job to resume")
+        return status
+
+    def status(self) -> pd.DataFrame:
+        """Return the manifest of the job's chunks as a DataFrame indexed by chunk name.
+
+        The extracted column tells which chunks were written by this job object, so
+        callers can process only those; chunks with rows == 0 have an empty file.
+        """
+        rows = {
+            name: asdict(self.records[name]) if name in self.records
+            else asdict(ChunkRecord(params=params, file=f"{name}.{self.file_format}"))
+            for name, params in self.chunks.items()
+        }
+        status = pd.DataFrame.from_dict(rows, orient="index")
+        status["extracted"] = [name in self.extracted for name in status.index]
+        return status
@@ -0,0 +1,141 @@
+"""Mapping of PostgreSQL type OIDs to Arrow and pandas types."""
+
+from typing import Dict, Optional
+
+import pandas as pd
+import psycopg2.extensions
+import pyarrow as pa
+
+from common.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# OIDs from pg_type, see src/include/catalog/pg_type.dat in the postgres sources
+BOOL = 16
+INT8 = 20
+INT2 = 21
+INT4 = 23
+TEXT = 25
+OID = 26
+FLOAT4 = 700
+FLOAT8 = 701
+BPCHAR = 1042
+VARCHAR = 1043
+DATE = 1082
+TIMESTAMP = 1114
+TIMESTAMPTZ = 1184
+NUMERIC = 1700
+
+ARROW_TYPES: Dict[int, pa.DataType] = {
+    BOOL: pa.bool_(),
+    INT2: pa.int16(),
+    INT4: pa.int32(),
+    INT8: pa.int64(),
+    OID: pa.int64(),
+    FLOAT4: pa.float32(),
+    FLOAT8: pa.float64(),
+    # NUMERIC is decoded as float64: CIQ prices and estimates carry far fewer
+    # significant digits than a double holds
+    NUMERIC: pa.float64(),
+    TEXT: pa.string(),
+    BPCHAR: pa.string(),
+    VARCHAR: pa.string(),
+    DATE: pa.date32(),
+    TIMESTAMP: pa.timestamp("us"),
+    TIMESTAMPTZ: pa.timestamp("us", tz="UTC"),
+}
+
+
+def arrow_type(type_code: int) -> Optional[pa.DataType]:
+    """Return the Arrow type for a PostgreSQL type OID, or None if unmapped."""
+    return ARROW_TYPES.get(type_code)
+
+
+def arrow_schema(description, overrides: Optional[Dict[str, pa.DataType]] = None) -> pa.Schema:
+    """Build an Arrow schema from a DB-API cursor description.
+
+    Unmapped types fall back to string so the raw text representation is kept.
+
+    Args:
+        description: ``cursor.description`` of an executed query
+        overrides: Column name to Arrow type, taking precedence over the OID mapping
+
+    Returns:
+        pa.Schema: Schema with one field per result column
+    """
+    overrides = overrides or {}
+    fields = []
+    for desc in description:
+        name, type_code = desc[0], desc[1]
+        fields.append(pa.field(name, overrides.get(name) or arrow_type(type_code) or pa.string()))
+    return pa.schema(fields)
+
+
+def _as_float(value, cur):
+    return None if value is None else float(value)
+
+
+def _as_text(value, cur):
+    return value
+
+
+# NUMERIC is cast to float instead of Decimal; temporal types are kept as their ISO
+# text and parsed column-wise in decode_frame, which is much cheaper than building
+# one datetime object per value
+_FLOAT_CASTER = psycopg2.extensions.new_type((NUMERIC,), "NUMERIC_AS_FLOAT", _as_float)
+_TEMPORAL_CASTER = psycopg2.extensions.new_type((DATE, TIMESTAMP, TIMESTAMPTZ), "TEMPORAL_AS_TEXT", _as_text)
+
+INTEGER_TYPES = (INT2, INT4, INT8, OID)
+FLOAT_TYPES = (FLOAT4, FLOAT8, NUMERIC)
+
+
+def register_typecasters(cursor) -> None:
+    """Make a psycopg2 cursor return floats for NUMERIC and ISO text for dates/timestamps."""
+    psycopg2.extensions.register_type(_FLOAT_CASTER, cursor)
+    psycopg2.extensions.register_type(_TEMPORAL_CASTER, cursor)
+
+
+def _to_datetime(column: pd.Series, name: str, utc: bool = False) -> pd.Series:
+    """Parse ISO text to datetime64, logging values outside the datetime64 range that become NaT."""
+    converted = pd.to_datetime(column, format="ISO8601", utc=utc, errors="coerce")
+    coerced = converted.isna() & column.notna()
+    if coerced.any():
+        logger.warning(f"{int(coerced.sum())} values of column {name} are outside the datetime64 range "
+                       f"and became NaT, e.g. {column[coerced].iloc[0]!r}")
+    return converted
+
+
+def decode_frame(df: pd.DataFrame, description, dtypes: Optional[Dict] = None) -> pd.DataFrame:
+    """Convert the columns of a fetched result to typed pandas columns.
+
+    Expects values produced by a cursor set up with register_typecasters. NUMERIC
+    and FLOAT columns become float64, integers int64 (nullable Int64 when the
+    column has nulls), DATE and TIMESTAMP datetime64 and TIMESTAMPTZ UTC datetime64.
+    Dates outside the datetime64 range ('infinity', year 9999) become NaT, and
+    how many did is logged as a warning.
+
+    Args:
+        df: Result with one column per entry of description
+        description: ``cursor.description`` of the executed query
+        dtypes: Column name to dtype overrides, applied last
+
+    Returns:
+        pd.DataFrame: The same frame with converted columns
+    """
+    for position, desc in enumerate(description):
+        type_code = desc[1]
+        column = df.iloc[:, position]
+        if type_code in FLOAT_TYPES:
+            converted = pd.to_numeric(column, errors="coerce").astype("float64")
+        elif type_code in INTEGER_TYPES:
+            converted = column.astype("Int64" if column.isna().any() else "int64")
+        elif type_code in (DATE, TIMESTAMP):
+            converted = _to_datetime(column, desc[0])
+        elif type_code == TIMESTAMPTZ:
+            converted = _to_datetime(column, desc[0], utc=True)
+        else:
+            continue
+        df.isetitem(position, converted)
+    if dtypes:
+        df = df.astype(dtypes)
+    return df
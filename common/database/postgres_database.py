@@ -1,7 +1,21 @@
-from typing import Tuple, List
+from typing import Tuple, List, Dict, Iterator
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
 import psycopg2
+import psycopg2.errors
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from common.database import pg_types
+from common.database.sql_utils import numbered_placeholders, statement_name, describe_params
 from common.database.base_database import BaseDatabase
+from common.database.connection_pool import ConnectionPool
+from common.database.query_metrics import QueryMetricsCollector, Stopwatch, fingerprint
 from common.utils.logging import get_logger
 from contextlib import contextmanager
 # Initialize logger
@@ -10,54 +24,373 @@ logger = get_logger(__name__)
 class PostgresDatabase(BaseDatabase):
     """Postgres database class providing PostgresQL connection handling."""
 
-    def __init__(self, dbname: str, user: str, password:str="", host: str="localhost", port: int=5432):
+    def __init__(self, dbname: str, user: str, password:str="", host: str="localhost", port: int=5432,
+                 pooled: bool=False, min_pool_size: int=1, max_pool_size: int=5, pool_timeout: float=30.0,
+                 decode_types: bool=True, prepare_statements: bool=True,
+                 metrics: QueryMetricsCollector=None):
         """Initialize database with configuration.
 
         Args:
-            config: Database configuration containing connection details
+            dbname: Database name
+            user: Database user
+            password: Password, ignored for localhost
+            host: Database host
+            port: Database port
+            pooled: Reuse connections from a pool instead of connecting per query
+            min_pool_size: Connections opened up front in pooled mode
+            max_pool_size: Maximum concurrent connections in pooled mode
+            pool_timeout: Seconds to wait for a free pooled connection
+            decode_types: Return NUMERIC as float64 and DATE/TIMESTAMP as datetime64
+                instead of Decimal and datetime objects
+            prepare_statements: In pooled mode, run parameterized queries as server-side
+                prepared statements that are reused across calls on the same connection
+            metrics: Collector for per-query timings, sizes and the slow-query log;
+                a collector without slow-query logging is created when omitted
         """
+        self.metrics = metrics or QueryMetricsCollector()
+        self.decode_types = decode_types
+        self.prepare_statements = prepare_statements
+        # prepared statement names per connection, keyed by id(connection)
+        self._prepared: Dict[int, set] = {}
         if host == "localhost":
             self.config = dict(dbname=dbname, user=user)
         else:
             self.config = dict(dbname=dbname, user=user, password=password, host=host, port=port)
 
+        self.pool = None
         try:
-            # Test connection
-            conn = psycopg2.connect(**self.config)
-            conn.close()
+            if pooled:
+                # opening the first min_pool_size connections doubles as the connection test
+                self.pool = ConnectionPool(
+                    lambda: psycopg2.connect(**self.config),
+                    min_size=min_pool_size,
+                    max_size=max_pool_size,
+                    timeout=pool_timeout,
+                )
+            else:
+                # Test connection
+                conn = psycopg2.connect(**self.config)
+                conn.close()
             logger.info(f"Successfully connected to database {dbname}@{host}")
         except (Exception, psycopg2.DatabaseError) as e:
             logger.error(f"Failed to connect to database {dbname}@{host}: {e}")
+            if pooled and self.pool is None:
+                # fall back to a lazily filled pool so the instance stays usable
+                self.pool = ConnectionPool(
+                    lambda: psycopg2.connect(**self.config),
+                    min_size=0,
+                    max_size=max_pool_size,
+                    timeout=pool_timeout,
+                )
+        if self.pool is not None:
+            self.pool.add_discard_callback(lambda conn: self._prepared.pop(id(conn), None))
 
 
     @contextmanager
     def get_connection(self):
         """Get database connection as context manager.
 
+        In pooled mode the connection is checked out of the pool and returned
+        to it afterwards, otherwise a fresh connection is opened and closed.
+
         Yields:
             Connection: Database connection
         """
+        if self.pool is not None:
+            with self.pool.connection() as conn:
+                yield conn
+            return
+
         conn = psycopg2.connect(**self.config)
         try:
             yield conn
         finally:
             conn.close()
 
-    def query_all(self, query: str) -> List[Tuple]:
+    def pool_stats(self) -> Dict:
+        """Return connection pool counters (checkouts, wait time, connections created).
+
+        Returns:
+            dict: Pool statistics, empty when the database is not pooled
+        """
+        if self.pool is None:
+            return {}
+        return self.pool.stats()
+
+    def close(self) -> None:
+        """Close all pooled connections. No-op when the database is not pooled."""
+        if self.pool is not None:
+            stats = self.pool.stats()
+            self.pool.close()
+            logger.info(f"Connection pool closed: {stats}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _cursor(self, conn, name: str = None):
+        cur = conn.cursor(name=name) if name else conn.cursor()
+        if self.decode_types:
+            pg_types.register_typecasters(cur)
+        return cur
+
+    def _to_frame(self, rows, description, dtypes: Dict = None) -> pd.DataFrame:
+        column_names = [desc[0] for desc in description]
+        df = pd.DataFrame(rows, columns=column_names)
+        if self.decode_types:
+            df = pg_types.decode_frame(df, description, dtypes)
+        elif dtypes:
+            df = df.astype(dtypes)
+        return df
+
+    def _execute(self, conn, cur, query: str, params: Tuple = ()) -> None:
+        """Execute a query on cur, through a prepared statement when possible.
+
+        Statements are prepared once per pooled connection, keyed by a hash of
+        the SQL text, and later calls only send EXECUTE with the bound values,
+        so Postgres skips parsing and planning the statement again. Only pooled
+        connections use PREPARE: a connection opened per query would drop the
+        statement right after its single use.
+        """
+        if not (params and self.prepare_statements and self.pool is not None):
+            cur.execute(query, params or None)
+            return
+
+        name = statement_name(query)
+        prepared = self._prepared.setdefault(id(conn), set())
+        numbered, n_params = numbered_placeholders(query)
+        execute_sql = f"EXECUTE {name} ({', '.join(['%s'] * n_params)})"
+        if name not in prepared:
+            cur.execute(f"PREPARE {name} AS {numbered}")
+            prepared.add(name)
+        try:
+            cur.execute(execute_sql, params)
+        except psycopg2.errors.InvalidSqlStatementName:
+            # the statement was dropped server side (e.g. DISCARD ALL), prepare it again
+            conn.rollback()
+            cur.execute(f"PREPARE {name} AS {numbered}")
+            cur.execute(execute_sql, params)
+
+    def _explain(self, conn, query: str, params: Tuple = ()):
+        """Capture EXPLAIN (ANALYZE, BUFFERS) of a query; this runs the query again."""
+        try:
+            cur = conn.cursor()
+            cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", params or None)
+            plan = cur.fetchone()[0]
+            conn.rollback()
+            return plan
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"Could not capture query plan: {e}")
+            return None
+
+    def _record(self, conn, query: str, params: Tuple, execute_s: float, fetch_s: float, build_s: float,
+                rows: int, nbytes: int) -> None:
+        """Record the metrics of one query, capturing its plan if it was slow enough."""
+        explain = None
+        if conn is not None and self.metrics.should_explain(execute_s + fetch_s + build_s):
+            explain = self._explain(conn, query, params)
+        metrics = self.metrics.record(query, execute_s, fetch_s, build_s, rows, nbytes, explain)
+        logger.info(
+            f"Query executed successfully! Total rows: {rows} in {metrics.total_s:.3f}s",
+            extra={"extra": {k: v for k, v in metrics.to_dict().items() if k not in ("query", "explain")}},
+        )
+
+    def query_all(self, query: str, params: Tuple = (), dtypes: Dict = None) -> pd.DataFrame:
         """Execute a query and return all results.
 
+        In pooled mode, parameterized queries run as prepared statements (see _execute).
+
         Args:
-            query: SQL query to execute
+            query: SQL query to execute, with %s placeholders for params
+            params: Query parameters; lists are sent as Postgres arrays
+            dtypes: Column name to dtype overrides for this query, e.g. {"companyid": "int32"}
 
         Returns:
-            list[tuple]: List of query results
+            pd.DataFrame: Query result with typed columns
         """
         with self.get_connection() as conn:
-            cur = conn.cursor()
-            logger.info(f"Executing query: {query}")
-            cur.execute(query)
+            cur = self._cursor(conn)
+            logger.debug(f"Executing query {fingerprint(query)} with params {describe_params(params)}:\n{query}")
+            stopwatch = Stopwatch()
+            self._execute(conn, cur, query, params)
+            execute_s = stopwatch.lap()
             result = cur.fetchall()
-            logger.info(f"Query executed successfully! Total rows: {len(result)}")
-            column_names = [desc[0] for desc in cur.description]
-            df = pd.DataFrame(result, columns=column_names)
+            fetch_s = stopwatch.lap()
+            df = self._to_frame(result, cur.description, dtypes)
+            build_s = stopwatch.lap()
+            self._record(conn, query, params, execute_s, fetch_s, build_s,
+                         len(df), int(df.memory_usage(index=False).sum()))
             return df
+
+    def query_iter(self, query: str, params: Tuple = (), chunk_rows: int = 100_000,
+                   dtypes: Dict = None) -> Iterator[pd.DataFrame]:
+        """Execute a query on a server-side cursor and yield bounded-size chunks.
+
+        Only chunk_rows rows are held client side at a time, so large extractions
+        can be streamed to disk with flat memory use. The connection stays checked
+        out until the iterator is exhausted or closed.
+
+        Args:
+            query: SQL query to execute
+            params: Query parameters
+            chunk_rows: Maximum number of rows per chunk
+            dtypes: Column name to dtype overrides applied to every chunk
+
+        Yields:
+            pd.DataFrame: Consecutive chunks of the query result
+        """
+        with self.get_connection() as conn:
+            # named cursors are declared server side and fetched in batches
+            cur = self._cursor(conn, name=f"query_iter_{uuid.uuid4().hex}")
+            cur.itersize = chunk_rows
+            logger.debug(f"Executing streaming query {fingerprint(query)} with params {describe_params(params)}:\n{query}")
+            try:
+                stopwatch = Stopwatch()
+                cur.execute(query, params or None)
+                execute_s = stopwatch.lap()
+                fetch_s = build_s = 0.0
+                total_rows = total_bytes = 0
+                n_chunks = 0
+                while True:
+                    rows = cur.fetchmany(chunk_rows)
+                    fetch_s += stopwatch.lap()
+                    if not rows:
+                        break
+                    total_rows += len(rows)
+                    n_chunks += 1
+                    chunk = self._to_frame(rows, cur.description, dtypes)
+                    total_bytes += int(chunk.memory_usage(index=False).sum())
+                    build_s += stopwatch.lap()
+                    yield chunk
+                    # time spent by the consumer is not attributed to the query
+                    stopwatch.lap()
+                logger.info(f"Streaming query finished in {n_chunks} chunks")
+                self._record(None, query, params, execute_s, fetch_s, build_s, total_rows, total_bytes)
+            finally:
+                cur.close()
+
+    def export_parquet(self, query: str, output_path, params: Tuple = (),
+                       partition_cols: List[str] = None, column_types: Dict[str, pa.DataType] = None,
+                       block_size: int = 16 << 20) -> int:
+        """Bulk export a query to Parquet through ``COPY (...) TO STDOUT``.
+
+        The CSV stream produced by the server is parsed incrementally into Arrow
+        record batches and written as it arrives, so no Python object is built per
+        row and memory is bounded by block_size. Column types are taken from the
+        result description (NUMERIC becomes float64, DATE date32, ...) unless
+        overridden.
+
+        Args:
+            query: SELECT statement to export
+            output_path: Parquet file, or dataset directory when partition_cols is given;
+                an existing dataset directory is replaced
+            params: Query parameters, inlined with mogrify since COPY takes no binds
+            partition_cols: Columns to hive-partition the output by
+            column_types: Column name to Arrow type overrides
+            block_size: Bytes of CSV parsed per record batch
+
+        Returns:
+            int: Number of rows written
+        """
+        output_path = Path(output_path)
+        if partition_cols:
+            # files of an earlier export would otherwise be read alongside the new ones
+            shutil.rmtree(output_path, ignore_errors=True)
+        with self.get_connection() as conn:
+            cur = conn.cursor()
+            if params:
+                query = cur.mogrify(query, params).decode()
+            query = query.strip().rstrip(";")
+
+            # resolve the result schema without running the query
+            cur.execute(f"SELECT * FROM ({query}\n) AS export_query LIMIT 0")
+            schema = pg_types.arrow_schema(cur.description, column_types)
+            # timestamptz is rendered with a +00 offset, which arrow parses
+            cur.execute("SET LOCAL TIME ZONE 'UTC'")
+
+            # the newline keeps a trailing -- comment from swallowing the parenthesis
+            copy_sql = f"COPY ({query}\n) TO STDOUT WITH (FORMAT csv, HEADER true)"
+            logger.info(f"Exporting query {fingerprint(query)} to {output_path}")
+            logger.debug(copy_sql)
+
+            read_fd, write_fd = os.pipe()
+            copy_errors = []
+
+            def _produce():
+                with os.fdopen(write_fd, "wb") as sink:
+                    try:
+                        cur.copy_expert(copy_sql, sink)
+                    except Exception as e:
+                        copy_errors.append(e)
+
+            stopwatch = Stopwatch()
+            producer = threading.Thread(target=_produce, daemon=True)
+            producer.start()
+            total_rows = 0
+            writer = None
+            try:
+                with os.fdopen(read_fd, "rb") as source:
+                    reader = pacsv.open_csv(
+                        source,
+                        read_options=pacsv.ReadOptions(block_size=block_size),
+                        convert_options=pacsv.ConvertOptions(
+                            column_types={field.name: field.type for field in schema},
+                            true_values=["t"],
+                            false_values=["f"],
+                            strings_can_be_null=True,
+                            quoted_strings_can_be_null=False,
+                        ),
+                    )
+                    if partition_cols:
+                        batches = _RowCounter(reader)
+                        ds.write_dataset(
+                            pa.RecordBatchReader.from_batches(reader.schema, batches),
+                            output_path, format="parquet",
+                            partitioning=partition_cols, partitioning_flavor="hive",
+                            existing_data_behavior="overwrite_or_ignore",
+                        )
+                        total_rows = batches.rows
+                    else:
+                        output_path.parent.mkdir(parents=True, exist_ok=True)
+                        writer = pq.ParquetWriter(output_path, reader.schema)
+                        for batch in reader:
+                            writer.write_batch(batch)
+                            total_rows += batch.num_rows
+            except Exception as e:
+                # an error on the server side surfaces as a truncated stream here, so
+                # keep the reader's error and attach the server's as its cause
+                producer.join()
+                if copy_errors:
+                    raise e from copy_errors[0]
+                raise
+            finally:
+                if writer is not None:
+                    writer.close()
+            producer.join()
+            if copy_errors:
+                raise copy_errors[0]
+            # COPY streams and parsing overlap, so the whole export counts as fetch time
+            self.metrics.record(query, fetch_s=stopwatch.lap(), rows=total_rows,
+                                nbytes=output_path.stat().st_size if output_path.is_file() else 0)
+
+        logger.info(f"Export finished! Total rows: {total_rows} written to {output_path}")
+        return total_rows
+
+
+class _RowCounter:
+    """Iterator over record batches that counts the rows passing through."""
+
+    def __init__(self, batches):
+        self._batches = iter(batches)
+        self.rows = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        batch = next(self._batches)
+        self.rows += batch.num_rows
+        return batch
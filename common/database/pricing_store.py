@@ -0,0 +1,246 @@
+"""Local per-company pricing store that is synced incrementally from the database."""
+
+import json
+import os
+from collections import defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import pandas as pd
+
+from common.database.div_adjustment import apply_div_adj_factors
+from common.utils.logging import get_logger, log_execution_time
+
+logger = get_logger(__name__)
+
+Interval = Tuple[date, date]
+
+
+ADJUSTED_COLUMNS = ("divadjclose", "divadjfactor")
+
+
+def _to_date(value) -> date:
+    return pd.Timestamp(value).date()
+
+
+def merge_intervals(intervals: Sequence[Interval]) -> List[Interval]:
+    """Merge overlapping or adjacent inclusive date intervals."""
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def missing_intervals(covered: Sequence[Interval], start: date, end: date) -> List[Interval]:
+    """Return the parts of [start, end] not contained in the covered intervals."""
+    gaps = []
+    cursor = start
+    for covered_start, covered_end in merge_intervals(covered):
+        if covered_end < cursor:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > cursor:
+            gaps.append((cursor, covered_start - timedelta(days=1)))
+        cursor = max(cursor, covered_end + timedelta(days=1))
+        if cursor > end:
+            break
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def remove_interval(covered: Sequence[Interval], start: date, end: date) -> List[Interval]:
+    """Return the covered intervals with [start, end] cut out."""
+    remaining = []
+    for covered_start, covered_end in covered:
+        if covered_start < start:
+            remaining.append((covered_start, min(covered_end, start - timedelta(days=1))))
+        if covered_end > end:
+            remaining.append((max(covered_start, end + timedelta(days=1)), covered_end))
+    return merge_intervals(remaining)
+
+
+class PricingStore:
+    """Per-company Parquet store of raw miadjprice rows with coverage metadata.
+
+    Each company lives in ``store_dir/companyid=<id>.parquet`` and
+    ``store_dir/coverage.json`` records which inclusive date ranges have been
+    fetched for it (including ranges that returned no rows, e.g. holidays), so a
+    sync only asks the database for the gaps.
+
+    Only unadjusted prices are stored: the dividend adjustment of past dates
+    changes with every new dividend, so divadjclose and divadjfactor are computed
+    when loading, from the factor intervals in ``store_dir/div_adj_factors.parquet``.
+    That small table is refetched in full for the synced companies on every sync,
+    so loads always reflect the dividends known at the last sync.
+    """
+
+    def __init__(self, store_dir):
+        """Initialize the store.
+
+        Args:
+            store_dir: Directory holding the per-company files and coverage.json
+        """
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self._coverage_path = self.store_dir / "coverage.json"
+        self._factors_path = self.store_dir / "div_adj_factors.parquet"
+        self.coverage: Dict[int, List[Interval]] = self._load_coverage()
+
+    def _load_coverage(self) -> Dict[int, List[Interval]]:
+        if not self._coverage_path.exists():
+            return {}
+        with open(self._coverage_path) as f:
+            raw = json.load(f)
+        return {
+            int(companyid): [(date.fromisoformat(s), date.fromisoformat(e)) for s, e in intervals]
+            for companyid, intervals in raw.items()
+        }
+
+    def _save_coverage(self) -> None:
+        raw = {
+            str(companyid): [[s.isoformat(), e.isoformat()] for s, e in intervals]
+            for companyid, intervals in sorted(self.coverage.items())
+        }
+        tmp_path = self._coverage_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(raw, f, indent=1)
+        os.replace(tmp_path, self._coverage_path)
+
+    def _company_path(self, companyid: int) -> Path:
+        return self.store_dir / f"companyid={companyid}.parquet"
+
+    def missing(self, start, end, ls_ids) -> Dict[Interval, List[int]]:
+        """Work out which (company, date range) gaps are not in the store yet.
+
+        Args:
+            start: First date of the requested window
+            end: Last date of the requested window
+            ls_ids: Company ids
+
+        Returns:
+            dict: Gap interval -> company ids missing exactly that interval, so
+                companies sharing a gap (typically the last few days) are fetched together
+        """
+        start, end = _to_date(start), _to_date(end)
+        gaps = defaultdict(list)
+        for companyid in dict.fromkeys(int(i) for i in ls_ids):
+            for gap in missing_intervals(self.coverage.get(companyid, []), start, end):
+                gaps[gap].append(companyid)
+        return dict(gaps)
+
+    def _merge_company(self, companyid: int, new_rows: pd.DataFrame) -> None:
+        path = self._company_path(companyid)
+        if path.exists():
+            new_rows = pd.concat([pd.read_parquet(path), new_rows], ignore_index=True)
+        new_rows = (
+            # stores written before prices were adjusted on load also hold the adjusted columns
+            new_rows.drop(columns=list(ADJUSTED_COLUMNS), errors="ignore")
+            .drop_duplicates(subset=["tradingitemid", "pricedate"], keep="last")
+            .sort_values(["pricedate", "tradingitemid"], ignore_index=True)
+        )
+        tmp_path = path.with_suffix(".parquet.tmp")
+        new_rows.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    def _sync_factors(self, repository, start: date, end: date, ls_ids: List[int]) -> None:
+        """Refetch the dividend adjustment factors of the companies over everything stored for them."""
+        covered_starts = [intervals[0][0] for i in ls_ids for intervals in [self.coverage.get(i)] if intervals]
+        factors = repository.get_div_adj_factors(min(covered_starts + [start]), end, ls_ids, use_cache=False)
+        if self._factors_path.exists():
+            stored = pd.read_parquet(self._factors_path)
+            # replace the intervals of every trading item of the synced companies
+            tradingitemids = set(factors["tradingitemid"])
+            for companyid in ls_ids:
+                path = self._company_path(companyid)
+                if path.exists():
+                    tradingitemids.update(pd.read_parquet(path, columns=["tradingitemid"])["tradingitemid"])
+            factors = pd.concat([stored[~stored["tradingitemid"].isin(tradingitemids)], factors], ignore_index=True)
+        tmp_path = self._factors_path.with_suffix(".parquet.tmp")
+        factors.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self._factors_path)
+
+    @log_execution_time
+    def sync(self, repository, start, end, ls_ids, refresh: bool = False) -> int:
+        """Fetch only the missing parts of [start, end] for ls_ids and merge them in.
+
+        The dividend adjustment factors of ls_ids are refetched on every sync, so
+        new dividends also re-adjust the prices stored earlier. Both queries bypass
+        the repository's query cache, which would otherwise serve them until its TTL.
+
+        Args:
+            repository: TaskManagerRepository used for the gap queries
+            start: First date of the window
+            end: Last date of the window
+            ls_ids: Company ids
+            refresh: Forget the coverage of [start, end] first and refetch it, e.g. after
+                the raw prices were corrected in the database
+
+        Returns:
+            int: Number of price rows fetched from the database
+        """
+        start, end = _to_date(start), _to_date(end)
+        ls_ids = list(dict.fromkeys(int(i) for i in ls_ids))
+        if refresh:
+            for companyid in ls_ids:
+                self.coverage[companyid] = remove_interval(self.coverage.get(companyid, []), start, end)
+
+        gaps = self.missing(start, end, ls_ids)
+        logger.info(f"Pricing sync: {sum(len(ids) for ids in gaps.values())} company gaps in {len(gaps)} distinct ranges")
+
+        fetched_rows = 0
+        for (gap_start, gap_end), ids in gaps.items():
+            prices = repository.get_miadj_pricing_raw(gap_start, gap_end, ids, use_cache=False)
+            fetched_rows += len(prices)
+            for companyid, rows in prices.groupby("companyid", sort=False):
+                self._merge_company(int(companyid), rows)
+            for companyid in ids:
+                self.coverage[companyid] = merge_intervals(self.coverage.get(companyid, []) + [(gap_start, gap_end)])
+            # persist after each range so an interrupted sync keeps its progress
+            self._save_coverage()
+
+        self._sync_factors(repository, start, end, ls_ids)
+        logger.info(f"Pricing sync fetched {fetched_rows} rows")
+        return fetched_rows
+
+    def load(self, start, end, ls_ids, columns: List[str] = None) -> pd.DataFrame:
+        """Read stored prices for ls_ids within [start, end], ordered by pricedate, adjusted for dividends.
+
+        Args:
+            start: First date of the window
+            end: Last date of the window
+            ls_ids: Company ids
+            columns: Optional subset of columns to read
+
+        Returns:
+            pd.DataFrame: Stored rows with divadjclose and divadjfactor computed from the
+                stored factor intervals, in the layout of get_hist_miadj_pricing
+        """
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        adjust = columns is None or any(c in ADJUSTED_COLUMNS for c in columns)
+        read_columns = None
+        if columns is not None:
+            needed = [c for c in columns if c not in ADJUSTED_COLUMNS] + ["pricedate"]
+            if adjust:
+                needed += ["tradingitemid", "priceclose"]
+            read_columns = list(dict.fromkeys(needed))
+        frames = []
+        for companyid in dict.fromkeys(int(i) for i in ls_ids):
+            path = self._company_path(companyid)
+            if not path.exists():
+                continue
+            df = pd.read_parquet(path, columns=read_columns, filters=[("pricedate", ">=", start), ("pricedate", "<=", end)])
+            frames.append(df.drop(columns=list(ADJUSTED_COLUMNS), errors="ignore"))
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        df = pd.concat(frames, ignore_index=True).sort_values("pricedate", kind="stable", ignore_index=True)
+        if adjust:
+            factors = (pd.read_parquet(self._factors_path) if self._factors_path.exists()
+                       else pd.DataFrame(columns=["tradingitemid", "fromdate", "todate", "divadjfactor"]))
+            df = apply_div_adj_factors(df, factors)
+        return df if columns is None else df[columns]
@@ -0,0 +1,202 @@
+"""Two-tier cache for query results: in-memory LRU plus content-addressed Parquet on disk."""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional, Sequence
+
+import pandas as pd
+
+from common.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_CACHE_DIR = Path(os.getenv("FINRESEARCH_CACHE_DIR", ".cache")) / "queries"
+
+_WHITESPACE = re.compile(r"\s+")
+_LINE_COMMENT = re.compile(r"--[^\n]*")
+
+
+def normalize_query(query: str) -> str:
+    """Strip line comments and collapse whitespace so formatting changes keep the same key."""
+    return _WHITESPACE.sub(" ", _LINE_COMMENT.sub("", query)).strip().rstrip(";").strip()
+
+
+def _normalize_param(param):
+    if isinstance(param, (list, tuple)):
+        return [_normalize_param(p) for p in param]
+    if hasattr(param, "isoformat"):
+        return param.isoformat()
+    if hasattr(param, "item"):
+        # numpy scalars
+        return param.item()
+    return param
+
+
+def cache_key(query: str, params: Sequence = ()) -> str:
+    """Return the content address of a query and its parameters."""
+    payload = normalize_query(query) + "\x00" + repr(_normalize_param(list(params or ())))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class QueryCache:
+    """Cache query results in memory (LRU with a byte budget) and on disk as Parquet.
+
+    Disk entries live under ``cache_dir/<key[:2]>/<key>.parquet``, expire after
+    ``ttl`` seconds and are evicted least recently used first once the directory
+    grows beyond ``max_disk_bytes``.
+    """
+
+    def __init__(
+        self,
+        cache_dir=DEFAULT_CACHE_DIR,
+        max_memory_bytes: int = 512 * 1024 ** 2,
+        max_disk_bytes: int = 20 * 1024 ** 3,
+        ttl: Optional[float] = 7 * 24 * 3600,
+    ):
+        """Initialize the cache.
+
+        Args:
+            cache_dir: Directory of the on-disk tier, None for memory only
+            max_memory_bytes: Byte budget of the in-memory tier, 0 disables it
+            max_disk_bytes: Size above which the oldest disk entries are evicted
+            ttl: Seconds after which a disk entry is considered stale, None for no expiry
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.RLock()
+        self._stats = dict(memory_hits=0, disk_hits=0, misses=0, stores=0, evictions=0)
+
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _disk_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.parquet"
+
+    def _remember(self, key: str, df: pd.DataFrame) -> None:
+        nbytes = int(df.memory_usage(deep=True).sum())
+        if nbytes > self.max_memory_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._memory_bytes -= self._memory.pop(key)[1]
+            self._memory[key] = (df, nbytes)
+            self._memory_bytes += nbytes
+            while self._memory_bytes > self.max_memory_bytes:
+                _, (_, evicted_bytes) = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted_bytes
+                self._stats["evictions"] += 1
+
+    def get(self, query: str, params: Sequence = ()) -> Optional[pd.DataFrame]:
+        """Look up a cached result.
+
+        Returns:
+            pd.DataFrame or None: A copy of the cached result, None on a miss
+        """
+        key = cache_key(query, params)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return entry[0].copy()
+
+        if self.cache_dir is not None:
+            path = self._disk_path(key)
+            if path.exists():
+                if self.ttl is not None and time.time() - path.stat().st_mtime > self.ttl:
+                    path.unlink(missing_ok=True)
+                else:
+                    df = pd.read_parquet(path)
+                    # bump the access time used for size-based eviction
+                    os.utime(path, (time.time(), path.stat().st_mtime))
+                    self._remember(key, df)
+                    with self._lock:
+                        self._stats["disk_hits"] += 1
+                    return df.copy()
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, query: str, params: Sequence, df: pd.DataFrame) -> None:
+        """Store a result in both tiers."""
+        key = cache_key(query, params)
+        self._remember(key, df)
+        with self._lock:
+            self._stats["stores"] += 1
+        if self.cache_dir is None:
+            return
+        path = self._disk_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            tmp_path.unlink(missing_ok=True)
+            logger.warning(f"Could not write query result to disk cache: {e}")
+            return
+        self._evict_disk()
+
+    def get_or_compute(self, query: str, params: Sequence, compute: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """Return the cached result, or compute, store and return it."""
+        df = self.get(query, params)
+        if df is None:
+            df = compute()
+            self.put(query, params, df)
+            # hand out a copy so callers cannot mutate the cached frame
+            df = df.copy()
+        return df
+
+    def _evict_disk(self) -> None:
+        entries = [(p, p.stat()) for p in self.cache_dir.glob("*/*.parquet")]
+        total = sum(stat.st_size for _, stat in entries)
+        if total <= self.max_disk_bytes:
+            return
+        # least recently read first
+        for path, stat in sorted(entries, key=lambda entry: entry[1].st_atime):
+            if total <= self.max_disk_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= stat.st_size
+            with self._lock:
+                self._stats["evictions"] += 1
+
+    def invalidate(self, query: Optional[str] = None, params: Sequence = ()) -> None:
+        """Drop one cached result, or everything when no query is given."""
+        if query is None:
+            with self._lock:
+                self._memory.clear()
+                self._memory_bytes = 0
+            if self.cache_dir is not None:
+                for path in self.cache_dir.glob("*/*.parquet"):
+                    path.unlink(missing_ok=True)
+            logger.info("Query cache cleared")
+            return
+
+        key = cache_key(query, params)
+        with self._lock:
+            entry = self._memory.pop(key, None)
+            if entry is not None:
+                self._memory_bytes -= entry[1]
+        if self.cache_dir is not None:
+            self._disk_path(key).unlink(missing_ok=True)
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and the current memory footprint."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["memory_entries"] = len(self._memory)
+            snapshot["memory_bytes"] = self._memory_bytes
+        snapshot["hits"] = snapshot["memory_hits"] + snapshot["disk_hits"]
+        return snapshot
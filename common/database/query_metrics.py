@@ -0,0 +1,257 @@
+"""Per-query metrics for the database layer: phase timings, sizes, fingerprints and a slow-query log."""
+
+import contextvars
+import hashlib
+import inspect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from functools import wraps
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from common.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# name of the repository method currently issuing queries
+_current_label: contextvars.ContextVar = contextvars.ContextVar("query_label", default=None)
+
+_COMMENT = re.compile(r"--[^\n]*")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(query: str) -> str:
+    """Return a short hash identifying the shape of a query.
+
+    Comments, whitespace, literals and inlined IN lists are normalized away, so
+    the same statement with different ids or dates gets the same fingerprint.
+    """
+    normalized = _COMMENT.sub(" ", query)
+    normalized = _STRING_LITERAL.sub("?", normalized)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _IN_LIST.sub("(?)", normalized)
+    normalized = _WHITESPACE.sub(" ", normalized).strip().lower()
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def current_label() -> Optional[str]:
+    """Return the repository method label of the running query, if any."""
+    return _current_label.get()
+
+
+def _label_generator(label: str, gen):
+    try:
+        while True:
+            token = _current_label.set(label)
+            try:
+                item = next(gen)
+            except StopIteration:
+                return
+            finally:
+                _current_label.reset(token)
+            yield item
+    finally:
+        gen.close()
+
+
+async def _label_coroutine(label: str, coro):
+    token = _current_label.set(label)
+    try:
+        return await coro
+    finally:
+        _current_label.reset(token)
+
+
+async def _label_async_generator(label: str, agen):
+    try:
+        while True:
+            token = _current_label.set(label)
+            try:
+                item = await agen.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                _current_label.reset(token)
+            yield item
+    finally:
+        await agen.aclose()
+
+
+def labelled(func):
+    """Attribute every query issued by func to its name in the collected metrics.
+
+    Works for methods returning plain results, generators (streaming), and
+    coroutines or async generators (AsyncTaskManagerRepository), whose queries
+    run after the call returns.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        label = func.__name__
+        token = _current_label.set(label)
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            _current_label.reset(token)
+        if inspect.iscoroutine(result):
+            return _label_coroutine(label, result)
+        if inspect.isgenerator(result):
+            return _label_generator(label, result)
+        if inspect.isasyncgen(result):
+            return _label_async_generator(label, result)
+        return result
+
+    return wrapper
+
+
+@dataclass
+class QueryMetrics:
+    """Timings and sizes of one executed query."""
+
+    fingerprint: str
+    label: Optional[str]
+    execute_s: float
+    fetch_s: float
+    build_s: float
+    rows: int
+    bytes: int
+    total_s: float = 0.0
+    query: str = ""
+    explain: Optional[list] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        if not self.total_s:
+            self.total_s = self.execute_s + self.fetch_s + self.build_s
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class QueryMetricsCollector:
+    """Thread-safe collector of QueryMetrics with a slow-query log.
+
+    Queries slower than ``slow_query_seconds`` are appended as JSON lines to
+    ``logs/slow_queries_<date>.log``. Queries slower than ``explain_seconds`` are
+    additionally run through ``EXPLAIN (ANALYZE, BUFFERS)`` by backends that
+    support it; note that this executes the query a second time.
+    """
+
+    def __init__(self, slow_query_seconds: Optional[float] = None, explain_seconds: Optional[float] = None,
+                 slow_query_log: Optional[str] = None, keep_queries: int = 10_000):
+        """Initialize the collector.
+
+        Args:
+            slow_query_seconds: Latency above which a query goes to the slow-query log
+            explain_seconds: Latency above which the query plan is captured with EXPLAIN ANALYZE
+            slow_query_log: Path of the slow-query log file
+            keep_queries: Maximum number of per-query records kept in memory
+        """
+        self.slow_query_seconds = slow_query_seconds
+        self.explain_seconds = explain_seconds
+        self.keep_queries = keep_queries
+        self._records: List[QueryMetrics] = []
+        self._lock = threading.Lock()
+        self._slow_logger = None
+        if slow_query_seconds is not None or explain_seconds is not None:
+            self._slow_logger = self._make_slow_logger(
+                slow_query_log or f"logs/slow_queries_{datetime.now().strftime('%Y%m%d')}.log"
+            )
+
+    @staticmethod
+    def _make_slow_logger(path: str) -> logging.Logger:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        slow_logger = logging.getLogger(f"slow_queries.{path}")
+        slow_logger.propagate = False
+        slow_logger.setLevel(logging.INFO)
+        if not slow_logger.handlers:
+            handler = logging.FileHandler(path)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            slow_logger.addHandler(handler)
+        return slow_logger
+
+    def should_explain(self, seconds: float) -> bool:
+        """Whether a query that took this long should have its plan captured."""
+        return self.explain_seconds is not None and seconds >= self.explain_seconds
+
+    def record(self, query: str, execute_s: float = 0.0, fetch_s: float = 0.0, build_s: float = 0.0,
+               rows: int = 0, nbytes: int = 0, explain: Optional[list] = None) -> QueryMetrics:
+        """Record one executed query and write it to the slow-query log if needed.
+
+        Returns:
+            QueryMetrics: The recorded metrics
+        """
+        metrics = QueryMetrics(
+            fingerprint=fingerprint(query),
+            label=current_label(),
+            execute_s=execute_s,
+            fetch_s=fetch_s,
+            build_s=build_s,
+            rows=rows,
+            bytes=nbytes,
+            query=query,
+            explain=explain,
+        )
+        with self._lock:
+            self._records.append(metrics)
+            if len(self._records) > self.keep_queries:
+                del self._records[: len(self._records) - self.keep_queries]
+
+        slow = self.slow_query_seconds is not None and metrics.total_s >= self.slow_query_seconds
+        if self._slow_logger is not None and (slow or explain is not None):
+            entry = metrics.to_dict()
+            entry["timestamp"] = datetime.now().isoformat()
+            self._slow_logger.info(json.dumps(entry, default=str))
+        return metrics
+
+    def records(self) -> pd.DataFrame:
+        """Return all recorded queries as a DataFrame (without plans)."""
+        with self._lock:
+            rows = [m.to_dict() for m in self._records]
+        df = pd.DataFrame(rows, columns=[f for f in QueryMetrics.__dataclass_fields__])
+        return df.drop(columns=["explain"])
+
+    def summary(self) -> pd.DataFrame:
+        """Aggregate the recorded queries by repository method, slowest first.
+
+        Returns:
+            pd.DataFrame: One row per label with query count, phase timings, rows and bytes
+        """
+        df = self.records()
+        df["label"] = df["label"].fillna("<unlabelled>")
+        summary = df.groupby("label").agg(
+            queries=("fingerprint", "size"),
+            total_s=("total_s", "sum"),
+            execute_s=("execute_s", "sum"),
+            fetch_s=("fetch_s", "sum"),
+            build_s=("build_s", "sum"),
+            max_s=("total_s", "max"),
+            rows=("rows", "sum"),
+            bytes=("bytes", "sum"),
+        )
+        return summary.sort_values("total_s", ascending=False)
+
+    def reset(self) -> None:
+        """Forget all recorded queries."""
+        with self._lock:
+            self._records.clear()
+
+
+class Stopwatch:
+    """Measure consecutive phases: ``lap()`` returns the seconds since the previous lap."""
+
+    def __init__(self):
+        self._last = time.perf_counter()
+
+    def lap(self) -> float:
+        now = time.perf_counter()
+        elapsed, self._last = now - self._last, now
+        return elapsed
@@ -0,0 +1,78 @@
+"""Split large repository pulls into shards and run them concurrently."""
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from common.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def shard_ids(ids: Sequence, shard_size: int) -> List[list]:
+    """Split ids into consecutive shards of at most shard_size, keeping their order.
+
+    Args:
+        ids: Company (or other) ids, duplicates are dropped
+        shard_size: Maximum number of ids per shard
+
+    Returns:
+        list[list]: Non-empty id shards
+    """
+    unique_ids = list(dict.fromkeys(int(i) for i in ids))
+    if not shard_size or shard_size >= len(unique_ids):
+        return [unique_ids]
+    return [unique_ids[i:i + shard_size] for i in range(0, len(unique_ids), shard_size)]
+
+
+def shard_date_range(start, end, freq: Optional[str] = None) -> List[Tuple]:
+    """Split an inclusive date range into consecutive, non-overlapping inclusive windows.
+
+    Args:
+        start: First date of the range
+        end: Last date of the range
+        freq: pandas offset alias at which windows start, e.g. 'YS' or 'QS';
+            None keeps the range in one piece
+
+    Returns:
+        list[tuple]: (window_start, window_end) pairs as datetime.date
+    """
+    start = pd.Timestamp(start).normalize()
+    end = pd.Timestamp(end).normalize()
+    if freq is None or start >= end:
+        return [(start.date(), end.date())]
+    boundaries = [start] + [b for b in pd.date_range(start, end, freq=freq) if b > start]
+    windows = []
+    for i, window_start in enumerate(boundaries):
+        if i + 1 < len(boundaries):
+            window_end = boundaries[i + 1] - pd.Timedelta(days=1)
+        else:
+            window_end = end
+        windows.append((window_start.date(), window_end.date()))
+    return windows
+
+
+def run_sharded(fetch: Callable, shards: Sequence, max_workers: int = 4) -> pd.DataFrame:
+    """Run fetch(shard) for every shard on a bounded thread pool and concatenate the results.
+
+    Results are concatenated in shard order regardless of completion order, so the
+    output is deterministic.
+
+    Args:
+        fetch: Callable returning a DataFrame for one shard
+        shards: Shards to fetch
+        max_workers: Maximum number of concurrent fetches
+
+    Returns:
+        pd.DataFrame: Concatenated results
+    """
+    logger.info(f"Running {len(shards)} shards on {min(max_workers, len(shards))} workers")
+    if len(shards) == 1:
+        return fetch(shards[0])
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # run every shard in a copy of the caller's context so query labels reach the workers
+        futures = [executor.submit(contextvars.copy_context().run, fetch, shard) for shard in shards]
+        frames = [future.result() for future in futures]
+    return pd.concat(frames, ignore_index=True)
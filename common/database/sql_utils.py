@@ -0,0 +1,52 @@
+"""Helpers for rewriting and describing SQL statements and their parameters."""
+
+import hashlib
+import re
+from typing import Sequence, Tuple
+
+_PLACEHOLDER = re.compile(r"%%|%s")
+
+
+def numbered_placeholders(query: str) -> Tuple[str, int]:
+    """Rewrite pyformat ``%s`` placeholders to ``$1, $2, ...``.
+
+    ``%%`` escapes are turned back into a literal ``%``. Used for server-side
+    PREPARE statements and for drivers that expect numbered parameters.
+
+    Args:
+        query: SQL with ``%s`` placeholders
+
+    Returns:
+        tuple: Rewritten SQL and the number of placeholders
+    """
+    count = 0
+
+    def _replace(match):
+        nonlocal count
+        if match.group(0) == "%%":
+            return "%"
+        count += 1
+        return f"${count}"
+
+    return _PLACEHOLDER.sub(_replace, query), count
+
+
+def qmark_placeholders(query: str) -> str:
+    """Rewrite pyformat ``%s`` placeholders to ``?`` (and ``%%`` back to ``%``)."""
+    return _PLACEHOLDER.sub(lambda match: "%" if match.group(0) == "%%" else "?", query)
+
+
+def statement_name(query: str, prefix: str = "fr") -> str:
+    """Return a stable identifier for a SQL text, usable as prepared statement name."""
+    return f"{prefix}_{hashlib.sha1(query.encode()).hexdigest()[:16]}"
+
+
+def describe_params(params: Sequence) -> str:
+    """Summarize query parameters for logging without dumping long ID lists."""
+    parts = []
+    for param in params or ():
+        if isinstance(param, (list, tuple)):
+            parts.append(f"<{len(param)} values>")
+        else:
+            parts.append(repr(param))
+    return "(" + ", ".join(parts) + ")"
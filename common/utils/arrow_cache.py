@@ -0,0 +1,206 @@
+"""Local cache of decoded datasets as memory-mapped Arrow IPC files, shared by all processes."""
+
+import hashlib
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from common.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_CACHE_DIR = Path(os.getenv("FINRESEARCH_CACHE_DIR", ".cache")) / "arrow"
+
+# bump when the cached file layout changes, so old entries are not reused
+CACHE_VERSION = 1
+
+# pyarrow-backed strings with NaN for missing values, the pandas 3 default str dtype
+_ARROW_STRING_DTYPE = pd.StringDtype("pyarrow", na_value=np.nan)
+_ARROW_STRINGS = {pa.string(): _ARROW_STRING_DTYPE, pa.large_string(): _ARROW_STRING_DTYPE}
+
+
+def _sha256_file(path: Path, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ArrowCache:
+    """Decode a Parquet or CSV file once, then let every process map the result zero-copy.
+
+    The decoded table is written as an uncompressed Arrow IPC file under
+    ``<cache_dir>/<key>.arrow``, where the key hashes the source's content
+    together with the reader options. Later loads, in this or any other
+    process, memory-map that file instead of parsing the source again: opening
+    takes milliseconds, pages are read lazily, and concurrent processes share
+    one copy in the OS page cache.
+
+    Hashing a large source on every load would cost as much as reading it, so
+    the content hash of each source is remembered with its size and mtime and
+    only recomputed when those change.
+
+    Cached files not read for ``max_age`` seconds are deleted, and the least
+    recently read ones go once the cache grows beyond ``max_disk_bytes``.
+    Processes that still map a deleted file keep reading it safely.
+
+    Example:
+        cache = ArrowCache()
+        df = cache.read("research/brokerage_culture/input_data/question_transcripts_with_employer.parquet")
+        et_ref = cache.read("research/brokerage_culture/input_data/us_et_ref_v2.csv", index_col=0)
+    """
+
+    def __init__(self, cache_dir=None, max_disk_bytes: int = 20 * 1024 ** 3,
+                 max_age: Optional[float] = 30 * 24 * 3600):
+        """Initialize the cache.
+
+        Args:
+            cache_dir: Directory of the cache (default: $FINRESEARCH_CACHE_DIR/arrow, or .cache/arrow)
+            max_disk_bytes: Size above which the least recently read files are evicted
+            max_age: Seconds without a read after which a file is evicted, None for no expiry
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+        self.max_disk_bytes = max_disk_bytes
+        self.max_age = max_age
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def source_hash(self, path) -> str:
+        """Return the sha256 of a source file's content, rehashing only if its size or mtime changed."""
+        path = Path(path).resolve()
+        stat = path.stat()
+        stamp_path = self.cache_dir / "sources" / f"{hashlib.sha256(str(path).encode()).hexdigest()}.json"
+        if stamp_path.exists():
+            with open(stamp_path) as f:
+                stamp = json.load(f)
+            if stamp["size"] == stat.st_size and stamp["mtime_ns"] == stat.st_mtime_ns:
+                return stamp["sha256"]
+
+        stamp = {"path": str(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                 "sha256": _sha256_file(path)}
+        stamp_path.parent.mkdir(exist_ok=True)
+        tmp_path = stamp_path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(stamp, f)
+        os.replace(tmp_path, stamp_path)
+        return stamp["sha256"]
+
+    def _key(self, path: Path, read_options: Dict) -> str:
+        options = json.dumps(read_options, sort_keys=True, default=str)
+        return hashlib.sha256(
+            f"{CACHE_VERSION}:{self.source_hash(path)}:{path.suffix}:{options}".encode()
+        ).hexdigest()
+
+    @staticmethod
+    def _decode(path: Path, read_options: Dict) -> pa.Table:
+        """Parse a source file the same way the pandas readers would."""
+        if path.suffix == ".parquet":
+            return pq.read_table(path, **read_options)
+        if path.suffix == ".csv":
+            # pandas parsing (and its index) is kept, so cached and uncached reads agree
+            return pa.Table.from_pandas(pd.read_csv(path, **read_options))
+        raise ValueError(f"Unsupported file type: {path.suffix}")
+
+    def table(self, path, **read_options) -> pa.Table:
+        """Return a source file as an Arrow table backed by the memory-mapped cache file.
+
+        Args:
+            path: Parquet or CSV file
+            **read_options: Passed to pq.read_table or pd.read_csv; part of the cache key
+
+        Returns:
+            pa.Table: Zero-copy view of the cached file
+        """
+        path = Path(path)
+        cache_path = self.cache_dir / f"{self._key(path, read_options)}.arrow"
+        if not cache_path.exists():
+            logger.info(f"Arrow cache miss for {path}, decoding it into {cache_path}")
+            table = self._decode(path, read_options)
+            tmp_path = cache_path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+            # uncompressed, so the mapped buffers are usable without decoding
+            with pa.OSFile(str(tmp_path), "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, cache_path)
+            self.evict(keep=cache_path)
+        table = pa.ipc.open_file(pa.memory_map(str(cache_path), "r")).read_all()
+        # bump the access time used for eviction
+        os.utime(cache_path, (time.time(), cache_path.stat().st_mtime))
+        return table
+
+    def read(self, path, arrow_strings: bool = True, **read_options) -> pd.DataFrame:
+        """Return a source file as a DataFrame, like pd.read_parquet / pd.read_csv, via the cache.
+
+        String columns keep pointing at the mapped file as pandas' pyarrow-backed
+        str dtype, with NaN for missing values like pandas 3 uses by default, so
+        no Python object is built per string. Numeric columns are copied into
+        writable arrays.
+
+        Args:
+            path: Parquet or CSV file
+            arrow_strings: False to convert string columns to Python objects, as the pandas readers do
+            **read_options: Passed to pq.read_table or pd.read_csv; part of the cache key
+
+        Returns:
+            pd.DataFrame: The decoded source
+        """
+        table = self.table(path, **read_options)
+        return table.to_pandas(types_mapper=_ARROW_STRINGS.get if arrow_strings else None)
+
+    def evict(self, keep: Optional[Path] = None) -> int:
+        """Delete cached files unread for max_age, then the least recently read beyond max_disk_bytes.
+
+        Args:
+            keep: Cached file never deleted, e.g. the one about to be read
+
+        Returns:
+            int: Number of files removed
+        """
+        entries = [(p, p.stat()) for p in self.cache_dir.glob("*.arrow") if p != keep]
+        total = keep.stat().st_size if keep is not None else 0
+        removed = 0
+        if self.max_age is not None:
+            now = time.time()
+            expired = [(p, stat) for p, stat in entries if now - stat.st_atime > self.max_age]
+            for path, _ in expired:
+                path.unlink(missing_ok=True)
+            removed += len(expired)
+            entries = [(p, stat) for p, stat in entries if now - stat.st_atime <= self.max_age]
+        total += sum(stat.st_size for _, stat in entries)
+        # least recently read first
+        for path, stat in sorted(entries, key=lambda entry: entry[1].st_atime):
+            if total <= self.max_disk_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= stat.st_size
+            removed += 1
+        if removed:
+            logger.info(f"Evicted {removed} files from the Arrow cache {self.cache_dir}")
+        return removed
+
+    def clear(self) -> int:
+        """Delete every cached file and return how many were removed."""
+        removed = 0
+        for cache_path in self.cache_dir.glob("*.arrow"):
+            cache_path.unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+
+_default_cache: Optional[ArrowCache] = None
+
+
+def cached_read(path, arrow_strings: bool = True, **read_options) -> pd.DataFrame:
+    """Read a Parquet or CSV file through the default ArrowCache, see ArrowCache.read."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ArrowCache()
+    return _default_cache.read(path, arrow_strings=arrow_strings, **read_options)
@@ -1,5 +1,6 @@
 """Data conversion utilities."""
 
-from .csv_to_parquet import convert_csv_to_parquet
+from .csv_to_parquet import convert_csv_to_parquet, convert_directory
+from .schema_optimizer import SchemaRegistry, infer_dtypes, optimize_frame
 
-__all__ = ['convert_csv_to_parquet'] 
\ No newline at end of file
+__all__ = ['convert_csv_to_parquet', 'convert_directory', 'SchemaRegistry', 'infer_dtypes', 'optimize_frame']
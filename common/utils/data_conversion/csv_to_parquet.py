@@ -1,66 +1,344 @@
 #!/usr/bin/env python3
 """Convert CSV files to Parquet format."""
 
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 from pathlib import Path
+from typing import Dict, Optional
 import argparse
 
+from common.utils.data_conversion.schema_optimizer import (
+    ArrowColumnStats, Float32, SchemaRegistry, arrow_type, cast_batch, optimize_frame,
+)
 
-def convert_csv_to_parquet(csv_path: str, output_dir: str = None) -> None:
+MANIFEST_NAME = '.csv_to_parquet_manifest.json'
+
+
+def _is_temporal(data_type: pa.DataType) -> bool:
+    return pa.types.is_timestamp(data_type) or pa.types.is_date(data_type) or pa.types.is_time(data_type)
+
+
+def _locked_schema(csv_path: Path, block_size: int, column_types: Dict[str, pa.DataType]) -> pa.Schema:
+    """Infer the schema from the first block of a CSV, with explicit overrides applied.
+
+    Columns that are empty throughout the first block are inferred as null and
+    would fail on the first later value, so they are read as strings. Date and
+    timestamp columns are kept as strings too, as pd.read_csv leaves them, unless
+    column_types gives them a type.
+    """
+    reader = pacsv.open_csv(
+        csv_path,
+        read_options=pacsv.ReadOptions(block_size=block_size),
+        convert_options=pacsv.ConvertOptions(column_types=column_types),
+    )
+    schema = reader.schema
+    reader.close()
+    return pa.schema([
+        field.with_type(pa.string())
+        if pa.types.is_null(field.type) or (_is_temporal(field.type) and field.name not in column_types)
+        else field
+        for field in schema
+    ])
+
+
+def _open_blocks(csv_path: Path, block_size: int, schema: pa.Schema):
+    return pacsv.open_csv(
+        csv_path,
+        read_options=pacsv.ReadOptions(block_size=block_size),
+        convert_options=pacsv.ConvertOptions(column_types={field.name: field.type for field in schema}),
+    )
+
+
+def _optimized_schema(csv_path: Path, block_size: int, schema: pa.Schema, dataset: str,
+                      registry: Optional[SchemaRegistry], float32: Float32) -> pa.Schema:
+    """Scan the CSV once for integer ranges and string cardinalities and return the narrowed schema."""
+    stats = ArrowColumnStats(schema)
+    for batch in _open_blocks(csv_path, block_size, schema):
+        stats.update(batch)
+    dtypes = stats.dtypes(float32=float32)
+    if registry is not None:
+        dtypes = registry.merge(dataset, dtypes)
+        # columns registered as float32 or categorical by an earlier conversion stay that way
+        for field in schema:
+            registered = registry.get(dataset).get(field.name)
+            if field.name not in dtypes and (
+                    (registered == "float32" and pa.types.is_floating(field.type))
+                    or (registered == "category" and pa.types.is_string(field.type))):
+                dtypes[field.name] = registered
+    return pa.schema([
+        field.with_type(arrow_type(dtypes[field.name])) if field.name in dtypes else field
+        for field in schema
+    ])
+
+
+def _write_streaming(csv_path: Path, output_path: Path, block_size: int,
+                     column_types: Dict[str, pa.DataType], optimize: bool = False,
+                     registry: Optional[SchemaRegistry] = None, float32: Float32 = False) -> int:
+    """Stream a CSV into a Parquet file block by block; memory is bounded by block_size."""
+    schema = _locked_schema(csv_path, block_size, column_types or {})
+    target = schema
+    if optimize:
+        target = _optimized_schema(csv_path, block_size, schema, csv_path.stem, registry, float32)
+    rows = 0
+    with pq.ParquetWriter(output_path, target) as writer:
+        for batch in _open_blocks(csv_path, block_size, schema):
+            # every block becomes its own row group
+            writer.write_batch(cast_batch(batch, target) if optimize else batch)
+            rows += batch.num_rows
+    return rows
+
+
+def convert_csv_to_parquet(csv_path: str, output_dir: str = None, streaming: bool = True,
+                           block_size: int = 64 << 20, column_types: Dict[str, str] = None,
+                           optimize: bool = False, float32: Float32 = False,
+                           registry_path: str = None) -> Path:
     """Convert a CSV file to Parquet format.
-    
+
     Args:
         csv_path: Path to the CSV file
         output_dir: Directory to save the Parquet file (default: same as CSV)
+        streaming: Read and write the file block by block so peak memory is set by
+            block_size instead of the file size. The schema is inferred by Arrow from
+            the first block: dates stay strings as with pandas, but integer columns
+            with missing values stay integers instead of becoming float64. If False,
+            the file is read into pandas at once.
+        block_size: Bytes of CSV per block in streaming mode
+        column_types: Column name -> Arrow type name (e.g. {"gvkey": "string",
+            "asofdate": "date32"}) overriding the inferred schema in streaming mode
+        optimize: Narrow integer widths and dictionary-encode low-cardinality strings;
+            in streaming mode this costs one extra read of the CSV. The chosen dtypes
+            are kept in the schema registry under the file stem, so reconverting
+            or loading the dataset again gives the same schema.
+        float32: With optimize, store all float columns (True) or the given ones as float32
+        registry_path: Schema registry file (default: DEFAULT_REGISTRY_PATH)
+
+    Returns:
+        Path: Path of the Parquet file
     """
     csv_path = Path(csv_path)
-    
+
     # Determine output path
     if output_dir:
         output_path = Path(output_dir) / f"{csv_path.stem}.parquet"
     else:
         output_path = csv_path.with_suffix('.parquet')
-    
+
     # Create output directory if it doesn't exist
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    
+
     print(f"Converting {csv_path} to {output_path}")
-    
-    # Read CSV file
-    df = pd.read_csv(csv_path)
-    
-    # Save as Parquet
-    df.to_parquet(output_path, index=False)
-    
+
+    registry = None
+    if optimize:
+        registry = SchemaRegistry(registry_path) if registry_path else SchemaRegistry()
+
+    # write next to the target and swap it in, so a failed conversion leaves no truncated file
+    tmp_path = output_path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        if streaming:
+            types = {name: pa.type_for_alias(type_name) for name, type_name in (column_types or {}).items()}
+            rows = _write_streaming(csv_path, tmp_path, block_size, types, optimize, registry, float32)
+            print(f"Streamed {rows} rows in blocks of {block_size / (1024 * 1024):.0f} MB")
+        else:
+            # Read CSV file
+            df = pd.read_csv(csv_path)
+            if optimize:
+                df = optimize_frame(df, dataset=csv_path.stem, registry=registry, float32=float32)
+
+            # Save as Parquet
+            df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, output_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
     # Print file size comparison
     csv_size = csv_path.stat().st_size / (1024 * 1024)  # Size in MB
     parquet_size = output_path.stat().st_size / (1024 * 1024)  # Size in MB
-    
+
     print(f"\nConversion complete!")
     print(f"Original CSV size: {csv_size:.2f} MB")
     print(f"Parquet size: {parquet_size:.2f} MB")
     print(f"Compression ratio: {csv_size/parquet_size:.2f}x")
+    return output_path
+
+
+def file_hash(path, block_size: int = 1 << 20) -> str:
+    """Return the sha256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _load_manifest(manifest_path: Path) -> Dict[str, Dict]:
+    if not manifest_path.exists():
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def _save_manifest(manifest_path: Path, manifest: Dict[str, Dict]) -> None:
+    tmp_path = manifest_path.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def options_hash(options: Dict) -> str:
+    """Return the sha256 hex digest of a set of conversion options."""
+    return hashlib.sha256(json.dumps(options, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _convert_if_changed(csv_file: str, output_dir: Optional[str], previous: Dict, options: Dict) -> Dict:
+    """Convert one CSV unless its content and options match the manifest entry; runs in a worker process.
+
+    Size and mtime are compared first, so unchanged files are not even read; a
+    file that was only touched is hashed and skipped if its content is the same.
+    """
+    csv_file = Path(csv_file)
+    stat = csv_file.stat()
+    entry = {'size': stat.st_size, 'mtime': stat.st_mtime, 'options': options_hash(options)}
+    output_ok = (previous is not None and previous.get('options') == entry['options']
+                 and Path(previous['output']).exists())
+    if output_ok and previous['size'] == entry['size'] and previous['mtime'] == entry['mtime']:
+        return dict(previous, skipped=True)
+
+    entry['sha256'] = file_hash(csv_file)
+    if output_ok and previous.get('sha256') == entry['sha256']:
+        return dict(previous, **entry, skipped=True)
+
+    output_path = convert_csv_to_parquet(str(csv_file), output_dir, **options)
+    return dict(entry, output=str(output_path), skipped=False)
+
+
+def convert_directory(input_dir: str, output_dir: str = None, jobs: int = 1, force: bool = False,
+                      **options) -> Dict[str, float]:
+    """Convert every CSV under a directory, skipping files unchanged since the last run.
+
+    A manifest (``.csv_to_parquet_manifest.json`` in the output directory, or the
+    input directory) records each source's path, size, mtime, sha256 and a hash of
+    the conversion options, and is saved after every converted file so an
+    interrupted run keeps its progress. Changing an option reconverts every file.
+
+    Args:
+        input_dir: Directory searched recursively for ``*.csv``
+        output_dir: Directory to save Parquet files, mirroring the subdirectories of
+            input_dir (default: next to each CSV)
+        jobs: Number of worker processes
+        force: Convert every file regardless of the manifest
+        **options: Passed on to convert_csv_to_parquet
+
+    Returns:
+        dict: Counts of converted and skipped files, MB converted, seconds, MB/s and files/s
+    """
+    input_dir = Path(input_dir)
+    manifest_path = Path(output_dir or input_dir) / MANIFEST_NAME
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    manifest = {} if force else _load_manifest(manifest_path)
+
+    csv_files = sorted(str(path) for path in input_dir.glob('**/*.csv'))
+    # same-stem files in different subdirectories must not write the same output
+    output_dirs = {
+        csv_file: str(Path(output_dir) / Path(csv_file).relative_to(input_dir).parent) if output_dir else None
+        for csv_file in csv_files
+    }
+    start = time.perf_counter()
+    converted = skipped = 0
+    converted_mb = 0.0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(_convert_if_changed, csv_file, output_dirs[csv_file], manifest.get(csv_file), options):
+                csv_file
+            for csv_file in csv_files
+        }
+        for future in as_completed(futures):
+            csv_file = futures[future]
+            entry = future.result()
+            if entry.pop('skipped'):
+                skipped += 1
+            else:
+                converted += 1
+                converted_mb += entry['size'] / (1024 * 1024)
+            manifest[csv_file] = entry
+            _save_manifest(manifest_path, manifest)
+
+    seconds = time.perf_counter() - start
+    summary = {
+        'converted': converted,
+        'skipped': skipped,
+        'converted_mb': converted_mb,
+        'seconds': seconds,
+        'mb_per_second': converted_mb / seconds if seconds else 0.0,
+        'files_per_second': converted / seconds if seconds else 0.0,
+    }
+    print(f"\nConverted {converted} files ({converted_mb:.2f} MB), skipped {skipped} unchanged files "
+          f"in {seconds:.2f}s with {jobs} jobs")
+    print(f"Throughput: {summary['mb_per_second']:.2f} MB/s, {summary['files_per_second']:.2f} files/s")
+    return summary
+
+
+def _parse_column_types(values) -> Dict[str, str]:
+    """Parse repeated --dtype column=type arguments."""
+    column_types = {}
+    for value in values or []:
+        name, _, type_name = value.partition('=')
+        if not name or not type_name:
+            raise argparse.ArgumentTypeError(f"--dtype expects column=type, got {value!r}")
+        column_types[name] = type_name
+    return column_types
 
 
 def main():
     parser = argparse.ArgumentParser(description='Convert CSV files to Parquet format')
     parser.add_argument('csv_path', help='Path to the CSV file or directory containing CSV files')
-    parser.add_argument('--output-dir', help='Directory to save Parquet files (default: same as input)')
-    
+    parser.add_argument('--output-dir', help='Directory to save Parquet files, mirroring the subdirectories '
+                                             'of an input directory (default: same as input)')
+    parser.add_argument('--in-memory', action='store_true',
+                        help='Read each CSV into pandas at once instead of streaming it block by block')
+    parser.add_argument('--block-size-mb', type=int, default=64,
+                        help='MB of CSV per block when streaming (default: 64)')
+    parser.add_argument('--dtype', action='append', metavar='COLUMN=TYPE',
+                        help='Arrow type of a column when streaming, e.g. --dtype gvkey=string (repeatable)')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of files converted in parallel in directory mode (default: 1)')
+    parser.add_argument('--force', action='store_true',
+                        help='In directory mode, also convert files that are unchanged since the last run')
+    parser.add_argument('--optimize', action='store_true',
+                        help='Narrow integer widths and dictionary-encode low-cardinality strings, '
+                             'recording the dtypes in the schema registry')
+    parser.add_argument('--float32', nargs='*', metavar='COLUMN',
+                        help='With --optimize, store the given float columns (all if none given) as float32')
+    parser.add_argument('--schema-registry', help='Schema registry file (default: .cache/schema_registry.json)')
+
     args = parser.parse_args()
-    
+
     csv_path = Path(args.csv_path)
-    
+    options = dict(
+        streaming=not args.in_memory,
+        block_size=args.block_size_mb << 20,
+        column_types=_parse_column_types(args.dtype),
+        optimize=args.optimize,
+        float32=False if args.float32 is None else (args.float32 or True),
+        registry_path=args.schema_registry,
+    )
+
     if csv_path.is_file():
         # Convert single file
-        convert_csv_to_parquet(str(csv_path), args.output_dir)
+        convert_csv_to_parquet(str(csv_path), args.output_dir, **options)
     elif csv_path.is_dir():
-        # Convert all CSV files in directory
-        for csv_file in csv_path.glob('**/*.csv'):
-            convert_csv_to_parquet(str(csv_file), args.output_dir)
+        # Convert all new or changed CSV files in directory
+        convert_directory(str(csv_path), args.output_dir, jobs=args.jobs, force=args.force, **options)
     else:
         print(f"Error: {csv_path} does not exist")
 
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
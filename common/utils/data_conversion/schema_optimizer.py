@@ -0,0 +1,222 @@
+"""Narrow the dtypes of a dataset and keep them consistent across loads with a schema registry."""
+
+import fcntl
+import json
+import os
+from pathlib import Path
+from typing import Dict, Sequence, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+INT_DTYPES = ["int8", "int16", "int32", "int64"]
+
+DEFAULT_REGISTRY_PATH = Path(os.getenv("FINRESEARCH_CACHE_DIR", ".cache")) / "schema_registry.json"
+
+Float32 = Union[bool, Sequence[str]]
+
+
+def int_dtype(min_value, max_value) -> str:
+    """Return the narrowest signed integer dtype holding [min_value, max_value]."""
+    for dtype in INT_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= min_value and max_value <= info.max:
+            return dtype
+    return "int64"
+
+
+def _wants_float32(column: str, float32: Float32) -> bool:
+    return float32 is True or (not isinstance(float32, bool) and column in float32)
+
+
+def widen(registered: str, inferred: str) -> str:
+    """Combine a registered and a newly inferred dtype into one that holds both."""
+    if registered in INT_DTYPES and inferred in INT_DTYPES:
+        return max(registered, inferred, key=INT_DTYPES.index)
+    if registered == "float32" and inferred in INT_DTYPES:
+        return registered
+    if registered == "category" and inferred in ("category", "string", "object"):
+        # once categorical, always categorical, so repeated loads line up
+        return registered
+    return inferred
+
+
+class SchemaRegistry:
+    """Per-dataset column dtypes, stored as JSON, so every load of a dataset gets the same schema.
+
+    Integer widths only ever widen: a later load with larger ids updates the
+    registered width, and every following load uses it too.
+    """
+
+    def __init__(self, path=DEFAULT_REGISTRY_PATH):
+        """Initialize the registry.
+
+        Args:
+            path: JSON file holding {dataset: {column: dtype}}
+        """
+        self.path = Path(path)
+        self.schemas: Dict[str, Dict[str, str]] = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                self.schemas = json.load(f)
+
+    def get(self, dataset: str) -> Dict[str, str]:
+        """Return the registered dtypes of a dataset, empty if unknown."""
+        return dict(self.schemas.get(dataset, {}))
+
+    def merge(self, dataset: str, dtypes: Dict[str, str]) -> Dict[str, str]:
+        """Widen the registered dtypes of a dataset with newly inferred ones and save.
+
+        Safe to call from several processes at once: the read-modify-write of the
+        registry file happens under an exclusive file lock.
+
+        Returns:
+            dict: The dtypes to apply, column -> dtype
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # hold an exclusive lock from reading to replacing the file, so processes converting
+        # files in parallel do not overwrite each other's entries
+        with open(self.path.with_suffix(".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if self.path.exists():
+                    with open(self.path) as f:
+                        self.schemas = json.load(f)
+                registered = self.schemas.get(dataset, {})
+                merged = {
+                    column: widen(registered[column], dtype) if column in registered else dtype
+                    for column, dtype in dtypes.items()
+                }
+                if merged != {column: registered.get(column) for column in merged}:
+                    self.schemas[dataset] = {**registered, **merged}
+                    tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+                    with open(tmp_path, "w") as f:
+                        json.dump(self.schemas, f, indent=1, sort_keys=True)
+                    os.replace(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return merged
+
+
+def infer_dtypes(df: pd.DataFrame, categorical_threshold: float = 0.5, float32: Float32 = False) -> Dict[str, str]:
+    """Infer narrow dtypes for the columns of a DataFrame.
+
+    Args:
+        df: Data to inspect
+        categorical_threshold: String columns with at most this share of distinct
+            values among their non-null values become categorical
+        float32: True to store all float columns as float32, or the columns to do it for
+
+    Returns:
+        dict: Column -> dtype for the columns that can be narrowed
+    """
+    dtypes = {}
+    for column in df.columns:
+        values = df[column]
+        if pd.api.types.is_bool_dtype(values):
+            continue
+        if pd.api.types.is_integer_dtype(values):
+            if len(values) and not pd.api.types.is_extension_array_dtype(values):
+                dtypes[column] = int_dtype(values.min(), values.max())
+        elif pd.api.types.is_float_dtype(values):
+            if _wants_float32(column, float32):
+                dtypes[column] = "float32"
+        elif isinstance(values.dtype, pd.CategoricalDtype):
+            dtypes[column] = "category"
+        elif pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values):
+            non_null = values.dropna()
+            if len(non_null) and non_null.map(type).eq(str).all():
+                if non_null.nunique() <= categorical_threshold * len(non_null):
+                    dtypes[column] = "category"
+    return dtypes
+
+
+def optimize_frame(df: pd.DataFrame, dataset: str = None, registry: SchemaRegistry = None,
+                   categorical_threshold: float = 0.5, float32: Float32 = False) -> pd.DataFrame:
+    """Narrow integer widths, turn repetitive strings into categoricals and optionally use float32.
+
+    Args:
+        df: Data to optimize
+        dataset: Name of the dataset in the registry, e.g. the file stem
+        registry: Schema registry keeping the dtypes of the dataset consistent across loads
+        categorical_threshold: See infer_dtypes
+        float32: See infer_dtypes; lossy, meant for factor values and similar
+
+    Returns:
+        pd.DataFrame: The optimized frame
+    """
+    dtypes = infer_dtypes(df, categorical_threshold, float32)
+    if registry is not None and dataset is not None:
+        dtypes = registry.merge(dataset, dtypes)
+        # columns registered as float32 or categorical by an earlier load stay that way
+        for column, dtype in registry.get(dataset).items():
+            if column in df.columns and column not in dtypes:
+                if dtype == "float32" and pd.api.types.is_float_dtype(df[column]):
+                    dtypes[column] = dtype
+                elif dtype == "category" and not pd.api.types.is_numeric_dtype(df[column]):
+                    dtypes[column] = dtype
+    dtypes = {column: dtype for column, dtype in dtypes.items() if df[column].dtype != dtype}
+    return df.astype(dtypes) if dtypes else df
+
+
+def arrow_type(dtype: str) -> pa.DataType:
+    """Return the Arrow type of a dtype produced by infer_dtypes."""
+    if dtype == "category":
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.from_numpy_dtype(np.dtype(dtype))
+
+
+class ArrowColumnStats:
+    """Accumulate per-column statistics over record batches to infer narrow dtypes in one streaming pass.
+
+    Only the integer range and, up to max_categories, the distinct strings are
+    kept, so memory does not grow with the number of rows.
+    """
+
+    def __init__(self, schema: pa.Schema, max_categories: int = 100_000):
+        self.schema = schema
+        self.max_categories = max_categories
+        self.int_range = {f.name: [None, None] for f in schema if pa.types.is_integer(f.type)}
+        self.distinct = {f.name: set() for f in schema if pa.types.is_string(f.type) or pa.types.is_large_string(f.type)}
+        self.non_null = {name: 0 for name in self.distinct}
+
+    def update(self, batch: pa.RecordBatch) -> None:
+        for name, bounds in self.int_range.items():
+            result = pc.min_max(batch.column(name))
+            low, high = result["min"].as_py(), result["max"].as_py()
+            if low is not None:
+                bounds[0] = low if bounds[0] is None else min(bounds[0], low)
+                bounds[1] = high if bounds[1] is None else max(bounds[1], high)
+        for name in list(self.distinct):
+            column = batch.column(name)
+            self.non_null[name] += len(column) - column.null_count
+            self.distinct[name].update(pc.unique(column.drop_null()).to_pylist())
+            if len(self.distinct[name]) > self.max_categories:
+                # too many values to be worth a dictionary
+                del self.distinct[name]
+
+    def dtypes(self, categorical_threshold: float = 0.5, float32: Float32 = False) -> Dict[str, str]:
+        """Return column -> dtype, like infer_dtypes does for a DataFrame."""
+        dtypes = {name: int_dtype(low, high) for name, (low, high) in self.int_range.items() if low is not None}
+        for name, values in self.distinct.items():
+            if self.non_null[name] and len(values) <= categorical_threshold * self.non_null[name]:
+                dtypes[name] = "category"
+        for field in self.schema:
+            if pa.types.is_floating(field.type) and _wants_float32(field.name, float32):
+                dtypes[field.name] = "float32"
+        return dtypes
+
+
+def cast_batch(batch: pa.RecordBatch, schema: pa.Schema) -> pa.RecordBatch:
+    """Cast a record batch to an optimized schema, dictionary-encoding categorical columns."""
+    columns = []
+    for field in schema:
+        column = batch.column(field.name)
+        if pa.types.is_dictionary(field.type):
+            column = pc.dictionary_encode(column).cast(field.type)
+        else:
+            column = column.cast(field.type)
+        columns.append(column)
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
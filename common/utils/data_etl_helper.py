@@ -1,54 +1,199 @@
 from common.utils.logging import get_logger, log_execution_time, log_api_call
 import pandas as pd
 import duckdb
+import pyarrow as pa
 from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+from common.utils.data_conversion.schema_optimizer import Float32, SchemaRegistry, optimize_frame
 
 # Initialize logger and paths
 logger = get_logger(__name__)
 
+Filter = Tuple[str, str, object]
+
+
+def _filter_expression(filters: List[Filter]) -> duckdb.Expression:
+    """Build a DuckDB expression ANDing (column, op, value) filters."""
+    expression = None
+    for column, op, value in filters:
+        field = duckdb.ColumnExpression(column)
+        if op in ("in", "not in"):
+            condition = field.isin(*[duckdb.ConstantExpression(v) for v in value])
+            if op == "not in":
+                condition = ~condition
+        else:
+            constant = duckdb.ConstantExpression(value)
+            condition = {
+                "==": lambda: field == constant,
+                "!=": lambda: field != constant,
+                ">": lambda: field > constant,
+                ">=": lambda: field >= constant,
+                "<": lambda: field < constant,
+                "<=": lambda: field <= constant,
+            }[op]()
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def _relation(path: Path, table: Optional[str]) -> Tuple[duckdb.DuckDBPyRelation, duckdb.DuckDBPyConnection]:
+    """Open a Parquet file or a table of a DuckDB database file as a lazy relation, with its connection."""
+    if path.suffix == ".parquet":
+        con = duckdb.connect()
+        return con.read_parquet(str(path)), con
+    if path.suffix == ".duckdb":
+        if table is None:
+            raise ValueError(f"A table name is needed to load from the DuckDB database {path}")
+        con = duckdb.connect(str(path), read_only=True)
+        return con.table(table), con
+    raise ValueError(f"Unsupported file type: {path.suffix}")
+
+
 @log_execution_time
-def load_data(path: Path):
-    """Load data from parquet file."""
+def load_data(path: Path, columns: List[str] = None, filters: List[Filter] = None, limit: int = None,
+              lazy: bool = False, table: str = None, optimize: bool = False, float32: Float32 = False,
+              registry: SchemaRegistry = None):
+    """Load data from a parquet file or a table of a DuckDB database file.
+
+    Columns, filters and the limit are pushed down to the scan, so only the
+    needed columns and row groups are read.
+
+    Args:
+        path: Path of the file
+        columns: Columns to load, None for all
+        filters: (column, op, value) conditions that are ANDed, op one of ==, !=, >, >=,
+            <, <=, in, not in
+        limit: Maximum number of rows
+        lazy: Return a DuckDB relation and its connection instead of a DataFrame; nothing
+            is read until the relation is consumed (e.g. .df(), .arrow(), or passed to
+            save_df_to_duckdb), and the caller closes the connection afterwards
+        table: Table to load when path is a .duckdb database
+        optimize: Narrow integer widths and turn low-cardinality strings into categoricals,
+            with the dtypes kept consistent across loads by the schema registry
+        float32: With optimize, load all float columns (True) or the given ones as float32
+        registry: Schema registry (default: the one at DEFAULT_REGISTRY_PATH)
+
+    Returns:
+        pd.DataFrame, or a (duckdb.DuckDBPyRelation, duckdb.DuckDBPyConnection) tuple if lazy
+    """
+    path = Path(path)
     logger.info(f"Loading data from {path}")
-    
-    # if it is a parquet file, load it using pandas
-    if path.suffix == ".parquet":
-        df = pd.read_parquet(path)
-        logger.info(f"Loaded data from {path}")
-        logger.info(f"Data shape: {df.shape}")
-        # start a new line and then print the first 5 rows of the dataframe, within the same logger.info
-        print(f"\n{df.head()}")
-        return df
-    # if it is a duckdb file, load it using duckdb
-    elif path.suffix == ".duckdb":
-        return duckdb.read_parquet(path)
+    if lazy and optimize:
+        raise ValueError("optimize applies to loaded DataFrames, not lazy relations")
+
+    if path.suffix == ".parquet" and not lazy and limit is None:
+        # pyarrow prunes columns and row groups itself and keeps the stored dtypes
+        df = pd.read_parquet(path, columns=columns, filters=filters or None)
     else:
-        raise ValueError(f"Unsupported file type: {path.suffix}")
+        relation, con = _relation(path, table)
+        try:
+            if filters:
+                relation = relation.filter(_filter_expression(filters))
+            if columns is not None:
+                relation = relation.project(*[duckdb.ColumnExpression(column) for column in columns])
+            if limit is not None:
+                relation = relation.limit(limit)
+            if lazy:
+                # the relation reads through the connection, so the caller closes it
+                return relation, con
+            df = relation.df()
+        except Exception:
+            con.close()
+            raise
+        # release the file, and the lock on a .duckdb database, right away
+        con.close()
+
+    if optimize:
+        before = df.memory_usage(deep=True).sum()
+        df = optimize_frame(df, dataset=path.stem, registry=registry or SchemaRegistry(), float32=float32)
+        logger.info(f"Optimized dtypes: {before / 1e6:.1f} MB -> {df.memory_usage(deep=True).sum() / 1e6:.1f} MB")
+    logger.info(f"Loaded data from {path}")
+    logger.info(f"Data shape: {df.shape}")
+    return df
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
 
 
 @log_execution_time
-def save_df_to_duckdb(df: pd.DataFrame, db_path: str, table_name: str):
+def save_df_to_duckdb(df: Union[pd.DataFrame, pa.Table, duckdb.DuckDBPyRelation], db_path: str, table_name: str,
+                      mode: str = "replace", key_columns: List[str] = None, sort_by: List[str] = None,
+                      create_index: bool = False, con: duckdb.DuckDBPyConnection = None) -> int:
     """
     Save data to a DuckDB database file that both Python and R can access.
     
+    DataFrames are scanned by DuckDB in place; Arrow tables and lazy relations from
+    load_data are ingested as Arrow without going through pandas.
+
     Args:
-        data: DataFrame to save
-        db_path: Path to the DuckDB database file, which can include a table name
-                   in the format 'path/to/database.duckdb:table_name'
+        df: DataFrame, Arrow table or DuckDB relation to save
+        db_path: Path to the DuckDB database file
         table_name: Name of the table in the DuckDB database
+        mode: "replace" rewrites the table, "append" inserts the rows (only those whose
+            key_columns are not in the table yet, if given), "upsert" replaces the
+            rows whose key_columns match and inserts the rest
+        key_columns: Columns identifying a row, required for "upsert"
+        sort_by: Columns to sort the written rows by, so DuckDB's per-block min/max
+            indexes let queries filtering on them skip most of the table
+        create_index: Create an index on key_columns, for fast lookups by key
+        con: Open connection to the database to reuse; a new one is opened and closed otherwise
+
+    Returns:
+        int: Number of rows written
     """
-    logger.info(f"Saving data to DuckDB database: {db_path} with table name: {table_name}")
+    if mode not in ("replace", "append", "upsert"):
+        raise ValueError(f"Unsupported mode: {mode}")
+    if mode == "upsert" and not key_columns:
+        raise ValueError("key_columns are required to upsert")
+    if create_index and not key_columns:
+        raise ValueError("key_columns are required to create an index")
+    logger.info(f"Saving data to DuckDB database: {db_path} with table name: {table_name} ({mode})")
 
-    # Create a DuckDB database file
-    con = duckdb.connect(database=db_path)
-    
-    # Register the DataFrame as a table in the database
-    con.register('data_table', df)
-    
-    # Create a permanent table from the DataFrame
-    con.execute(f"CREATE TABLE IF NOT EXISTS {table_name} AS SELECT * FROM data_table")
-    
-    # Close the connection
-    con.close()
+    if isinstance(df, duckdb.DuckDBPyRelation):
+        # stream the relation's Arrow batches; it may belong to another connection
+        df = pa.RecordBatchReader.from_stream(df)
+
+    own_connection = con is None
+    if own_connection:
+        con = duckdb.connect(database=db_path)
+    table = _quote(table_name)
+    order_by = f" ORDER BY {', '.join(_quote(c) for c in sort_by)}" if sort_by else ""
+    keys = [_quote(c) for c in key_columns or []]
+    try:
+        con.register('data_table', df)
+        con.begin()
+        # only roll back once our transaction exists, not a caller's or none at all
+        try:
+            exists = con.execute(
+                "SELECT count(*) FROM information_schema.tables WHERE table_name = ?", [table_name]
+            ).fetchone()[0] > 0
+            if mode == "replace" or not exists:
+                rows = con.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT * FROM data_table{order_by}").fetchone()[0]
+            elif not keys:
+                rows = con.execute(f"INSERT INTO {table} BY NAME SELECT * FROM data_table{order_by}").fetchone()[0]
+            else:
+                # stage once: the incoming rows are needed both to match keys and to insert
+                con.execute("CREATE OR REPLACE TEMP TABLE incoming AS SELECT * FROM data_table")
+                matches = " AND ".join(f"{table}.{k} = incoming.{k}" for k in keys)
+                if mode == "upsert":
+                    con.execute(f"DELETE FROM {table} USING incoming WHERE {matches}")
+                    new_rows = "SELECT * FROM incoming"
+                else:
+                    new_rows = f"SELECT * FROM incoming WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {matches})"
+                rows = con.execute(f"INSERT INTO {table} BY NAME {new_rows}{order_by}").fetchone()[0]
+                con.execute("DROP TABLE incoming")
+            if create_index:
+                index = _quote(f"idx_{table_name}_{'_'.join(key_columns)}")
+                con.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({', '.join(keys)})")
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+    finally:
+        con.unregister('data_table')
+        if own_connection:
+            con.close()
     
-    logger.info(f"Data saved successfully to DuckDB database: {db_path} with table name: {table_name}")
+    logger.info(f"Data saved successfully to DuckDB database: {db_path} with table name: {table_name} ({rows} rows)")
+    return rows
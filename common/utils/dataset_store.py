@@ -0,0 +1,212 @@
+"""Hive-partitioned Parquet dataset store with partition pruning and column projection."""
+
+import shutil
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from common.utils.logging import get_logger, log_execution_time
+
+logger = get_logger(__name__)
+
+Filter = Tuple[str, str, object]
+
+
+class _Derived:
+    """A partition column computed from a source column when writing."""
+
+    def __init__(self, source: str, compute: Callable[[pd.Series], pd.Series], prune: Callable):
+        self.source = source
+        self.compute = compute
+        # maps a filter on the source column to a filter on the partition column, or None
+        self.prune = prune
+
+
+def year_of(column: str) -> _Derived:
+    """Partition by the calendar year of a date column."""
+
+    def _prune(op, value):
+        year = pd.Timestamp(value).year
+        if op in (">=", ">"):
+            return (">=", year)
+        if op in ("<=", "<"):
+            return ("<=", year)
+        if op == "==":
+            return ("==", year)
+        if op == "in":
+            return ("in", sorted({pd.Timestamp(v).year for v in value}))
+        return None
+
+    return _Derived(column, lambda values: pd.to_datetime(values).dt.year.astype("int32"), _prune)
+
+
+def bucket_of(column: str, n_buckets: int) -> _Derived:
+    """Partition by an integer id column modulo n_buckets, e.g. companyid into 64 buckets."""
+
+    def _prune(op, value):
+        if op == "==":
+            return ("==", int(value) % n_buckets)
+        if op == "in":
+            return ("in", sorted({int(v) % n_buckets for v in value}))
+        return None
+
+    return _Derived(column, lambda values: (values.astype("int64") % n_buckets).astype("int32"), _prune)
+
+
+class DatasetStore:
+    """Store DataFrames as a hive-partitioned Parquet dataset, e.g. ``root/factorid=460/year=2021/*.parquet``.
+
+    Partition columns are either columns of the data or derived ones (see
+    ``year_of`` and ``bucket_of``). Reads push the column projection and the
+    filters down to pyarrow, which only opens the files of matching partitions;
+    filters on the source column of a derived partition (e.g. a date range on
+    asofdate) are translated into partition filters (the years) automatically.
+
+    Example:
+        store = DatasetStore.for_factors("data/affactor_store")
+        store.write(repo.get_afl_factor_monthly_period(begin, end, factorids, ids))
+        df = store.read(columns=["companyid", "asofdate", "factorvalue"],
+                        filters=[("factorid", "in", [460, 502, 914]),
+                                 ("asofdate", ">=", "2021-01-01"), ("asofdate", "<=", "2021-12-31")])
+    """
+
+    def __init__(self, root, partitioning: Sequence[str], derived: Dict[str, _Derived] = None):
+        """Initialize the store.
+
+        Args:
+            root: Directory of the dataset
+            partitioning: Partition columns, outermost first
+            derived: Partition column -> how to derive it from the data, for
+                columns that are not part of the data itself
+        """
+        self.root = Path(root)
+        self.partitioning = list(partitioning)
+        self.derived = derived or {}
+
+    @classmethod
+    def for_factors(cls, root) -> "DatasetStore":
+        """Store for AFL factor values, partitioned by factorid and year of asofdate."""
+        return cls(root, ["factorid", "year"], {"year": year_of("asofdate")})
+
+    @classmethod
+    def for_prices(cls, root, n_buckets: int = 64) -> "DatasetStore":
+        """Store for daily prices, partitioned by year of pricedate and a companyid bucket."""
+        return cls(root, ["year", "company_bucket"],
+                   {"year": year_of("pricedate"), "company_bucket": bucket_of("companyid", n_buckets)})
+
+    def _partition_dir(self, values: Sequence) -> Path:
+        return self.root.joinpath(*[f"{column}={value}" for column, value in zip(self.partitioning, values)])
+
+    @log_execution_time
+    def write(self, data: Union[pd.DataFrame, Iterable[pd.DataFrame]], replace_partitions: bool = True) -> int:
+        """Write a DataFrame, or an iterator of chunks, into the dataset.
+
+        Args:
+            data: Rows to write, e.g. a repository result or its chunk_rows iterator
+            replace_partitions: Delete the existing files of every partition the data
+                touches before writing (once per call), so rewriting an extraction
+                does not duplicate rows; False appends
+
+        Returns:
+            int: Number of rows written
+        """
+        frames = [data] if isinstance(data, pd.DataFrame) else data
+        cleared = set()
+        total_rows = 0
+        for frame in frames:
+            if frame.empty:
+                continue
+            frame = frame.copy()
+            for column, derived in self.derived.items():
+                frame[column] = derived.compute(frame[derived.source])
+
+            if replace_partitions:
+                keys = frame[self.partitioning].drop_duplicates().itertuples(index=False, name=None)
+                for values in keys:
+                    if values not in cleared:
+                        shutil.rmtree(self._partition_dir(values), ignore_errors=True)
+                        cleared.add(values)
+
+            ds.write_dataset(
+                pa.Table.from_pandas(frame, preserve_index=False), self.root, format="parquet",
+                partitioning=self.partitioning, partitioning_flavor="hive",
+                basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore",
+            )
+            total_rows += len(frame)
+        logger.info(f"Wrote {total_rows} rows to {self.root} ({len(cleared)} partitions replaced)")
+        return total_rows
+
+    def dataset(self) -> ds.Dataset:
+        """Return the underlying pyarrow dataset."""
+        return ds.dataset(self.root, format="parquet", partitioning="hive")
+
+    def _with_partition_filters(self, filters: List[Filter]) -> List[Filter]:
+        """Add partition filters implied by filters on the source columns of derived partitions."""
+        extra = []
+        for column, op, value in filters:
+            for partition, derived in self.derived.items():
+                if derived.source == column:
+                    pruned = derived.prune(op, value)
+                    if pruned is not None:
+                        extra.append((partition, *pruned))
+        return list(filters) + extra
+
+    @staticmethod
+    def _expression(filters: List[Filter], schema: pa.Schema) -> ds.Expression:
+        expression = None
+        for column, op, value in filters:
+            field_type = schema.field(column).type
+            if pa.types.is_timestamp(field_type) or pa.types.is_date(field_type):
+                values = [pd.Timestamp(v) for v in value] if op in ("in", "not in") else pd.Timestamp(value)
+                value = pa.array(values).cast(field_type) if op in ("in", "not in") else pa.scalar(values).cast(field_type)
+            elif op in ("in", "not in"):
+                value = pa.array(np.asarray(list(value))).cast(field_type)
+            field = pc.field(column)
+            condition = {
+                "==": lambda: field == value,
+                "!=": lambda: field != value,
+                ">": lambda: field > value,
+                ">=": lambda: field >= value,
+                "<": lambda: field < value,
+                "<=": lambda: field <= value,
+                "in": lambda: field.isin(value),
+                "not in": lambda: ~field.isin(value),
+            }[op]()
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    @log_execution_time
+    def read(self, columns: List[str] = None, filters: List[Filter] = None) -> pd.DataFrame:
+        """Read rows from the dataset, pruning partitions and columns.
+
+        Args:
+            columns: Columns to read, None for all (including the partition columns)
+            filters: (column, op, value) conditions that are ANDed, op one of
+                ==, !=, >, >=, <, <=, in, not in; date values may be strings
+
+        Returns:
+            pd.DataFrame: Matching rows
+        """
+        dataset = self.dataset()
+        expression = None
+        if filters:
+            expression = self._expression(self._with_partition_filters(filters), dataset.schema)
+        fragments = list(dataset.get_fragments(filter=expression))
+        logger.info(f"Reading {len(fragments)} files from {self.root}")
+        table = dataset.to_table(columns=columns, filter=expression)
+        return table.to_pandas()
+
+    def partition_values(self, column: str) -> List:
+        """Return the distinct values of a partition column, from the directory layout only."""
+        dataset = self.dataset()
+        values = set()
+        for fragment in dataset.get_fragments():
+            values.update(v for k, v in ds.get_partition_keys(fragment.partition_expression).items() if k == column)
+        return sorted(values)
@@ -0,0 +1,365 @@
+"""Incremental runner for a DAG of research steps, keyed by the content of their inputs, code and parameters."""
+
+import ast
+import hashlib
+import inspect
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Union
+
+import pandas as pd
+
+from common.utils.logging import get_logger, log_execution_time
+
+logger = get_logger(__name__)
+
+DEFAULT_STATE_DIR = Path(os.getenv("FINRESEARCH_CACHE_DIR", ".cache")) / "pipeline"
+
+RAN = "ran"
+SKIPPED = "skipped"
+FAILED = "failed"
+BLOCKED = "blocked"
+
+
+@dataclass
+class Step:
+    """One step of a pipeline.
+
+    Attributes:
+        name: Unique name of the step
+        run: Callable called with params as keyword arguments, or the path of a
+            script run as ``python <script>`` in the current directory
+        inputs: Files or directories the step reads; a step producing one of them
+            runs first
+        outputs: Files or directories the step writes
+        params: Parameters of the step; changing one reruns the step
+        code: Further source files the step depends on, besides its own module or script
+            and the modules of the repository they import
+        after: Names of steps to run first without sharing a file
+    """
+
+    name: str
+    run: Union[Callable[..., None], str]
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+    params: Dict = field(default_factory=dict)
+    code: List[str] = field(default_factory=list)
+    after: List[str] = field(default_factory=list)
+
+
+def _covers(output: str, path: str) -> bool:
+    """Whether path is the output itself or lies inside the output directory."""
+    output, path = Path(output), Path(path)
+    return path == output or output in path.parents
+
+
+def _module_file(parts: List[str]) -> Optional[Path]:
+    """Source file of a module of the repository in the current directory, None for other modules."""
+    if not parts:
+        return None
+    base = Path(*parts)
+    for candidate in (base.with_suffix(".py"), base / "__init__.py"):
+        if candidate.is_file():
+            return candidate.resolve()
+    return None
+
+
+def _imported_modules(source: Path) -> Set[Path]:
+    """Source files of the repository modules (and their packages) that a source file imports."""
+    root = Path.cwd().resolve()
+    try:
+        package = list(source.resolve().parent.relative_to(root).parts)
+    except ValueError:
+        package = []
+    names = []
+    for node in ast.walk(ast.parse(source.read_text())):
+        if isinstance(node, ast.Import):
+            names += [alias.name.split(".") for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            base = package[:len(package) - node.level + 1] if node.level else []
+            module = base + (node.module.split(".") if node.module else [])
+            names.append(module)
+            # "from package import module" imports a module too
+            names += [module + [alias.name] for alias in node.names]
+    files = set()
+    for parts in names:
+        # importing a.b.c runs the __init__ of a and a.b first
+        for i in range(1, len(parts) + 1):
+            module_file = _module_file(parts[:i])
+            if module_file is not None:
+                files.add(module_file)
+    return files
+
+
+def _with_imports(sources: Iterable[Path]) -> List[Path]:
+    """The sources and, transitively, every repository module they import, in a stable order."""
+    seen, stack = set(), [Path(source).resolve() for source in sources]
+    while stack:
+        source = stack.pop()
+        if source not in seen:
+            seen.add(source)
+            stack.extend(_imported_modules(source) - seen)
+    return sorted(seen)
+
+
+class Pipeline:
+    """Run the steps of a DAG in dependency order, skipping the ones that are up to date.
+
+    A step is up to date when the content of its inputs, the source of its code
+    (including the repository modules it imports, e.g. common.database) and its
+    parameters hash to the fingerprint recorded at its last successful run, and
+    its outputs exist. Because inputs are hashed by content, a step whose
+    upstream ran again but wrote identical files is skipped too, so a parameter
+    change only rebuilds the artifacts it actually changes. Independent steps run
+    in parallel. Fingerprints and per-step timings are kept in
+    ``<state_dir>/<name>.json``.
+
+    Example:
+        pipeline = Pipeline("prices", [
+            Step("extract", "scripts/get_prices.py", outputs=["data/prices.csv"]),
+            Step("returns", compute_returns, inputs=["data/prices.csv"], outputs=["data/returns.parquet"],
+                 params={"horizon": 21}),
+        ])
+        pipeline.run(max_workers=2)
+    """
+
+    def __init__(self, name: str, steps: Iterable[Step], state_dir=None):
+        """Initialize the pipeline.
+
+        Args:
+            name: Name of the pipeline, naming its state file
+            steps: Steps of the pipeline
+            state_dir: Directory of the state file (default: $FINRESEARCH_CACHE_DIR/pipeline, or .cache/pipeline)
+
+        Raises:
+            ValueError: On duplicate step names or outputs, unknown steps in after, or cycles
+        """
+        self.name = name
+        self.steps: Dict[str, Step] = {}
+        for step in steps:
+            if step.name in self.steps:
+                raise ValueError(f"Duplicate step name: {step.name}")
+            self.steps[step.name] = step
+        self.dependencies = self._dependencies()
+        self._check_acyclic()
+        self.state_path = Path(state_dir or DEFAULT_STATE_DIR) / f"{name}.json"
+        self.state = self._load_state()
+        self._lock = threading.Lock()
+
+    def _dependencies(self) -> Dict[str, Set[str]]:
+        producers = {}
+        for step in self.steps.values():
+            for output in step.outputs:
+                if output in producers:
+                    raise ValueError(f"{output} is an output of both {producers[output]} and {step.name}")
+                producers[output] = step.name
+        dependencies = {}
+        for step in self.steps.values():
+            unknown = set(step.after) - set(self.steps)
+            if unknown:
+                raise ValueError(f"Step {step.name} runs after unknown steps {sorted(unknown)}")
+            dependencies[step.name] = set(step.after) | {
+                producer for output, producer in producers.items()
+                for path in step.inputs if _covers(output, path) and producer != step.name
+            }
+        return dependencies
+
+    def _check_acyclic(self) -> None:
+        visiting, visited = set(), set()
+
+        def visit(name):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"The steps of pipeline {self.name} have a cycle through {name}")
+            visiting.add(name)
+            for dependency in self.dependencies[name]:
+                visit(dependency)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.steps:
+            visit(name)
+
+    def _load_state(self) -> Dict:
+        if not self.state_path.exists():
+            return {"steps": {}, "files": {}}
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    def _save_state(self) -> None:
+        """Write the state atomically; callers hold the lock."""
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    def _file_hash(self, path: Path) -> str:
+        """sha256 of a file, recomputed only when its size or mtime changed since it was last hashed."""
+        stat = path.stat()
+        key = str(path.resolve())
+        with self._lock:
+            known = self.state["files"].get(key)
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            return known["sha256"]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        with self._lock:
+            self.state["files"][key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                        "sha256": digest.hexdigest()}
+        return digest.hexdigest()
+
+    def _path_hash(self, path: str) -> str:
+        """Content hash of a file, or of every file in a directory with its relative path."""
+        path = Path(path)
+        if path.is_file():
+            return self._file_hash(path)
+        if path.is_dir():
+            digest = hashlib.sha256()
+            for file in sorted(p for p in path.rglob("*") if p.is_file() and not p.name.startswith(".")):
+                digest.update(f"{file.relative_to(path)}:{self._file_hash(file)}\n".encode())
+            return digest.hexdigest()
+        return "missing"
+
+    def _code_hash(self, step: Step) -> str:
+        digest = hashlib.sha256()
+        if callable(step.run):
+            digest.update(step.run.__qualname__.encode())
+            sources = [inspect.getsourcefile(step.run)]
+        else:
+            sources = [step.run]
+        for source in _with_imports(sources) + [Path(path) for path in step.code]:
+            digest.update(self._file_hash(source).encode())
+        return digest.hexdigest()
+
+    def _fingerprint(self, step: Step) -> Dict:
+        return {
+            "inputs": {path: self._path_hash(path) for path in step.inputs},
+            "code": self._code_hash(step),
+            "params": json.loads(json.dumps(step.params, sort_keys=True, default=str)),
+        }
+
+    def _stale_reason(self, step: Step, fingerprint: Dict) -> Optional[str]:
+        """Why a step has to run, or None if it is up to date."""
+        previous = self.state["steps"].get(step.name, {}).get("fingerprint")
+        if previous is None:
+            return "never ran"
+        changed = [path for path, value in fingerprint["inputs"].items() if previous["inputs"].get(path) != value]
+        if changed:
+            return f"inputs changed: {changed}"
+        if previous["code"] != fingerprint["code"]:
+            return "code changed"
+        if previous["params"] != fingerprint["params"]:
+            return f"params changed: {previous['params']} -> {fingerprint['params']}"
+        missing = [path for path in step.outputs if not Path(path).exists()]
+        if missing:
+            return f"outputs missing: {missing}"
+        return None
+
+    def _execute(self, step: Step) -> None:
+        if callable(step.run):
+            step.run(**step.params)
+        else:
+            # scripts import the shared packages from the current directory, as when run by hand
+            python_path = os.pathsep.join(filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")]))
+            subprocess.run([sys.executable, step.run], check=True, env={**os.environ, "PYTHONPATH": python_path})
+
+    def _run_step(self, step: Step, force: bool) -> Dict:
+        start = time.perf_counter()
+        fingerprint = self._fingerprint(step)
+        reason = "forced" if force else self._stale_reason(step, fingerprint)
+        if reason is None:
+            logger.info(f"Step {step.name} is up to date")
+            return {"status": SKIPPED, "reason": "up to date", "seconds": round(time.perf_counter() - start, 3)}
+
+        logger.info(f"Running step {step.name} ({reason})")
+        try:
+            self._execute(step)
+        except Exception as e:
+            seconds = round(time.perf_counter() - start, 3)
+            logger.error(f"Step {step.name} failed after {seconds}s: {e}")
+            return {"status": FAILED, "reason": repr(e), "seconds": seconds}
+        seconds = round(time.perf_counter() - start, 3)
+        logger.info(f"Step {step.name} finished in {seconds}s")
+        with self._lock:
+            self.state["steps"][step.name] = {
+                "fingerprint": fingerprint,
+                "seconds": seconds,
+                "finished_at": datetime.now().isoformat(),
+            }
+            self._save_state()
+        return {"status": RAN, "reason": reason, "seconds": seconds}
+
+    def _selected(self, targets: Optional[Iterable[str]]) -> Set[str]:
+        """The target steps and everything upstream of them."""
+        if targets is None:
+            return set(self.steps)
+        selected, stack = set(), list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in self.steps:
+                raise ValueError(f"Unknown step: {name}")
+            if name not in selected:
+                selected.add(name)
+                stack.extend(self.dependencies[name])
+        return selected
+
+    @log_execution_time
+    def run(self, targets: Iterable[str] = None, max_workers: int = 1,
+            force: Union[bool, Iterable[str]] = False) -> pd.DataFrame:
+        """Run the steps that are not up to date.
+
+        Args:
+            targets: Steps to bring up to date, with their upstream steps; None for all
+            max_workers: Number of steps run concurrently
+            force: True to run every selected step, or the names of steps to run regardless
+
+        Returns:
+            pd.DataFrame: One row per step with its status (ran, skipped, failed, or blocked
+                by a failed upstream step), the reason it ran and its seconds
+
+        Raises:
+            RuntimeError: If any step failed
+        """
+        selected = self._selected(targets)
+        forced = selected if force is True else set(force or [])
+        results: Dict[str, Dict] = {}
+        pending = set(selected)
+        running = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                for name in sorted(pending):
+                    dependencies = self.dependencies[name] & selected
+                    if any(results.get(d, {}).get("status") in (FAILED, BLOCKED) for d in dependencies):
+                        results[name] = {"status": BLOCKED, "reason": "upstream step failed", "seconds": 0.0}
+                        pending.discard(name)
+                    elif all(d in results for d in dependencies):
+                        running[executor.submit(self._run_step, self.steps[name], name in forced)] = name
+                        pending.discard(name)
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+
+        with self._lock:
+            self._save_state()
+        report = pd.DataFrame.from_dict(results, orient="index").reindex(
+            [name for name in self.steps if name in results])
+        logger.info(f"Pipeline {self.name}:\n{report}")
+        failed = report.index[report["status"] == FAILED].tolist()
+        if failed:
+            raise RuntimeError(f"Steps {failed} of pipeline {self.name} failed")
+        return report
@@ -2,11 +2,11 @@
 # 1. we aim to attain a bigger variance between brokers 
 # 2. we aim to avoid the cases where some questions are too short and not representative of the broker's culture.
 
-import pandas as pd
+from common.utils.arrow_cache import cached_read
 from openai_batch_wrapper.preprocess import preprocess_dataframe
 
 # load in the data
-df = pd.read_parquet('research/brokerage_culture/input_data/question_transcripts_with_employer.parquet')
+df = cached_read('research/brokerage_culture/input_data/question_transcripts_with_employer.parquet')
 print('before dropping null companyid', len(df))
 # drop the row where companyid is null
 df = df[df['companyid'].notna()]
@@ -16,7 +16,7 @@ df.rename(columns={'companyid': 'brokerid'}, inplace=True)
 df = df[df['componenttext'].str.len() > 100]
 
 # by year 
-et_ref = pd.read_csv('research/brokerage_culture/input_data/us_et_ref_v2.csv', index_col=0)
+et_ref = cached_read('research/brokerage_culture/input_data/us_et_ref_v2.csv', index_col=0)
 et_ref.sort_values('marketcap', ascending=False, inplace=True)
 
 # merge on year
@@ -1,4 +1,4 @@
-import pandas as pd
+from common.utils.arrow_cache import cached_read
 from openai_batch_wrapper.preprocess import preprocess_dataframe
 
 # Constants
@@ -7,7 +7,7 @@ INPUT_DATA_PATH = f'{BASE_PATH}/input_data'
 OUTPUT_DATA_PATH = f'{BASE_PATH}/output_data'
 
 # load in the data
-df = pd.read_parquet(f'{INPUT_DATA_PATH}/question_transcripts_with_employer.parquet')
+df = cached_read(f'{INPUT_DATA_PATH}/question_transcripts_with_employer.parquet')
 print('before dropping null companyid', len(df))
 # get rid of the questions that are too short
 df = df[df['componenttext'].str.len() > 100]
@@ -16,7 +16,7 @@ df = df[df['companyid'].notna()]
 print('after dropping null companyid and too short questions', len(df))
 
 # by year 
-et_ref = pd.read_csv(f'{INPUT_DATA_PATH}/us_et_ref_v2.csv', index_col=0)
+et_ref = cached_read(f'{INPUT_DATA_PATH}/us_et_ref_v2.csv', index_col=0)
 
 # merge on year
 df = df.merge(et_ref, left_on='transcriptid', right_on='transcriptid', how='left')
@@ -1,8 +1,8 @@
-import pandas as pd
+from common.utils.arrow_cache import cached_read
 from openai_batch_wrapper.preprocess import preprocess_dataframe
 
 # load in the data
-df = pd.read_parquet('research/brokerage_culture/input_data/question_transcripts_with_employer.parquet')
+df = cached_read('research/brokerage_culture/input_data/question_transcripts_with_employer.parquet')
 print('before dropping null companyid', len(df))
 # get rid of the questions that are too short
 df = df[df['componenttext'].str.len() > 100]
@@ -1,4 +1,5 @@
 import pandas as pd
+from common.utils.arrow_cache import cached_read
 import glob 
 
 output_files = glob.glob('research/brokerage_culture/output_data/small_scale_random_200k/output/output_job_*.csv')
@@ -8,7 +9,7 @@ df = pd.concat([pd.read_csv(file) for file in output_files])
 print(df.head())
 
 # merge on 
-indexed = pd.read_parquet('research/brokerage_culture/output_data/small_scale_random_200k/indexed_input_data/indexed_df.parquet')
+indexed = cached_read('research/brokerage_culture/output_data/small_scale_random_200k/indexed_input_data/indexed_df.parquet')
 print(indexed.head())
 
 df = df.merge(indexed, left_on='custom_id', right_on='bash_custom_id', how='left')
@@ -62,7 +63,7 @@ with open('research/brokerage_culture/tex_scripts/table.tex', 'w') as f:
 
 
 # by year 
-et_ref = pd.read_csv('research/brokerage_culture/input_data/us_et_ref_v2.csv', index_col=0)
+et_ref = cached_read('research/brokerage_culture/input_data/us_et_ref_v2.csv', index_col=0)
 
 # merge on year
 df = df.merge(et_ref, left_on='transcriptid', right_on='transcriptid', how='left')
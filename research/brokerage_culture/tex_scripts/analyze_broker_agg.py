@@ -1,4 +1,5 @@
 import pandas as pd
+from common.utils.arrow_cache import cached_read
 import glob 
 
 output_files = glob.glob('research/brokerage_culture/output_data/agg_broker_quarter/output/output_job_*.csv')
@@ -8,7 +9,7 @@ df = pd.concat([pd.read_csv(file) for file in output_files])
 print(df.head())
 
 # merge on 
-indexed = pd.read_parquet('research/brokerage_culture/output_data/agg_broker_quarter/indexed_input_data/indexed_df.parquet')
+indexed = cached_read('research/brokerage_culture/output_data/agg_broker_quarter/indexed_input_data/indexed_df.parquet')
 print(indexed.head())
 
 df = df.merge(indexed, left_on='custom_id', right_on='bash_custom_id', how='left')
@@ -0,0 +1,69 @@
+"""
+Build pipeline of the ml_forecast_estimate_error data.
+
+Steps are rerun only when the content of their inputs, their code or their
+parameters changed; the dataitem extraction and the factor extraction do not
+depend on each other and run in parallel. Run from the repository root:
+
+    uv run python -m research.ml_forecast_estimate_error.pipeline [--jobs 2] [--force STEP ...] [STEP ...]
+
+Steps that query the database only see local files as inputs, so use --force
+to pick up new data in the database.
+"""
+
+import argparse
+import json
+
+from common.utils.pipeline import Pipeline, Step
+from research.ml_forecast_estimate_error.src import universe_creater
+
+SCRIPTS = "research/ml_forecast_estimate_error/scripts"
+SRC = "research/ml_forecast_estimate_error/src"
+DATA = "papers/ml_forecast_estimate_error/data"
+OUTPUT_DATA = f"{DATA}/output_data"
+# read by the estimates script, which writes one csv per dataitem
+DATAITEMID_PATH = f"{DATA}/dataitemid.json"
+
+with open(DATAITEMID_PATH) as f:
+    DATAITEMS = list(json.load(f))
+
+PIPELINE = Pipeline("ml_forecast_estimate_error", [
+    Step(
+        "estimates",
+        f"{SCRIPTS}/get_universe_earnings_estimates_guidance.py",
+        inputs=[DATAITEMID_PATH, f"{DATA}/universe/1b_2008_2022"],
+        outputs=[f"{OUTPUT_DATA}/{item}.csv" for item in DATAITEMS],
+    ),
+    Step(
+        "universe_panel",
+        universe_creater.run,
+        inputs=[f"{DATA}/universe/1b_2008_2022"] + [f"{OUTPUT_DATA}/{filename}" for filename, *_ in universe_creater.PANEL_ITEMS],
+        outputs=[f"{OUTPUT_DATA}/universe_df/universe_df.csv"],
+        params={"start_year": 2008, "end_year": 2023},
+    ),
+    Step(
+        "affactor",
+        f"{SCRIPTS}/get_affactor.py",
+        inputs=[f"{DATA}/universe/big500_data_2012_2022.csv", f"{DATA}/affactor.csv"],
+        outputs=[f"{DATA}/affactor", f"{DATA}/affactor_store"],
+    ),
+    Step(
+        "universe_with_affactor",
+        f"{SRC}/universe_append_on_affactor.py",
+        inputs=[f"{OUTPUT_DATA}/universe_df/universe_df.csv", f"{DATA}/affactor_store", f"{DATA}/affactor.csv",
+                f"{DATA}/ref_affactor.csv"],
+        outputs=[f"{OUTPUT_DATA}/universe_df/universe_with_affactor.parquet"],
+    ),
+])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bring the ml_forecast_estimate_error data up to date")
+    parser.add_argument("targets", nargs="*", help="Steps to bring up to date (default: all)")
+    parser.add_argument("--jobs", type=int, default=2, help="Number of steps run in parallel (default: 2)")
+    parser.add_argument("--force", nargs="*", metavar="STEP",
+                        help="Rerun the given steps (all selected steps if none given) even if up to date")
+    args = parser.parse_args()
+
+    force = False if args.force is None else (args.force or True)
+    print(PIPELINE.run(targets=args.targets or None, max_workers=args.jobs, force=force))
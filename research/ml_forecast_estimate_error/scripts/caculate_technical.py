@@ -1,17 +1,15 @@
 import psycopg2
-import pandas as pd
 from common.database.postgres_database import PostgresDatabase
 from common.database.db_task_manager import TaskManagerRepository
 
 def calculate_technical(task_manager, companyid = 32307, start_date = '2018-01-01', end_date = '2023-06-01', rolling_window = 252):
     #   FOR ONE STOCK
     # step 1: pull out daily return of one individual stock
-    price = task_manager.get_hist_miadj_pricing(start_date, end_date, [companyid, ])[['divadjclose', 'pricedate']]
+    price = task_manager.get_hist_miadj_pricing(start_date, end_date, [companyid, ], columns=['divadjclose', 'pricedate'])
     if len(price) <= rolling_window:
         return 1 # price history too short 
 
-    price['divadjclose'] = price['divadjclose'].astype(float)
-    price['pricedate'] = pd.to_datetime(price['pricedate'])
+    # divadjclose arrives as float64 and pricedate as datetime64 from the database layer
     price['stock_ret'] = 100*(price['divadjclose'].pct_change())
 
     # step 2: calculate technical indicators
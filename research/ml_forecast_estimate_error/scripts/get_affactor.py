@@ -7,7 +7,8 @@ The script:
 3. Loads alpha factor definitions from a CSV file
 4. Processes factors in chunks of 50 to avoid memory issues
 5. Retrieves monthly factor data for the specified date range
-6. Saves the results to separate CSV files
+6. Streams the results to separate CSV files, as a resumable extraction job:
+   finished groups are recorded in affactor/manifest.json and skipped on a rerun
 
 Input files:
 - big500_data_2012_2022.csv: Contains universe company IDs
@@ -15,6 +16,9 @@ Input files:
 
 Output:
 - Multiple CSV files in the affactor directory, each containing data for 50 factors
+- affactor/manifest.json with the parameters, status, row count and checksum of each file
+- affactor_store: the same data as Parquet dataset partitioned by factorid and year,
+  read by universe_append_on_affactor.py
 """
 
 import os
@@ -23,11 +27,15 @@ import numpy as np
 import pandas as pd
 from common.database.postgres_database import PostgresDatabase
 from common.database.db_task_manager import TaskManagerRepository
+from common.database.extraction_job import ExtractionJob
+from common.utils.dataset_store import DatasetStore
 
 # Initialize database connection
 database = PostgresDatabase(
     dbname="targetdb",
     user="ubuntu",
+    pooled=True,
+    max_pool_size=2,
 )
 print("Connected to database")
 task_manager = TaskManagerRepository(database)
@@ -42,18 +50,37 @@ affactor = pd.read_csv("papers/ml_forecast_estimate_error/data/affactor.csv")
 # Split factors into chunks of 50 for processing
 affactor_group = [affactor.factorid.unique()[i:i+50] for i in range(0, len(affactor.factorid.unique()), 50)]
 
-# Create output directory
-os.makedirs("papers/ml_forecast_estimate_error/data/affactor", exist_ok=True)
-
-# Process each group of factors
-ind = 0
-for group in affactor_group:
-    print(f"Processing factor group {ind}: {group}")
-    affactor_df = task_manager.get_afl_factor_monthly_period(
+# Extract each group of factors into its own file; a rerun resumes with the groups that did not finish
+def fetch_factor_group(factorids):
+    # stream the chunks to disk so only one chunk is held in memory at a time
+    return task_manager.get_afl_factor_monthly_period(
         begin="2011-01-01",
         end="2023-01-01",
-        factorids=group,
-        ls_ids=cids
+        factorids=factorids,
+        ls_ids=cids,
+        chunk_rows=500_000
     )
-    affactor_df.to_csv(f"papers/ml_forecast_estimate_error/data/affactor/affactor_{ind}.csv", index=False)
-    ind += 1
\ No newline at end of file
+
+job = ExtractionJob(
+    "papers/ml_forecast_estimate_error/data/affactor",
+    fetch=fetch_factor_group,
+    chunks={f"affactor_{ind}": {"factorids": group} for ind, group in enumerate(affactor_group)},
+)
+status = job.run(max_workers=2)
+print(status)
+
+# load the groups extracted by this run into the partitioned factor store, replacing their partitions;
+# groups skipped as done are only loaded if the store has none of their factors (e.g. an earlier run
+# stopped before loading them), and empty groups have nothing to load
+factor_store = DatasetStore.for_factors("papers/ml_forecast_estimate_error/data/affactor_store")
+stored_factorids = set(factor_store.partition_values("factorid")) if factor_store.root.exists() else set()
+for name, chunk in status.iterrows():
+    if chunk["rows"] == 0:
+        continue
+    if not chunk["extracted"] and stored_factorids & set(chunk["params"]["factorids"]):
+        continue
+    factor_store.write(pd.read_csv(f"papers/ml_forecast_estimate_error/data/affactor/{chunk['file']}",
+                                   parse_dates=["asofdate"], chunksize=500_000))
+
+print(database.pool_stats())
+database.close()
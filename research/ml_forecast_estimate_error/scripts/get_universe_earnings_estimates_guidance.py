@@ -7,6 +7,8 @@ import logging
 import os
 from common.database.postgres_database import PostgresDatabase
 from common.database.db_task_manager import TaskManagerRepository
+from common.database.query_cache import QueryCache
+from common.database.query_metrics import QueryMetricsCollector
 
 DATA_OUTPUT_DIR = 'papers/ml_forecast_estimate_error/data/output_data'
 os.makedirs(DATA_OUTPUT_DIR, exist_ok=True)
@@ -20,12 +22,15 @@ def get_universe_earnings_estimates_guidance(task_manager):
 
     regenerate = False
     if regenerate:
+        ## ---------- Get the company universe of all years in one query ---------- ##
+        universes = task_manager.query_global_market_cap_multi(asofdates=[f'{fy}-01-01' for fy in fys], mktcap_thres=1e3)
+        universes['fy'] = pd.to_datetime(universes['asofdate']).dt.year
         for fy in fys:
             fy = int(fy)
             print('the year being processed: '+str(fy))
 
-            ## ---------- Get the company universe ---------- ##
-            universe = task_manager.query_global_market_cap(asofdate=f'{fy}-01-01', mktcap_thres=1e3).sort_values(by='marketcap').drop_duplicates(subset=['companyid'], keep = 'last') # sort from small to large
+            universe = universes[universes['fy'] == fy].drop(columns=['asofdate', 'fy'])
+            universe = universe.sort_values(by='marketcap').drop_duplicates(subset=['companyid'], keep = 'last') # sort from small to large
             universe = universe.query("currency == 'USD'")
             universe = universe.query("exchange != 'OTCPK'")
             universe.drop(columns = ['currency', 'country'], inplace = True)
@@ -41,47 +46,47 @@ def get_universe_earnings_estimates_guidance(task_manager):
         print(universe)
         print('universe loaded! The universe has '+str(len(universe))+' companies!')
 
+    # -------- Fetch all dataitems with one scan per data table -------- #
+    # the Diff and Surprise items come from the analyst estimate table, the rest from the numeric data table
+    analysts_estimate_keys = [key for key in dataitemid if key.endswith('Diff') or key.endswith('_Surprise')]
+    estimates = task_manager.get_estimatediff_ref_co_bulk(
+        universe['companyid'].values,
+        {key: dataitemid[key] for key in analysts_estimate_keys},
+        '2008-01-01',
+        '2022-12-31'
+    )
+    estimates.update(task_manager.get_act_q_ref_co_bulk(
+        universe['companyid'].values,
+        {key: value for key, value in dataitemid.items() if key not in analysts_estimate_keys},
+        '2008-01-01'
+    ))
+
     # -------- Helper function to load or fetch data -------- #
-    def get_data(dataitem_key, analysts_estimate=False):
-        """Helper function to load or fetch data (estimates or guidance)"""
+    def get_data(dataitem_key):
+        """Helper function to pick the data (estimates or guidance) of one dataitem from the bulk fetch and write it to csv."""
         filename = f'{dataitem_key}.csv'
-        if os.path.exists(os.path.join(DATA_OUTPUT_DIR, filename)):
-            return pd.read_csv(os.path.join(DATA_OUTPUT_DIR, filename), index_col=0)
-        else:
-            if analysts_estimate:
-                data = task_manager.get_estimatediff_ref_co(
-                    universe['companyid'].values, 
-                    [dataitemid[dataitem_key]], 
-                    '2008-01-01', 
-                    '2022-12-31'
-                )
-            else:
-                data = task_manager.get_act_q_ref_co(
-                    universe['companyid'].values, 
-                    [dataitemid[dataitem_key]], 
-                    '2008-01-01'
-                )
-            data.to_csv(os.path.join(DATA_OUTPUT_DIR, filename))
-            return data
+        data = estimates[dataitem_key]
+        data.to_csv(os.path.join(DATA_OUTPUT_DIR, filename))
+        return data
 
     # -------- EPS normalized estimates --------- #
     EPSnormalized = get_data('EPSNormalized')
-    EPSnormalizedDiff = get_data('EPSNormalizedDiff', analysts_estimate=True)
-    EPSNormalized_Surprise = get_data('EPSNormalized_Surprise', analysts_estimate=True)
+    EPSnormalizedDiff = get_data('EPSNormalizedDiff')
+    EPSNormalized_Surprise = get_data('EPSNormalized_Surprise')
     EPSNormalized_count = get_data('EPSNormalized_count')
     EPSNormalized_std = get_data('EPSNormalized_std')
 
     # -------- EPS estimates --------- #
     EPS = get_data('EPS')    
-    EPSDiff = get_data('EPSDiff', analysts_estimate=True)    
-    EPS_Surprise = get_data('EPS_Surprise', analysts_estimate=True)
+    EPSDiff = get_data('EPSDiff')    
+    EPS_Surprise = get_data('EPS_Surprise')
     EPS_count = get_data('EPS_count')
     EPS_std = get_data('EPS_std')
 
     # -------- revenue estimates --------- #
     revenue = get_data('revenue')    
-    revenueDiff = get_data('revenueDiff', analysts_estimate=True)    
-    revenue_Surprise = get_data('revenue_Surprise', analysts_estimate=True)
+    revenueDiff = get_data('revenueDiff')    
+    revenue_Surprise = get_data('revenue_Surprise')
     revenue_count = get_data('revenue_count')
     revenue_std = get_data('revenue_std')
 
@@ -112,9 +117,20 @@ if __name__ == "__main__":
     database = PostgresDatabase(
     dbname="targetdb",
     user="ubuntu",
+    pooled=True,
+    max_pool_size=4,
+    # queries over 60s go to logs/slow_queries_<date>.log, with their plan over 300s
+    metrics=QueryMetricsCollector(slow_query_seconds=60, explain_seconds=300),
     )
     print("Connected to database")
 
-    task_manager = TaskManagerRepository(database)
+    # split the universe into shards of 250 companies, 4 running at a time
+    # results are cached on disk for 30 days, call task_manager.cache.invalidate() to refetch
+    task_manager = TaskManagerRepository(database, shard_size=250, max_workers=4,
+                                         cache=QueryCache(ttl=30 * 24 * 3600))
 
-    get_universe_earnings_estimates_guidance(task_manager)
\ No newline at end of file
+    get_universe_earnings_estimates_guidance(task_manager)
+    print(database.pool_stats())
+    print(task_manager.cache.stats())
+    print(database.metrics.summary())
+    database.close()
\ No newline at end of file
@@ -1,8 +1,10 @@
 import pandas as pd
-import glob
+from common.utils.dataset_store import DatasetStore
 
 universe_path = "papers/ml_forecast_estimate_error/data/output_data/universe_df/universe_df.csv"
-affactor_paths = glob.glob("papers/ml_forecast_estimate_error/data/affactor/*.csv")
+# written by scripts/get_affactor.py, partitioned by factorid and year
+factor_store = DatasetStore.for_factors("papers/ml_forecast_estimate_error/data/affactor_store")
+affactor_path = "papers/ml_forecast_estimate_error/data/affactor.csv"
 ref_affactor_path = "papers/ml_forecast_estimate_error/data/ref_affactor.csv"
 
 output_path = "papers/ml_forecast_estimate_error/data/output_data/universe_df/universe_with_affactor.parquet"
@@ -21,12 +23,25 @@ universe.sort_values(by='EPS_actual_et', ascending=True, inplace=True)
 
 print("the length of universe is ", len(universe))
 
+# append the factors in the groups of 50 of affactor.csv that get_affactor.py extracts, so
+# affactor_asofdate_{counter} belongs to the factors of affactor_{counter}.csv; only the
+# partitions of the group and the years the universe needs are read (the merge below
+# looks back at most 30 days)
+factorids = pd.read_csv(affactor_path).factorid.unique().tolist()
+factor_groups = [factorids[i:i+50] for i in range(0, len(factorids), 50)]
+date_filters = [
+    ("asofdate", ">=", universe['EPS_actual_et'].min() - pd.Timedelta("30 days")),
+    ("asofdate", "<=", universe['EPS_actual_et'].max()),
+]
+
 counter = 0
-for affactor_path in affactor_paths:
-    print(f"this is the {counter} file to be appended! the file is {affactor_path}")
+for group in factor_groups:
+    print(f"this is the {counter} factor group to be appended! the factors are {group}")
 
-    affactor = pd.read_csv(affactor_path)
-    affactor['asofdate'] = pd.to_datetime(affactor['asofdate'])
+    affactor = factor_store.read(
+        columns=['factorvalue', 'factorid', 'objectid', 'asofdate', 'securityid', 'gvkey', 'iid', 'companyid'],
+        filters=[("factorid", "in", group)] + date_filters,
+    )
     print("the length of affactor is ", len(affactor))
 
     ref_affactor = pd.read_csv(ref_affactor_path)
@@ -44,133 +44,84 @@ def load_and_process_data(filename, date_col, new_col_name, verbose=False, add_d
     return df[merge_cols]
 
 
-def load_and_process_EPS(universe_df, verbose=False):
-
-    # Process EPS actual data
-    EPS_actual = load_and_process_data("EPS.csv", "effectivedate", "EPS_actual", verbose, add_date=True)
-    universe_df = universe_df.merge(EPS_actual, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-
-    # Process EPS diff data
-    EPS_diff = load_and_process_data("EPSDiff.csv", "asofdate", "EPSDiff", verbose)
-    universe_df = universe_df.merge(EPS_diff, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-
-    # EPS_surprise
-    EPS_surprise = load_and_process_data("EPS_Surprise.csv", "asofdate", "EPS_surprise", verbose)
-    universe_df = universe_df.merge(EPS_surprise, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-
-    # EPS count 
-    EPS_count = load_and_process_data("EPS_count.csv", "effectivedate", "EPS_count", verbose)
-    universe_df = universe_df.merge(EPS_count, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-
-    # EPS std
-    EPS_std = load_and_process_data("EPS_std.csv", "effectivedate", "EPS_std", verbose)
-    universe_df = universe_df.merge(EPS_std, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-
-    # EPS_guidance
-    EPS_guidance_high = load_and_process_data("EPS_guidance_high.csv", "effectivedate", "EPS_guidance_high", verbose)
-    universe_df = universe_df.merge(EPS_guidance_high, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-
-    # EPS_guidance_low
-    EPS_guidance_low = load_and_process_data("EPS_guidance_low.csv", "effectivedate", "EPS_guidance_low", verbose)
-    universe_df = universe_df.merge(EPS_guidance_low, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-    return universe_df
-
-
-def load_and_process_EPSNormalized(universe_df, verbose=False):
-
-    # Process EPS actual data
-    EPSNormalized_actual = load_and_process_data("EPSNormalized.csv", "effectivedate", "EPSNormalized_actual", verbose, add_date=True)
-    universe_df = universe_df.merge(EPSNormalized_actual, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-
-    # Process EPS diff data
-    EPSNormalized_diff = load_and_process_data("EPSNormalizedDiff.csv", "asofdate", "EPSNormalized_diff", verbose)
-    universe_df = universe_df.merge(EPSNormalized_diff, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-
-    # EPS_surprise
-    EPSNormalized_surprise = load_and_process_data("EPSNormalized_Surprise.csv", "asofdate", "EPSNormalized_surprise", verbose)
-    universe_df = universe_df.merge(EPSNormalized_surprise, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-
-    # EPS count 
-    EPSNormalized_count = load_and_process_data("EPSNormalized_count.csv", "effectivedate", "EPSNormalized_count", verbose)
-    universe_df = universe_df.merge(EPSNormalized_count, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-
-    # EPS std
-    EPSNormalized_std = load_and_process_data("EPSNormalized_std.csv", "effectivedate", "EPSNormalized_std", verbose)
-    universe_df = universe_df.merge(EPSNormalized_std, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-
-    # EPS_guidance
-    EPSNormalized_guidance_high = load_and_process_data("EPSNormalized_guidance_high.csv", "effectivedate", "EPSNormalized_guidance_high", verbose)
-    universe_df = universe_df.merge(EPSNormalized_guidance_high, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-
-    # EPS_guidance_low
-    EPSNormalized_guidance_low = load_and_process_data("EPSNormalized_guidance_low.csv", "effectivedate", "EPSNormalized_guidance_low", verbose)
-    universe_df = universe_df.merge(EPSNormalized_guidance_low, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-    return universe_df
-
-def load_and_process_revenue(universe_df, verbose=False):
-    # Process EPS actual data
-    revenue_actual = load_and_process_data("revenue.csv", "effectivedate", "revenue_actual", verbose, add_date=True)
-    universe_df = universe_df.merge(revenue_actual, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-
-    # Process EPS diff data
-    revenue_diff = load_and_process_data("revenueDiff.csv", "asofdate", "revenueDiff", verbose)
-    universe_df = universe_df.merge(revenue_diff, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-
-    # EPS_surprise
-    revenue_surprise = load_and_process_data("revenue_Surprise.csv", "asofdate", "revenue_surprise", verbose)
-    universe_df = universe_df.merge(revenue_surprise, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-
-    # EPS count 
-    revenue_count = load_and_process_data("revenue_count.csv", "effectivedate", "revenue_count", verbose)
-    universe_df = universe_df.merge(revenue_count, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-
-    # EPS std
-    revenue_std = load_and_process_data("revenue_std.csv", "effectivedate", "revenue_std", verbose)
-    universe_df = universe_df.merge(revenue_std, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-
-    # EPS_guidance
-    revenue_guidance_high = load_and_process_data("revenue_guidance_high.csv", "effectivedate", "revenue_guidance_high", verbose)
-    universe_df = universe_df.merge(revenue_guidance_high, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-
-    # EPS_guidance_low
-    revenue_guidance_low = load_and_process_data("revenue_guidance_low.csv", "effectivedate", "revenue_guidance_low", verbose)
-    universe_df = universe_df.merge(revenue_guidance_low, on=["companyid", "fiscalyear", "fiscalquarter"], how="left")
-    return universe_df
-
-def run(verbose=False):
+KEYS = ["companyid", "fiscalyear", "fiscalquarter"]
+
+# (file, date column, column name, keep the date as <column name>_et) of every item in the panel, in column order
+PANEL_ITEMS = [
+    ("EPS.csv", "effectivedate", "EPS_actual", True),
+    ("EPSDiff.csv", "asofdate", "EPSDiff", False),
+    ("EPS_Surprise.csv", "asofdate", "EPS_surprise", False),
+    ("EPS_count.csv", "effectivedate", "EPS_count", False),
+    ("EPS_std.csv", "effectivedate", "EPS_std", False),
+    ("EPS_guidance_high.csv", "effectivedate", "EPS_guidance_high", False),
+    ("EPS_guidance_low.csv", "effectivedate", "EPS_guidance_low", False),
+    ("EPSNormalized.csv", "effectivedate", "EPSNormalized_actual", True),
+    ("EPSNormalizedDiff.csv", "asofdate", "EPSNormalized_diff", False),
+    ("EPSNormalized_Surprise.csv", "asofdate", "EPSNormalized_surprise", False),
+    ("EPSNormalized_count.csv", "effectivedate", "EPSNormalized_count", False),
+    ("EPSNormalized_std.csv", "effectivedate", "EPSNormalized_std", False),
+    ("EPSNormalized_guidance_high.csv", "effectivedate", "EPSNormalized_guidance_high", False),
+    ("EPSNormalized_guidance_low.csv", "effectivedate", "EPSNormalized_guidance_low", False),
+    ("revenue.csv", "effectivedate", "revenue_actual", True),
+    ("revenueDiff.csv", "asofdate", "revenueDiff", False),
+    ("revenue_Surprise.csv", "asofdate", "revenue_surprise", False),
+    ("revenue_count.csv", "effectivedate", "revenue_count", False),
+    ("revenue_std.csv", "effectivedate", "revenue_std", False),
+    ("revenue_guidance_high.csv", "effectivedate", "revenue_guidance_high", False),
+    ("revenue_guidance_low.csv", "effectivedate", "revenue_guidance_low", False),
+]
+
+
+def build_panel(companies, fiscalyears, verbose=False):
+    """Assemble the company-fiscal quarter panel of all PANEL_ITEMS in one keyed concat.
+
+    Instead of left-merging every item onto the full companies x years x quarters
+    grid, each item is deduplicated, restricted to the grid and indexed by
+    (companyid, fiscalyear, fiscalquarter), and all items are aligned at once, so
+    only observed keys are ever materialized. Rows and their index come out as
+    they would from the grid: in grid order, numbered by their grid position.
+
+    Args:
+        companies: companyids of the universe, in order
+        fiscalyears: Consecutive fiscal years of the grid
+        verbose: Print the duplicates found in each item
+
+    Returns:
+        pd.DataFrame: Panel rows with an actual EPS, normalized EPS or revenue date
+    """
+    companies = pd.Index(companies)
+    fiscalyears = pd.Index(fiscalyears)
+    items = []
+    for filename, date_col, new_col_name, add_date in PANEL_ITEMS:
+        df = load_and_process_data(filename, date_col, new_col_name, verbose, add_date=add_date)
+        df = df.dropna(subset=KEYS)
+        df = df[df["companyid"].isin(companies) & df["fiscalyear"].isin(fiscalyears) & df["fiscalquarter"].isin(range(1, 5))]
+        items.append(df.astype({key: "int64" for key in KEYS}).set_index(KEYS))
+
+    panel = pd.concat(items, axis=1, join="outer")
+    # keep the keys with at least one earnings date, like the filter on the full grid did
+    panel = panel[panel["EPS_actual_et"].notna() | panel["EPSNormalized_actual_et"].notna() | panel["revenue_actual_et"].notna()]
+    panel = panel.reset_index()
+
+    # position of every row in the companies x years x quarters grid
+    position = (companies.get_indexer(panel["companyid"]) * len(fiscalyears)
+                + fiscalyears.get_indexer(panel["fiscalyear"])) * 4 + panel["fiscalquarter"].to_numpy() - 1
+    panel.index = position
+    return panel.sort_index()
+
+
+def run(verbose=False, start_year=2008, end_year=2023):
     # load the universe
-    start_year = 2008
-    end_year = 2023
     fys = range(start_year, end_year)
     universe = load_universe(fys)['companyid'].tolist()
-    # create df with columns: companyid, fiscalyear, fiscalquarter
+    # the panel covers companyid x fiscalyear x fiscalquarter, but only the observed keys are built
     # the fiscal year is not exactly the same as the calendar year so we need to subtract 1 from the start year and add 1 to the end year
-    idx = pd.MultiIndex.from_product([universe, range(start_year-1, end_year+1), range(1, 5)], 
-                                   names=['companyid', 'fiscalyear', 'fiscalquarter'])
-    universe_df = pd.DataFrame(index=idx).reset_index()
+    universe_df = build_panel(universe, range(start_year-1, end_year+1), verbose)
     print(universe_df.head())
     print("the length of universe_df is: ", len(universe_df))
 
-    # load and process EPS
-    universe_df = load_and_process_EPS(universe_df, verbose)
-    # load and process EPSNormalized
-    universe_df = load_and_process_EPSNormalized(universe_df, verbose)
-    # load and process revenue
-    universe_df = load_and_process_revenue(universe_df, verbose)
-
-    
-    # drop rows that none of the EPS_actual_et, EPSNormalized_actual_et, revenue_actual_et exist
-    universe_df = universe_df[universe_df['EPS_actual_et'].notna() | universe_df['EPSNormalized_actual_et'].notna() | universe_df['revenue_actual_et'].notna()]
     os.makedirs(ADDR + "universe_df", exist_ok=True)
     universe_df.to_csv(ADDR + "universe_df/universe_df.csv")
-    
-    
-
-
-
-
-
-
 
 
 if __name__ == "__main__":
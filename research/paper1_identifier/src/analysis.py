@@ -17,6 +17,14 @@ from common.utils.data_etl_helper import load_data, save_df_to_duckdb
 logger = get_logger(__name__)
 paths = ProjectPaths().get_paper_paths("paper1_identifier")
 
+# columns of the panel used by Rsrc/msci.R
+MSCI_COLUMNS = [
+    "isin", "recs_panel_beg_date", "recs_panel_AMASKCD", "recs_panel_year", "recs_panel_rec_code",
+    "esg_rolling_num_q", "esg_esg_pctg", "esg_e_pctg", "esg_s_pctg", "esg_g_pctg",
+    "msci_esg_WEIGHTED_SCORE", "msci_esg_ENVIRONMENTAL_PILLAR_SCORE",
+    "msci_esg_SOCIAL_PILLAR_SCORE", "msci_esg_GOVERNANCE_PILLAR_SCORE",
+]
+
 @log_execution_time
 def run_r_script(r_script_path: Path, db_path: Path, table_name: str, output_dir: str):
     """
@@ -69,14 +77,20 @@ def run():
     for package in required_packages:
         check_r_package(package)
 
-    # Process data
-    data = load_data(paths["data"]["processed"] / 
-                    "ibes_recs_monthly_with_analyst_esg_score_with_msci_esg_v2_trimmed.parquet")
+    # Process data: read only what msci.R uses, and only the rows it keeps
+    data, con = load_data(paths["data"]["processed"] /
+                          "ibes_recs_monthly_with_analyst_esg_score_with_msci_esg_v2_trimmed.parquet",
+                          columns=MSCI_COLUMNS,
+                          filters=[("esg_rolling_num_q", ">=", 10)],
+                          lazy=True)
+    try:
+        print(data.limit(5).df())
+        print(data.columns)
 
-    print(data.head())
-    print(data.columns)
-    
-    save_df_to_duckdb(data, db_path=str(duckdb_path), table_name=table_name)
+        # streamed from the parquet scan into the database as Arrow, without a pandas copy
+        save_df_to_duckdb(data, db_path=str(duckdb_path), table_name=table_name, mode="replace")
+    finally:
+        con.close()
 
     # Run the R script
     run_r_script(r_script_path, db_path=str(duckdb_path), table_name=table_name, output_dir=paths["data"]["regression"])
@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from common.database.duckdb_database import DuckDBDatabase
+
+
+def write_prices(snapshot_dir, priceclose=10.0):
+    """Write miadjprice rows for trading items 100 and 200 on every day of January 2020."""
+    days = pd.date_range("2020-01-01", "2020-01-31").date
+    pd.DataFrame(
+        [(tradingitemid, day, priceclose, 9.0, 11.0, 8.0, 100.0, 10.0) for tradingitemid in (100, 200) for day in days],
+        columns=["tradingitemid", "pricedate", "priceclose", "priceopen", "pricehigh", "pricelow", "volume", "vwap"],
+    ).to_parquet(snapshot_dir / "miadjprice.parquet")
+
+
+def write_factors(snapshot_dir, factors):
+    """Write dividend adjustment factor intervals, given as (tradingitemid, fromdate, todate, divadjfactor)."""
+    df = pd.DataFrame(factors, columns=["tradingitemid", "fromdate", "todate", "divadjfactor"])
+    for column in ("fromdate", "todate"):
+        df[column] = pd.to_datetime(df[column]).dt.date
+    df.to_parquet(snapshot_dir / "ciqpriceequitydivadjfactor.parquet")
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path):
+    """Parquet snapshots of the CIQ pricing tables for companies 1 and 2."""
+    snapshot_dir = tmp_path / "snapshots"
+    snapshot_dir.mkdir()
+    pd.DataFrame({"companyid": [1, 2], "companyname": ["A", "B"], "countryid": [1, 1]}).to_parquet(
+        snapshot_dir / "ciqcompany.parquet")
+    pd.DataFrame({"securityid": [10, 20], "companyid": [1, 2], "primaryflag": [1, 1]}).to_parquet(
+        snapshot_dir / "ciqSecurity.parquet")
+    pd.DataFrame({"tradingitemid": [100, 200], "securityid": [10, 20], "primaryflag": [1, 1],
+                  "currencyid": [160, 160]}).to_parquet(snapshot_dir / "ciqtradingitem.parquet")
+    write_prices(snapshot_dir)
+    write_factors(snapshot_dir, [(100, "2019-01-01", "2020-01-04", 0.5), (100, "2020-01-05", None, 1.0)])
+    return snapshot_dir
+
+
+@pytest.fixture
+def database(snapshot_dir):
+    database = DuckDBDatabase(snapshot_dir)
+    yield database
+    database.close()
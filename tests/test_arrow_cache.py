@@ -0,0 +1,155 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.utils import arrow_cache
+from common.utils.arrow_cache import ArrowCache, cached_read
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        "companyid": [1, 2, 3],
+        "name": ["a", None, "c"],
+        "value": [0.5, 1.5, np.nan],
+    })
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    calls = []
+    decode = ArrowCache._decode
+
+    def counting(path, read_options):
+        calls.append(path.name)
+        return decode(path, read_options)
+
+    monkeypatch.setattr(ArrowCache, "_decode", staticmethod(counting))
+    return calls
+
+
+def test_read_parquet_matches_pandas(tmp_path, frame, decodes):
+    frame.to_parquet(tmp_path / "data.parquet", index=False)
+    cache = ArrowCache(tmp_path / "cache")
+
+    first = cache.read(tmp_path / "data.parquet")
+    second = cache.read(tmp_path / "data.parquet")
+
+    assert decodes == ["data.parquet"]
+    assert first["name"].dtype == pd.StringDtype("pyarrow", na_value=np.nan)
+    pd.testing.assert_frame_equal(second, first)
+    assert first["name"].isna().tolist() == [False, True, False]
+    pd.testing.assert_frame_equal(first.drop(columns="name"),
+                                  pd.read_parquet(tmp_path / "data.parquet").drop(columns="name"))
+
+
+def test_read_without_arrow_strings(tmp_path, frame):
+    frame.to_parquet(tmp_path / "data.parquet", index=False)
+    df = ArrowCache(tmp_path / "cache").read(tmp_path / "data.parquet", arrow_strings=False)
+    pd.testing.assert_frame_equal(df, pd.read_parquet(tmp_path / "data.parquet"))
+
+
+def test_read_csv_keeps_pandas_parsing(tmp_path, frame):
+    frame.to_csv(tmp_path / "data.csv")
+    df = ArrowCache(tmp_path / "cache").read(tmp_path / "data.csv", index_col=0)
+    pd.testing.assert_frame_equal(df, pd.read_csv(tmp_path / "data.csv", index_col=0), check_dtype=False)
+
+
+def test_numeric_columns_are_writable(tmp_path, frame):
+    frame.to_parquet(tmp_path / "data.parquet", index=False)
+    df = ArrowCache(tmp_path / "cache").read(tmp_path / "data.parquet")
+    df.loc[0, "value"] = 10.0
+    assert df["value"].iloc[0] == 10.0
+
+
+def test_unsupported_file_type(tmp_path):
+    (tmp_path / "data.json").write_text("{}")
+    with pytest.raises(ValueError):
+        ArrowCache(tmp_path / "cache").read(tmp_path / "data.json")
+
+
+def test_read_options_are_part_of_the_key(tmp_path, frame, decodes):
+    frame.to_parquet(tmp_path / "data.parquet", index=False)
+    cache = ArrowCache(tmp_path / "cache")
+
+    cache.read(tmp_path / "data.parquet")
+    df = cache.read(tmp_path / "data.parquet", columns=["companyid"])
+
+    assert list(df.columns) == ["companyid"]
+    assert len(decodes) == 2
+
+
+def test_changed_source_is_decoded_again(tmp_path, frame, decodes):
+    frame.to_parquet(tmp_path / "data.parquet", index=False)
+    cache = ArrowCache(tmp_path / "cache")
+    cache.read(tmp_path / "data.parquet")
+
+    frame.iloc[:2].to_parquet(tmp_path / "data.parquet", index=False)
+    assert len(cache.read(tmp_path / "data.parquet")) == 2
+
+    # touched but unchanged content still hits the cache
+    os.utime(tmp_path / "data.parquet")
+    cache.read(tmp_path / "data.parquet")
+    assert len(decodes) == 2
+
+
+def test_cache_is_shared_across_instances(tmp_path, frame, decodes):
+    frame.to_parquet(tmp_path / "data.parquet", index=False)
+    ArrowCache(tmp_path / "cache").read(tmp_path / "data.parquet")
+    ArrowCache(tmp_path / "cache").read(tmp_path / "data.parquet")
+    assert len(decodes) == 1
+
+
+def test_evict_expired_files(tmp_path, frame):
+    frame.to_parquet(tmp_path / "data.parquet", index=False)
+    cache = ArrowCache(tmp_path / "cache", max_age=3600)
+    cache.read(tmp_path / "data.parquet")
+    (cache_path,) = (tmp_path / "cache").glob("*.arrow")
+
+    assert cache.evict() == 0
+    old = time.time() - 7200
+    os.utime(cache_path, (old, old))
+    assert cache.evict() == 1
+    assert not cache_path.exists()
+
+
+def test_evict_least_recently_read_beyond_max_disk_bytes(tmp_path, frame):
+    for name in ["a", "b", "c"]:
+        frame.assign(name=name).to_parquet(tmp_path / f"{name}.parquet", index=False)
+    cache = ArrowCache(tmp_path / "cache", max_age=None)
+    cache.read(tmp_path / "a.parquet")
+    size = next((tmp_path / "cache").glob("*.arrow")).stat().st_size
+    cache.max_disk_bytes = 2 * size
+
+    cache.read(tmp_path / "b.parquet")
+    time.sleep(0.01)
+    cache.read(tmp_path / "a.parquet")
+    time.sleep(0.01)
+    # the new file and the most recently read one fit
+    cache.read(tmp_path / "c.parquet")
+
+    assert len(list((tmp_path / "cache").glob("*.arrow"))) == 2
+    assert cache.table(tmp_path / "a.parquet").num_rows == 3
+    assert len(list((tmp_path / "cache").glob("*.arrow"))) == 2
+
+
+def test_clear(tmp_path, frame):
+    frame.to_parquet(tmp_path / "data.parquet", index=False)
+    cache = ArrowCache(tmp_path / "cache")
+    cache.read(tmp_path / "data.parquet")
+    assert cache.clear() == 1
+    assert list((tmp_path / "cache").glob("*.arrow")) == []
+
+
+def test_cached_read_uses_the_default_cache(tmp_path, frame, monkeypatch):
+    monkeypatch.setattr(arrow_cache, "DEFAULT_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(arrow_cache, "_default_cache", None)
+    frame.to_parquet(tmp_path / "data.parquet", index=False)
+
+    df = cached_read(tmp_path / "data.parquet", arrow_strings=False)
+
+    pd.testing.assert_frame_equal(df, pd.read_parquet(tmp_path / "data.parquet"))
+    assert len(list((tmp_path / "cache").glob("*.arrow"))) == 1
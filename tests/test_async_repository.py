@@ -0,0 +1,85 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+
+import duckdb
+import pandas as pd
+import pytest
+
+from common.database.async_base_database import AsyncBaseDatabase
+from common.database.db_task_manager import AsyncTaskManagerRepository, TaskManagerRepository
+from common.database.pricing_store import PricingStore
+from common.database.query_cache import QueryCache
+
+
+class AsyncDuckDB(AsyncBaseDatabase):
+    """Async database running the queries of a DuckDBDatabase in worker threads."""
+
+    def __init__(self, database):
+        self.database = database
+        self.query_threads = set()
+
+    @asynccontextmanager
+    async def get_connection(self):
+        yield self.database
+
+    async def query_all(self, query, params=(), dtypes=None):
+        # queries must be issued from the event loop, not from a worker thread
+        self.query_threads.add(threading.get_ident())
+        return await asyncio.to_thread(self.database.query_all, query, params, dtypes)
+
+    async def query_iter(self, query, params=(), chunk_rows=100_000, dtypes=None):
+        for chunk in await asyncio.to_thread(lambda: list(self.database.query_iter(query, params, chunk_rows, dtypes))):
+            yield chunk
+
+
+def test_pricing_matches_the_sync_repository(database):
+    async def fetch():
+        repository = AsyncTaskManagerRepository(AsyncDuckDB(database), shard_size=1, shard_date_freq="MS")
+        return await repository.get_hist_miadj_pricing("2020-01-02", "2020-01-08", [1, 2])
+
+    expected = TaskManagerRepository(database).get_hist_miadj_pricing("2020-01-02", "2020-01-08", [1, 2])
+    pd.testing.assert_frame_equal(asyncio.run(fetch()), expected)
+
+
+def test_streaming_and_export(database, tmp_path):
+    async def run():
+        repository = AsyncTaskManagerRepository(AsyncDuckDB(database))
+        chunks = [chunk async for chunk in repository.get_miadj_pricing_raw("2020-01-01", "2020-01-10", [1, 2],
+                                                                            chunk_rows=5)]
+        rows = await repository.get_miadj_pricing_raw("2020-01-01", "2020-01-10", [1, 2],
+                                                      export_path=tmp_path / "prices.parquet")
+        return chunks, rows
+
+    chunks, rows = asyncio.run(run())
+    assert [len(chunk) for chunk in chunks] == [5, 5, 5, 5]
+    assert rows == 20
+    assert len(pd.read_parquet(tmp_path / "prices.parquet")) == 20
+
+
+def test_sync_hist_miadj_pricing(database, tmp_path):
+    async_database = AsyncDuckDB(database)
+
+    async def sync():
+        repository = AsyncTaskManagerRepository(async_database, cache=QueryCache(tmp_path / "cache"))
+        store = PricingStore(tmp_path / "store")
+        prices = await repository.sync_hist_miadj_pricing("2020-01-02", "2020-01-08", [1, 2], store)
+        return prices, threading.get_ident()
+
+    prices, loop_thread = asyncio.run(sync())
+    expected = TaskManagerRepository(database).sync_hist_miadj_pricing(
+        "2020-01-02", "2020-01-08", [1, 2], PricingStore(tmp_path / "sync_store"))
+    pd.testing.assert_frame_equal(prices, expected)
+    assert async_database.query_threads == {loop_thread}
+    assert PricingStore(tmp_path / "store").missing("2020-01-02", "2020-01-08", [1, 2]) == {}
+
+
+def test_sync_hist_miadj_pricing_propagates_errors(database, tmp_path):
+    async def sync():
+        repository = AsyncTaskManagerRepository(AsyncDuckDB(database))
+        await repository.sync_hist_miadj_pricing("2020-01-02", "2020-01-08", [1], PricingStore(tmp_path / "store"))
+
+    database.close()
+    with pytest.raises(duckdb.Error):
+        asyncio.run(sync())
+    assert PricingStore(tmp_path / "store").coverage == {}
@@ -0,0 +1,175 @@
+import threading
+import time
+
+import pytest
+
+from common.database.connection_pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    """DB-API connection stand-in that records its calls."""
+
+    def __init__(self, healthy=True):
+        self.healthy = healthy
+        self.closed = 0
+        self.queries = []
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        if self.closed:
+            raise RuntimeError("connection already closed")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query):
+        if not self.conn.healthy:
+            raise RuntimeError("server closed the connection unexpectedly")
+        self.conn.queries.append(query)
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class Connect:
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.connections = []
+
+    def __call__(self):
+        if self.fail_after is not None and len(self.connections) >= self.fail_after:
+            raise ConnectionError("could not connect")
+        conn = FakeConnection()
+        self.connections.append(conn)
+        return conn
+
+
+def test_opens_min_size_up_front_and_grows_to_max_size():
+    connect = Connect()
+    pool = ConnectionPool(connect, min_size=2, max_size=3, timeout=0.05)
+    assert len(connect.connections) == 2
+    assert pool.stats()["idle_connections"] == 2
+
+    conns = [pool.getconn() for _ in range(3)]
+    assert len(connect.connections) == 3
+    assert len({id(conn) for conn in conns}) == 3
+    assert pool.stats()["open_connections"] == 3
+
+
+def test_invalid_sizes():
+    with pytest.raises(ValueError):
+        ConnectionPool(Connect(), min_size=3, max_size=2)
+    with pytest.raises(ValueError):
+        ConnectionPool(Connect(), min_size=0, max_size=0)
+
+
+def test_failed_pre_open_closes_opened_connections():
+    connect = Connect(fail_after=2)
+    with pytest.raises(ConnectionError):
+        ConnectionPool(connect, min_size=3, max_size=3)
+    assert [conn.closed for conn in connect.connections] == [1, 1]
+
+
+def test_checkout_times_out_when_exhausted():
+    pool = ConnectionPool(Connect(), min_size=0, max_size=1, timeout=0.05)
+    pool.getconn()
+    start = time.monotonic()
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+    assert time.monotonic() - start >= 0.05
+
+
+def test_waiting_checkout_gets_returned_connection():
+    pool = ConnectionPool(Connect(), min_size=1, max_size=1, timeout=5)
+    conn = pool.getconn()
+    threading.Timer(0.05, pool.putconn, args=(conn,)).start()
+    assert pool.getconn() is conn
+    assert pool.stats()["max_wait_time"] > 0
+    # returned connections are rolled back so the next user starts clean
+    assert conn.rollbacks == 1
+
+
+def test_idle_connection_is_pinged_after_interval():
+    connect = Connect()
+    pool = ConnectionPool(connect, min_size=1, max_size=1, health_check_interval=0)
+    conn = pool.getconn()
+    assert conn.queries == ["SELECT 1"]
+
+    pool.health_check_interval = 60
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert conn.queries == ["SELECT 1"]
+
+
+def test_broken_idle_connection_is_replaced():
+    connect = Connect()
+    pool = ConnectionPool(connect, min_size=1, max_size=1, health_check_interval=0)
+    broken = connect.connections[0]
+    broken.healthy = False
+
+    conn = pool.getconn()
+    assert conn is not broken
+    assert broken.closed
+    stats = pool.stats()
+    assert stats["health_check_failures"] == 1
+    assert stats["connections_closed"] == 1
+    assert stats["open_connections"] == 1
+
+
+def test_closed_or_discarded_connections_are_not_reused():
+    connect = Connect()
+    discarded = []
+    pool = ConnectionPool(connect, min_size=0, max_size=2)
+    pool.add_discard_callback(discarded.append)
+
+    first = pool.getconn()
+    first.close()
+    pool.putconn(first)
+    second = pool.getconn()
+    pool.putconn(second, discard=True)
+
+    assert discarded == [first, second]
+    assert second.closed
+    assert pool.stats()["open_connections"] == 0
+    assert pool.getconn() not in (first, second)
+
+
+def test_connection_context_manager_discards_only_closed_connections():
+    pool = ConnectionPool(Connect(), min_size=1, max_size=1)
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError("query failed")
+    assert not conn.closed
+    assert pool.stats()["idle_connections"] == 1
+
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            conn.close()
+            raise ValueError("connection lost")
+    assert pool.stats()["open_connections"] == 0
+
+
+def test_close():
+    connect = Connect()
+    pool = ConnectionPool(connect, min_size=2, max_size=3)
+    in_use = pool.getconn()
+    pool.close()
+    assert [conn.closed for conn in connect.connections if conn is not in_use] == [1]
+    with pytest.raises(RuntimeError, match="closed"):
+        pool.getconn()
+    # a connection returned after close is closed rather than kept
+    pool.putconn(in_use)
+    assert in_use.closed
+    assert pool.stats()["open_connections"] == 0
@@ -0,0 +1,159 @@
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from common.utils.data_conversion.csv_to_parquet import MANIFEST_NAME, convert_csv_to_parquet, convert_directory
+
+
+def write_csv(path, rows=1000):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame({
+        "companyid": range(rows),
+        "asofdate": pd.date_range("2020-01-01", periods=rows, freq="D").strftime("%Y-%m-%d"),
+        "price": [i / 4 for i in range(rows)],
+        "currency": ["USD" if i % 3 else "EUR" for i in range(rows)],
+    }).to_csv(path, index=False)
+    return path
+
+
+def test_streaming_matches_pandas(tmp_path):
+    csv_path = write_csv(tmp_path / "prices.csv")
+    output_path = convert_csv_to_parquet(str(csv_path), str(tmp_path / "out"), block_size=4096)
+
+    assert output_path == tmp_path / "out" / "prices.parquet"
+    # every block becomes its own row group
+    assert pq.ParquetFile(output_path).metadata.num_row_groups > 1
+    pd.testing.assert_frame_equal(pd.read_parquet(output_path), pd.read_csv(csv_path), check_dtype=False)
+
+
+def test_streaming_keeps_dates_as_strings(tmp_path):
+    csv_path = write_csv(tmp_path / "prices.csv", rows=10)
+    schema = pq.read_schema(convert_csv_to_parquet(str(csv_path)))
+    assert schema.field("asofdate").type == pa.string()
+
+
+def test_column_types_override_inferred_types(tmp_path):
+    csv_path = write_csv(tmp_path / "prices.csv", rows=10)
+    output_path = convert_csv_to_parquet(str(csv_path), column_types={"asofdate": "date32", "companyid": "string"})
+
+    schema = pq.read_schema(output_path)
+    assert schema.field("asofdate").type == pa.date32()
+    assert schema.field("companyid").type == pa.string()
+
+
+def test_column_empty_in_first_block_is_read_as_string(tmp_path):
+    csv_path = tmp_path / "notes.csv"
+    csv_path.write_text("id,note\n" + "".join(f"{i},\n" for i in range(500)) + "500,late\n")
+
+    table = pq.read_table(convert_csv_to_parquet(str(csv_path), block_size=1024))
+    assert table.schema.field("note").type == pa.string()
+    assert table.column("note").to_pylist()[-1] == "late"
+
+
+def test_non_streaming_matches_pandas(tmp_path):
+    csv_path = write_csv(tmp_path / "prices.csv", rows=10)
+    output_path = convert_csv_to_parquet(str(csv_path), streaming=False)
+    pd.testing.assert_frame_equal(pd.read_parquet(output_path), pd.read_csv(csv_path))
+
+
+def test_failed_conversion_keeps_the_previous_output(tmp_path):
+    csv_path = write_csv(tmp_path / "prices.csv", rows=10)
+    output_path = convert_csv_to_parquet(str(csv_path))
+    before = pd.read_parquet(output_path)
+
+    with pytest.raises(pa.ArrowInvalid):
+        convert_csv_to_parquet(str(csv_path), column_types={"currency": "int64"})
+
+    pd.testing.assert_frame_equal(pd.read_parquet(output_path), before)
+    assert [path.name for path in tmp_path.iterdir() if path.suffix == ".tmp"] == []
+
+
+def test_optimize_narrows_the_schema(tmp_path):
+    csv_path = write_csv(tmp_path / "prices.csv", rows=100)
+    output_path = convert_csv_to_parquet(str(csv_path), optimize=True, float32=True,
+                                         registry_path=str(tmp_path / "registry.json"))
+
+    schema = pq.read_schema(output_path)
+    assert schema.field("companyid").type == pa.int8()
+    assert schema.field("price").type == pa.float32()
+    assert pa.types.is_dictionary(schema.field("currency").type)
+
+
+@pytest.fixture
+def csv_dir(tmp_path):
+    write_csv(tmp_path / "csv" / "prices.csv", rows=10)
+    write_csv(tmp_path / "csv" / "us" / "prices.csv", rows=20)
+    write_csv(tmp_path / "csv" / "eu" / "rates.csv", rows=30)
+    return tmp_path / "csv"
+
+
+def test_convert_directory_mirrors_subdirectories(csv_dir, tmp_path):
+    summary = convert_directory(str(csv_dir), str(tmp_path / "out"))
+
+    assert summary["converted"] == 3
+    assert summary["skipped"] == 0
+    assert len(pd.read_parquet(tmp_path / "out" / "prices.parquet")) == 10
+    assert len(pd.read_parquet(tmp_path / "out" / "us" / "prices.parquet")) == 20
+    assert len(pd.read_parquet(tmp_path / "out" / "eu" / "rates.parquet")) == 30
+    manifest = json.loads((tmp_path / "out" / MANIFEST_NAME).read_text())
+    assert sorted(manifest) == sorted(str(path) for path in csv_dir.glob("**/*.csv"))
+
+
+def test_convert_directory_skips_unchanged_files(csv_dir, tmp_path):
+    convert_directory(str(csv_dir), str(tmp_path / "out"))
+    output_path = tmp_path / "out" / "prices.parquet"
+    mtime = output_path.stat().st_mtime_ns
+
+    # touched but identical content is skipped too
+    os.utime(csv_dir / "prices.csv")
+    summary = convert_directory(str(csv_dir), str(tmp_path / "out"))
+
+    assert summary["converted"] == 0
+    assert summary["skipped"] == 3
+    assert output_path.stat().st_mtime_ns == mtime
+
+
+def test_convert_directory_reconverts_changed_files(csv_dir, tmp_path):
+    convert_directory(str(csv_dir), str(tmp_path / "out"))
+    write_csv(csv_dir / "us" / "prices.csv", rows=25)
+
+    summary = convert_directory(str(csv_dir), str(tmp_path / "out"))
+
+    assert summary["converted"] == 1
+    assert summary["skipped"] == 2
+    assert len(pd.read_parquet(tmp_path / "out" / "us" / "prices.parquet")) == 25
+
+
+def test_convert_directory_reconverts_when_options_change(csv_dir, tmp_path):
+    convert_directory(str(csv_dir), str(tmp_path / "out"))
+
+    summary = convert_directory(str(csv_dir), str(tmp_path / "out"), column_types={"asofdate": "date32"})
+
+    assert summary["converted"] == 3
+    assert pq.read_schema(tmp_path / "out" / "prices.parquet").field("asofdate").type == pa.date32()
+
+
+def test_convert_directory_force(csv_dir, tmp_path):
+    convert_directory(str(csv_dir), str(tmp_path / "out"))
+    summary = convert_directory(str(csv_dir), str(tmp_path / "out"), force=True)
+    assert summary["converted"] == 3
+
+
+def test_convert_directory_next_to_the_csv_files(csv_dir):
+    convert_directory(str(csv_dir))
+
+    assert (csv_dir / "us" / "prices.parquet").exists()
+    assert (csv_dir / MANIFEST_NAME).exists()
+    assert convert_directory(str(csv_dir))["skipped"] == 3
+
+
+def test_convert_directory_with_several_jobs(csv_dir, tmp_path):
+    summary = convert_directory(str(csv_dir), str(tmp_path / "out"), jobs=3)
+
+    assert summary["converted"] == 3
+    assert len(json.loads((tmp_path / "out" / MANIFEST_NAME).read_text())) == 3
+    assert convert_directory(str(csv_dir), str(tmp_path / "out"), jobs=3)["skipped"] == 3
@@ -0,0 +1,130 @@
+import warnings
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from common.utils.data_etl_helper import load_data, save_df_to_duckdb
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "test.duckdb")
+
+
+def read(db_path, table="prices"):
+    with duckdb.connect(db_path) as con:
+        return con.execute(f"SELECT * FROM {table} ORDER BY id").df()
+
+
+def frame(ids, values):
+    return pd.DataFrame({"id": ids, "value": values})
+
+
+def test_replace(db_path):
+    assert save_df_to_duckdb(frame([1, 2], [1.0, 2.0]), db_path, "prices") == 2
+    assert save_df_to_duckdb(frame([3], [3.0]), db_path, "prices") == 1
+    pd.testing.assert_frame_equal(read(db_path), frame([3], [3.0]))
+
+
+def test_append_creates_the_table(db_path):
+    assert save_df_to_duckdb(frame([1], [1.0]), db_path, "prices", mode="append") == 1
+    assert save_df_to_duckdb(frame([1, 2], [1.0, 2.0]), db_path, "prices", mode="append") == 2
+    assert read(db_path)["id"].tolist() == [1, 1, 2]
+
+
+def test_append_with_keys_inserts_only_new_keys(db_path):
+    save_df_to_duckdb(frame([1, 2], [1.0, 2.0]), db_path, "prices")
+    assert save_df_to_duckdb(frame([2, 3], [20.0, 30.0]), db_path, "prices", mode="append", key_columns=["id"]) == 1
+    pd.testing.assert_frame_equal(read(db_path), frame([1, 2, 3], [1.0, 2.0, 30.0]))
+
+
+def test_upsert_replaces_matching_keys(db_path):
+    save_df_to_duckdb(frame([1, 2], [1.0, 2.0]), db_path, "prices")
+    assert save_df_to_duckdb(frame([2, 3], [20.0, 30.0]), db_path, "prices", mode="upsert", key_columns=["id"],
+                             create_index=True) == 2
+    pd.testing.assert_frame_equal(read(db_path), frame([1, 2, 3], [1.0, 20.0, 30.0]))
+
+
+def test_upsert_with_composite_key_and_columns_by_name(db_path):
+    save_df_to_duckdb(pd.DataFrame({"id": [1, 1], "date": ["a", "b"], "value": [1.0, 2.0]}), db_path, "prices")
+    save_df_to_duckdb(pd.DataFrame({"value": [5.0], "date": ["b"], "id": [1]}), db_path, "prices",
+                      mode="upsert", key_columns=["id", "date"])
+    with duckdb.connect(db_path) as con:
+        assert con.execute("SELECT id, date, value FROM prices ORDER BY date").fetchall() == [(1, "a", 1.0), (1, "b", 5.0)]
+
+
+def test_arrow_table_and_relation(db_path, tmp_path):
+    save_df_to_duckdb(pa.table({"id": [2, 1], "value": [2.0, 1.0]}), db_path, "prices", sort_by=["id"])
+    with duckdb.connect(db_path) as con:
+        assert con.execute("SELECT id FROM prices").fetchall() == [(1,), (2,)]
+
+    other = duckdb.connect()
+    relation = other.sql("SELECT range AS id, range * 1.5 AS value FROM range(3)")
+    assert save_df_to_duckdb(relation, db_path, "prices") == 3
+    other.close()
+
+
+def test_relation_is_streamed_without_deprecated_api(db_path):
+    other = duckdb.connect()
+    relation = other.sql("SELECT range AS id FROM range(3)")
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        assert save_df_to_duckdb(relation, db_path, "prices") == 3
+    other.close()
+
+
+def test_reuses_connection(db_path):
+    with duckdb.connect(db_path) as con:
+        save_df_to_duckdb(frame([1], [1.0]), db_path, "prices", con=con)
+        assert con.execute("SELECT count(*) FROM prices").fetchone()[0] == 1
+
+
+def test_invalid_arguments(db_path):
+    with pytest.raises(ValueError, match="mode"):
+        save_df_to_duckdb(frame([1], [1.0]), db_path, "prices", mode="merge")
+    with pytest.raises(ValueError, match="upsert"):
+        save_df_to_duckdb(frame([1], [1.0]), db_path, "prices", mode="upsert")
+    with pytest.raises(ValueError, match="index"):
+        save_df_to_duckdb(frame([1], [1.0]), db_path, "prices", create_index=True)
+
+
+def test_failed_write_rolls_back(db_path):
+    save_df_to_duckdb(frame([1], [1.0]), db_path, "prices")
+    with pytest.raises(duckdb.Error):
+        save_df_to_duckdb(pd.DataFrame({"id": [2], "missing": [1.0]}), db_path, "prices", mode="append")
+    pd.testing.assert_frame_equal(read(db_path), frame([1], [1.0]))
+
+
+def test_failed_register_is_not_masked_by_rollback(db_path):
+    with pytest.raises(duckdb.InvalidInputException, match="data_table"):
+        save_df_to_duckdb(object(), db_path, "prices")
+
+
+
+def test_load_from_duckdb_releases_the_database(db_path):
+    save_df_to_duckdb(frame([1, 2, 3], [1.0, 2.0, 3.0]), db_path, "prices")
+
+    df = load_data(db_path, table="prices", columns=["id"], filters=[("value", ">=", 2.0)])
+
+    assert sorted(df["id"].tolist()) == [2, 3]
+    # the read-only connection is closed, so the file can be opened for writing again
+    with duckdb.connect(db_path) as con:
+        con.execute("INSERT INTO prices VALUES (4, 4.0)")
+
+
+def test_load_lazy_returns_the_connection(db_path, tmp_path):
+    frame([1, 2, 3], [1.0, 2.0, 3.0]).to_parquet(tmp_path / "prices.parquet", index=False)
+
+    relation, con = load_data(tmp_path / "prices.parquet", filters=[("id", "in", [1, 3])], lazy=True)
+    try:
+        assert save_df_to_duckdb(relation, db_path, "prices") == 2
+    finally:
+        con.close()
+    assert read(db_path)["id"].tolist() == [1, 3]
+
+
+def test_load_with_limit(tmp_path):
+    frame([1, 2, 3], [1.0, 2.0, 3.0]).to_parquet(tmp_path / "prices.parquet", index=False)
+    assert len(load_data(tmp_path / "prices.parquet", limit=2)) == 2
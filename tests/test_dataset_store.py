@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.utils.dataset_store import DatasetStore
+
+
+def factors(factorids=(460, 502), years=(2020, 2021), value=0.0):
+    asofdates = [d for year in years for d in pd.date_range(f"{year}-01-01", periods=12, freq="MS")]
+    return pd.DataFrame([
+        {"factorid": factorid, "companyid": companyid, "asofdate": asofdate, "factorvalue": value + companyid}
+        for factorid in factorids for asofdate in asofdates for companyid in (1, 2)
+    ])
+
+
+def sort(df):
+    return df.sort_values(list(df.columns), ignore_index=True)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DatasetStore.for_factors(tmp_path / "affactor")
+    store.write(factors())
+    return store
+
+
+def test_write_partitions_by_factor_and_year(store):
+    assert store.partition_values("factorid") == [460, 502]
+    assert store.partition_values("year") == [2020, 2021]
+    assert (store.root / "factorid=460" / "year=2021").is_dir()
+
+
+def test_read_filters_like_pandas(store):
+    df = store.read(columns=["factorid", "companyid", "asofdate", "factorvalue"],
+                    filters=[("factorid", "in", [502]), ("asofdate", ">=", "2021-03-01"), ("companyid", "==", 2)])
+    expected = factors()
+    expected = expected[(expected["factorid"] == 502) & (expected["asofdate"] >= "2021-03-01")
+                        & (expected["companyid"] == 2)]
+    pd.testing.assert_frame_equal(sort(df), sort(expected), check_dtype=False)
+
+
+def test_date_filters_prune_year_partitions(store):
+    filters = store._with_partition_filters([("asofdate", "<", "2020-07-01")])
+    assert filters[-1] == ("year", "<=", 2020)
+    expression = store._expression(filters, store.dataset().schema)
+    files = {fragment.path for fragment in store.dataset().get_fragments(filter=expression)}
+    assert files and all("year=2020" in path for path in files)
+
+
+def test_rewrite_replaces_touched_partitions(store):
+    store.write(factors(factorids=[460], years=[2021], value=100.0))
+    df = store.read(filters=[("factorid", "==", 460)])
+    assert len(df) == 48
+    assert (df.loc[df["year"] == 2021, "factorvalue"] >= 100).all()
+    assert (df.loc[df["year"] == 2020, "factorvalue"] < 100).all()
+    # untouched partitions keep their rows
+    assert len(store.read(filters=[("factorid", "==", 502)])) == 48
+
+
+def test_append_without_replace(store):
+    store.write(factors(factorids=[460], years=[2021]), replace_partitions=False)
+    assert len(store.read(filters=[("factorid", "==", 460), ("year", "==", 2021)])) == 48
+
+
+def test_write_chunks_replaces_each_partition_once(tmp_path):
+    store = DatasetStore.for_factors(tmp_path / "affactor")
+    data = factors(factorids=[460], years=[2020])
+    chunks = [data.iloc[:10], data.iloc[:0], data.iloc[10:]]
+    assert store.write(iter(chunks)) == len(data)
+    assert len(store.read()) == len(data)
+
+
+def test_price_store_buckets_companies(tmp_path):
+    store = DatasetStore.for_prices(tmp_path / "prices", n_buckets=4)
+    prices = pd.DataFrame({
+        "companyid": np.repeat([1, 5, 6], 3),
+        "pricedate": pd.to_datetime(["2020-12-30", "2020-12-31", "2021-01-04"] * 3),
+        "priceclose": np.arange(9, dtype="float64"),
+    })
+    store.write(prices)
+    assert store.partition_values("company_bucket") == [1, 2]
+
+    filters = store._with_partition_filters([("companyid", "in", [5])])
+    assert filters[-1] == ("company_bucket", "in", [1])
+    df = store.read(columns=["companyid", "pricedate", "priceclose"],
+                    filters=[("companyid", "in", [5]), ("pricedate", ">", "2020-12-31")])
+    assert df["priceclose"].tolist() == [5.0]
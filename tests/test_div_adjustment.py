@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.database.div_adjustment import apply_div_adj_factors
+
+
+@pytest.fixture
+def factors():
+    return pd.DataFrame({
+        "tradingitemid": [1, 1, 1, 2],
+        "fromdate": pd.to_datetime(["2020-01-01", "2020-02-01", "2020-04-01", "2020-01-15"]),
+        "todate": pd.to_datetime(["2020-01-31", "2020-02-29", None, "2020-01-31"]),
+        "divadjfactor": [0.5, 0.8, 0.9, 0.25],
+    })
+
+
+def range_join(prices, factors):
+    """Reference: the fromdate <= pricedate <= todate join of get_hist_miadj_pricing, row by row."""
+    result = []
+    for _, price in prices.iterrows():
+        pricedate = pd.Timestamp(price["pricedate"])
+        match = factors[(factors["tradingitemid"] == price["tradingitemid"]) & (factors["fromdate"] <= pricedate)
+                        & (factors["todate"].isna() | (pricedate <= factors["todate"]))]
+        result.append(match["divadjfactor"].iloc[0] if len(match) else 1.0)
+    return np.array(result)
+
+
+def test_matches_range_join(factors):
+    prices = pd.DataFrame({
+        "tradingitemid": [1, 2, 1, 1, 1, 2, 1, 3, 1],
+        "pricedate": pd.to_datetime(["2020-03-15", "2020-01-20", "2020-01-01", "2020-01-31", "2019-12-31",
+                                     "2020-02-03", "2021-06-01", "2020-01-20", "2020-02-29"]),
+        "priceclose": [10.0, 20.0, 30.0, 40.0, 50.0, 60.0, 70.0, 80.0, 90.0],
+    }, index=[9, 8, 7, 6, 5, 4, 3, 2, 1])
+
+    adjusted = apply_div_adj_factors(prices, factors)
+
+    expected = range_join(prices, factors)
+    np.testing.assert_array_equal(adjusted["divadjfactor"].to_numpy(), expected)
+    np.testing.assert_array_equal(adjusted["divadjclose"].to_numpy(), prices["priceclose"].to_numpy() * expected)
+    # [gap in March, open interval, before the first interval, unknown item] fall back where they should
+    assert adjusted["divadjfactor"].tolist() == [1.0, 0.25, 0.5, 0.5, 1.0, 1.0, 0.9, 1.0, 0.8]
+
+
+def test_keeps_rows_and_leaves_input_untouched(factors):
+    prices = pd.DataFrame({
+        "tradingitemid": [2, 1],
+        "pricedate": ["2020-01-20", "2020-04-02"],
+        "priceclose": [4.0, 10.0],
+        "volume": [100, 200],
+    }, index=["b", "a"])
+    original = prices.copy()
+
+    adjusted = apply_div_adj_factors(prices, factors)
+
+    pd.testing.assert_frame_equal(prices, original)
+    assert adjusted.index.tolist() == ["b", "a"]
+    assert adjusted.columns.tolist() == ["tradingitemid", "pricedate", "priceclose", "volume", "divadjclose", "divadjfactor"]
+    assert adjusted["divadjclose"].tolist() == [1.0, 9.0]
+
+
+def test_without_factors():
+    prices = pd.DataFrame({"tradingitemid": [1], "pricedate": pd.to_datetime(["2020-01-01"]), "priceclose": [5.0]})
+    factors = pd.DataFrame({"tradingitemid": pd.Series([], dtype="int64"),
+                            "fromdate": pd.Series([], dtype="datetime64[ns]"),
+                            "todate": pd.Series([], dtype="datetime64[ns]"),
+                            "divadjfactor": pd.Series([], dtype="float64")})
+    adjusted = apply_div_adj_factors(prices, factors)
+    assert adjusted["divadjfactor"].tolist() == [1.0]
+    assert adjusted["divadjclose"].tolist() == [5.0]
@@ -0,0 +1,106 @@
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+
+from common.database.base_database import BaseDatabase
+from common.database.db_task_manager import TaskManagerRepository
+from common.database.duckdb_database import DuckDBDatabase, translate_postgres_sql
+
+
+@pytest.fixture
+def database(snapshot_dir):
+    pd.DataFrame({
+        "companyId": [1, 1, 2, 3],
+        "pricingDate": pd.to_datetime(["2020-01-02", "2020-01-03", "2020-01-02", "2020-01-03"]),
+        "marketCap": [10.0, 11.0, 20.0, 30.0],
+    }).to_parquet(snapshot_dir / "ciqMarketCap.parquet")
+    # a hive partitioned table is registered from its directory
+    pd.DataFrame({"currencyid": [160, 161], "isocode": ["USD", "EUR"]}).to_parquet(
+        snapshot_dir / "ciqcurrency", partition_cols=["isocode"])
+    (snapshot_dir / "notes.txt").write_text("not a table")
+    database = DuckDBDatabase(snapshot_dir)
+    yield database
+    database.close()
+
+
+def read_dataset(path):
+    return ds.dataset(path, format="parquet", partitioning="hive").to_table().to_pandas()
+
+
+def test_translate_postgres_sql():
+    assert translate_postgres_sql("SELECT * FROM t WHERE a = ANY(%s) AND b LIKE 'x%%'") == \
+        "SELECT * FROM t WHERE a = ANY(?) AND b LIKE 'x%'"
+
+
+def test_registers_snapshot_files_and_directories(database, snapshot_dir):
+    assert set(database.tables) == {"ciqcompany", "ciqsecurity", "ciqtradingitem", "miadjprice",
+                                    "ciqpriceequitydivadjfactor", "ciqmarketcap", "ciqcurrency"}
+    currencies = database.query_all("SELECT currencyid, isocode FROM CIQCURRENCY ORDER BY currencyid")
+    assert currencies.values.tolist() == [[160, "USD"], [161, "EUR"]]
+
+
+def test_missing_snapshot_dir(tmp_path):
+    assert DuckDBDatabase(tmp_path / "missing").tables == {}
+
+
+def test_query_all_binds_lists_and_lower_cases_columns(database):
+    df = database.query_all(
+        "SELECT companyId, marketCap FROM ciqMarketCap WHERE companyid = ANY(%s) AND pricingdate = %s::date "
+        "ORDER BY companyid", ([1, 2], "2020-01-02"))
+    assert df.columns.tolist() == ["companyid", "marketcap"]
+    assert df.values.tolist() == [[1, 10.0], [2, 20.0]]
+    assert database.query_all("SELECT companyid FROM ciqmarketcap", dtypes={"companyid": "int8"})["companyid"].dtype == "int8"
+
+
+def test_query_iter_chunks(database):
+    chunks = list(database.query_iter("SELECT companyId FROM ciqmarketcap ORDER BY 1", chunk_rows=3))
+    assert [len(chunk) for chunk in chunks] == [3, 1]
+    assert chunks[0].columns.tolist() == ["companyid"]
+    assert pd.concat(chunks)["companyid"].tolist() == [1, 1, 2, 3]
+
+
+def test_records_metrics(database):
+    database.query_all("SELECT * FROM ciqmarketcap WHERE companyid = %s", (1,))
+    records = database.metrics.records()
+    assert len(records) == 1
+    assert records.loc[0, "rows"] == 2
+    assert records.loc[0, "bytes"] > 0
+
+
+def test_repository_runs_unchanged(database):
+    repository = TaskManagerRepository(database, shard_size=1)
+    prices = repository.get_hist_miadj_pricing("2020-01-03", "2020-01-06", [1, 2])
+    assert len(prices) == 8
+    assert prices["pricedate"].is_monotonic_increasing
+    first = prices[prices["companyid"] == 1]
+    assert first["divadjclose"].tolist() == [5.0, 5.0, 10.0, 10.0]
+
+
+def test_snapshot_tables(database, tmp_path):
+    counts = DuckDBDatabase.snapshot_tables(database, tmp_path / "copy", {
+        "ciqMarketCap": "SELECT * FROM ciqmarketcap WHERE companyid < 3",
+    })
+    assert counts == {"ciqMarketCap": 3}
+    copy = DuckDBDatabase(tmp_path / "copy")
+    assert copy.query_all("SELECT count(*) AS n FROM ciqmarketcap")["n"].tolist() == [3]
+    copy.close()
+
+
+@pytest.mark.parametrize("export", [DuckDBDatabase.export_parquet, BaseDatabase.export_parquet])
+def test_partitioned_export_replaces_previous_export(database, tmp_path, export):
+    output_path = tmp_path / "export"
+    query = "SELECT companyid, marketcap FROM ciqmarketcap WHERE companyid = ANY(%s)"
+    assert export(database, query, output_path, ([1, 2],), partition_cols=["companyid"]) == 3
+    assert export(database, query, output_path, ([1],), partition_cols=["companyid"], chunk_rows=1) == 2
+
+    exported = read_dataset(output_path)
+    assert sorted(exported["marketcap"]) == [10.0, 11.0]
+    assert not (output_path / "companyid=2").exists()
+
+
+def test_export_to_file_overwrites(database, tmp_path):
+    output_path = tmp_path / "out" / "marketcap.parquet"
+    database.export_parquet("SELECT * FROM ciqmarketcap", output_path)
+    assert database.export_parquet("SELECT * FROM ciqmarketcap WHERE companyid = %s", output_path, (3,)) == 1
+    assert pq.read_table(output_path).column("companyid").to_pylist() == [3]
@@ -0,0 +1,107 @@
+import json
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from common.database.extraction_job import ExtractionJob
+
+
+class Fetch:
+    """Fetch returning one frame per id, failing for the ids in fail."""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.calls = []
+
+    def __call__(self, ids, start):
+        self.calls.append(tuple(ids))
+        if set(ids) & self.fail:
+            raise ConnectionError("connection lost")
+        return pd.DataFrame({"companyid": ids, "date": [start] * len(ids)})
+
+
+CHUNKS = {f"part_{i}": {"ids": ids, "start": "2020-01-01"} for i, ids in enumerate([[1, 2], [3], [4, 5]])}
+
+
+@pytest.mark.parametrize("file_format", ["csv", "parquet"])
+def test_resume_reruns_only_failed_chunks(tmp_path, file_format):
+    fetch = Fetch(fail={3})
+    with pytest.raises(RuntimeError, match="part_1"):
+        ExtractionJob(tmp_path, fetch, CHUNKS, file_format=file_format).run()
+    assert fetch.calls == [(1, 2), (3,), (4, 5)]
+    assert not (tmp_path / f"part_1.{file_format}").exists()
+    assert not list(tmp_path.glob(".*.tmp"))
+
+    fetch = Fetch()
+    job = ExtractionJob(tmp_path, fetch, CHUNKS, file_format=file_format)
+    status = job.run()
+    assert fetch.calls == [(3,)]
+    assert job.extracted == {"part_1"}
+    assert status["status"].tolist() == ["done"] * 3
+    assert status["rows"].tolist() == [2, 1, 2]
+    assert status["extracted"].tolist() == [False, True, False]
+
+    assert ExtractionJob(tmp_path, fetch, CHUNKS, file_format=file_format).run()["extracted"].tolist() == [False] * 3
+    assert fetch.calls == [(3,)]
+
+
+def test_changed_params_or_file_reruns_chunk(tmp_path):
+    ExtractionJob(tmp_path, Fetch(), CHUNKS).run()
+
+    fetch = Fetch()
+    chunks = {**CHUNKS, "part_2": {"ids": [4, 5, 6], "start": "2020-01-01"}}
+    ExtractionJob(tmp_path, fetch, chunks).run()
+    assert fetch.calls == [(4, 5, 6)]
+
+    (tmp_path / "part_0.csv").write_text("companyid,date\n")
+    fetch = Fetch()
+    ExtractionJob(tmp_path, fetch, chunks).run()
+    assert fetch.calls == [(1, 2)]
+    assert pd.read_csv(tmp_path / "part_0.csv")["companyid"].tolist() == [1, 2]
+
+
+def test_manifest_records_chunks(tmp_path):
+    ExtractionJob(tmp_path, Fetch(), CHUNKS).run()
+    manifest = json.loads((tmp_path / "manifest.json").read_text())["chunks"]
+    assert list(manifest) == list(CHUNKS)
+    assert manifest["part_2"]["params"] == {"ids": [4, 5], "start": "2020-01-01"}
+    assert manifest["part_2"]["file"] == "part_2.csv"
+
+
+def test_iterator_of_frames_is_written_as_one_file(tmp_path):
+    def fetch(ids):
+        for i in ids:
+            yield pd.DataFrame({"companyid": [i, i], "value": [0.5, 1.5]})
+
+    status = ExtractionJob(tmp_path, fetch, {"all": {"ids": [1, 2, 3]}}, file_format="parquet").run()
+    assert status.loc["all", "rows"] == 6
+    assert pq.read_table(tmp_path / "all.parquet").column("companyid").to_pylist() == [1, 1, 2, 2, 3, 3]
+
+
+def test_empty_frame_writes_header(tmp_path):
+    empty = pd.DataFrame({"companyid": pd.Series([], dtype="int64"), "value": pd.Series([], dtype="float64")})
+    ExtractionJob(tmp_path / "csv", lambda: empty, {"empty": {}}).run()
+    assert pd.read_csv(tmp_path / "csv" / "empty.csv").columns.tolist() == ["companyid", "value"]
+
+    status = ExtractionJob(tmp_path / "parquet", lambda: empty, {"empty": {}}, file_format="parquet").run()
+    assert status.loc["empty", "rows"] == 0
+    table = pq.read_table(tmp_path / "parquet" / "empty.parquet")
+    assert table.num_rows == 0 and table.column_names == ["companyid", "value"]
+
+
+@pytest.mark.parametrize("file_format", ["csv", "parquet"])
+def test_empty_iterator_is_done_with_zero_rows(tmp_path, file_format):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return iter([])
+
+    status = ExtractionJob(tmp_path, fetch, {"empty": {}}, file_format=file_format).run()
+    assert status.loc["empty", "status"] == "done"
+    assert status.loc["empty", "rows"] == 0
+    assert (tmp_path / f"empty.{file_format}").stat().st_size == 0
+
+    ExtractionJob(tmp_path, fetch, {"empty": {}}, file_format=file_format).run()
+    assert len(calls) == 1
@@ -0,0 +1,119 @@
+from pathlib import Path
+
+import pytest
+
+from common.utils.pipeline import Pipeline, Step
+
+EXTRACT = """\
+from helper import first_line
+
+with open("data/source.txt") as f:
+    text = f.read()
+with open("data/extracted.txt", "w") as f:
+    f.write(first_line(text))
+"""
+
+HELPER = """\
+def first_line(text):
+    return text.splitlines()[0]
+"""
+
+
+def transform(suffix):
+    text = Path("data/extracted.txt").read_text()
+    Path("data/transformed.txt").write_text(text + suffix)
+
+
+def fail():
+    raise ValueError("broken")
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # scripts and the modules they import are resolved relative to the current directory
+    monkeypatch.chdir(tmp_path)
+    Path("data").mkdir()
+    Path("data/source.txt").write_text("a\nb\n")
+    Path("extract.py").write_text(EXTRACT)
+    Path("helper.py").write_text(HELPER)
+    return tmp_path
+
+
+def pipeline(suffix="!", state_dir=".state"):
+    return Pipeline("test", [
+        Step("transform", transform, inputs=["data/extracted.txt"], outputs=["data/transformed.txt"],
+             params={"suffix": suffix}),
+        Step("extract", "extract.py", inputs=["data/source.txt"], outputs=["data/extracted.txt"]),
+    ], state_dir=state_dir)
+
+
+def statuses(report):
+    return {name: (row["status"], row["reason"].split(":")[0]) for name, row in report.iterrows()}
+
+
+def test_runs_in_dependency_order_then_skips(workdir):
+    report = pipeline().run()
+    assert statuses(report) == {"transform": ("ran", "never ran"), "extract": ("ran", "never ran")}
+    assert Path("data/transformed.txt").read_text() == "a!"
+
+    assert statuses(pipeline().run()) == {"transform": ("skipped", "up to date"), "extract": ("skipped", "up to date")}
+
+
+def test_input_change_reruns_downstream(workdir):
+    pipeline().run()
+    Path("data/source.txt").write_text("c\nb\n")
+    assert statuses(pipeline().run()) == {"transform": ("ran", "inputs changed"), "extract": ("ran", "inputs changed")}
+    assert Path("data/transformed.txt").read_text() == "c!"
+
+
+def test_identical_upstream_output_skips_downstream(workdir):
+    pipeline().run()
+    # only the first line is extracted, so the extracted file does not change
+    Path("data/source.txt").write_text("a\nz\n")
+    assert statuses(pipeline().run()) == {"transform": ("skipped", "up to date"), "extract": ("ran", "inputs changed")}
+
+
+def test_code_change_reruns(workdir):
+    pipeline().run()
+    Path("extract.py").write_text(EXTRACT + "\n# reformatted\n")
+    assert statuses(pipeline().run())["extract"] == ("ran", "code changed")
+
+
+def test_imported_module_change_reruns(workdir):
+    pipeline().run()
+    Path("helper.py").write_text(HELPER.replace("[0]", "[-1]"))
+    assert statuses(pipeline().run()) == {"transform": ("ran", "inputs changed"), "extract": ("ran", "code changed")}
+    assert Path("data/transformed.txt").read_text() == "b!"
+
+
+def test_params_change_reruns(workdir):
+    pipeline().run()
+    assert statuses(pipeline(suffix="?").run()) == {"transform": ("ran", "params changed"),
+                                                     "extract": ("skipped", "up to date")}
+    assert Path("data/transformed.txt").read_text() == "a?"
+
+
+def test_missing_output_reruns(workdir):
+    pipeline().run()
+    Path("data/transformed.txt").unlink()
+    assert statuses(pipeline().run())["transform"] == ("ran", "outputs missing")
+
+
+def test_force_and_targets(workdir):
+    pipeline().run()
+    assert statuses(pipeline().run(force=["transform"])) == {"transform": ("ran", "forced"),
+                                                              "extract": ("skipped", "up to date")}
+    assert statuses(pipeline().run(targets=["extract"], force=True)) == {"extract": ("ran", "forced")}
+
+
+def test_failed_step_blocks_downstream(workdir):
+    steps = [
+        Step("extract", fail, outputs=["data/extracted.txt"]),
+        Step("transform", transform, inputs=["data/extracted.txt"], outputs=["data/transformed.txt"],
+             params={"suffix": "!"}),
+    ]
+    with pytest.raises(RuntimeError, match="extract"):
+        Pipeline("test", steps, state_dir=".state").run()
+    assert not Path("data/transformed.txt").exists()
+    # the failed step was not recorded as done, so the next run tries it again
+    assert statuses(pipeline().run())["extract"] == ("ran", "never ran")
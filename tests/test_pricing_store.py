@@ -0,0 +1,111 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from common.database.db_task_manager import TaskManagerRepository
+from common.database.pricing_store import PricingStore, merge_intervals, missing_intervals, remove_interval
+from common.database.query_cache import QueryCache
+from conftest import write_factors, write_prices
+
+
+def d(day):
+    return date(2020, 1, day)
+
+
+def test_merge_intervals_joins_adjacent_and_overlapping():
+    assert merge_intervals([(d(5), d(6)), (d(1), d(3)), (d(4), d(4)), (d(10), d(12)), (d(11), d(20))]) == \
+        [(d(1), d(6)), (d(10), d(20))]
+
+
+def test_missing_intervals():
+    covered = [(d(3), d(5)), (d(10), d(12))]
+    assert missing_intervals(covered, d(1), d(15)) == [(d(1), d(2)), (d(6), d(9)), (d(13), d(15))]
+    assert missing_intervals(covered, d(3), d(5)) == []
+    assert missing_intervals([], d(1), d(2)) == [(d(1), d(2))]
+
+
+def test_remove_interval():
+    assert remove_interval([(d(1), d(10))], d(4), d(6)) == [(d(1), d(3)), (d(7), d(10))]
+    assert remove_interval([(d(1), d(10))], d(1), d(10)) == []
+
+
+class CountingDatabase:
+    """Wraps a database and records the parameters of every query that reaches it."""
+
+    def __init__(self, database):
+        self.database = database
+        self.params = []
+
+    def query_all(self, query, params=(), dtypes=None):
+        self.params.append(params)
+        return self.database.query_all(query, params, dtypes)
+
+
+@pytest.fixture
+def repository(database, tmp_path):
+    # a cached repository: the store has to bypass the cache to see database changes
+    return TaskManagerRepository(CountingDatabase(database), cache=QueryCache(tmp_path / "cache"))
+
+
+def test_sync_fetches_only_gaps(repository, tmp_path):
+    store = PricingStore(tmp_path / "store")
+    assert store.sync(repository, "2020-01-01", "2020-01-10", [1, 2]) == 20
+    assert store.missing("2020-01-01", "2020-01-10", [1, 2]) == {}
+    assert store.missing("2020-01-05", "2020-01-12", [1, 3]) == {(d(11), d(12)): [1], (d(5), d(12)): [3]}
+
+    repository.database.params.clear()
+    assert store.sync(repository, "2020-01-08", "2020-01-12", [1, 2]) == 4
+    price_params = [params for params in repository.database.params if len(params) == 3 and params[1] < params[2]]
+    assert price_params == [([1, 2], d(11), d(12))]
+
+    # coverage survives a new store object
+    assert PricingStore(tmp_path / "store").missing("2020-01-01", "2020-01-12", [1, 2]) == {}
+
+
+def test_load_adjusts_for_dividends(repository, tmp_path):
+    store = PricingStore(tmp_path / "store")
+    store.sync(repository, "2020-01-03", "2020-01-06", [1, 2])
+
+    prices = store.load("2020-01-03", "2020-01-06", [1, 2])
+    assert prices["pricedate"].is_monotonic_increasing
+    first = prices[prices["tradingitemid"] == 100].set_index("pricedate")["divadjclose"]
+    assert first.tolist() == [5.0, 5.0, 10.0, 10.0]
+    assert (prices.loc[prices["tradingitemid"] == 200, "divadjfactor"] == 1.0).all()
+
+    assert store.load("2020-01-03", "2020-01-03", [1], columns=["pricedate", "divadjclose"]).columns.tolist() == \
+        ["pricedate", "divadjclose"]
+    assert store.load("2020-01-03", "2020-01-03", [1], columns=["priceclose"])["priceclose"].tolist() == [10.0]
+
+
+def test_new_dividends_readjust_stored_prices_despite_the_cache(repository, snapshot_dir, tmp_path):
+    store = PricingStore(tmp_path / "store")
+    store.sync(repository, "2020-01-01", "2020-01-10", [1])
+    assert store.load("2020-01-06", "2020-01-06", [1])["divadjfactor"].tolist() == [1.0]
+
+    write_factors(snapshot_dir, [(100, "2019-01-01", "2020-01-04", 0.5), (100, "2020-01-05", "2020-01-07", 0.8),
+                                 (100, "2020-01-08", None, 1.0)])
+    # the window is already covered, so only the factors are fetched again
+    assert store.sync(repository, "2020-01-01", "2020-01-10", [1]) == 0
+    assert store.load("2020-01-06", "2020-01-06", [1])["divadjfactor"].tolist() == [0.8]
+
+
+def test_refresh_refetches_despite_the_cache(repository, snapshot_dir, tmp_path):
+    store = PricingStore(tmp_path / "store")
+    store.sync(repository, "2020-01-01", "2020-01-10", [1])
+    write_prices(snapshot_dir, priceclose=12.0)
+
+    assert store.sync(repository, "2020-01-01", "2020-01-10", [1]) == 0
+    assert store.load("2020-01-09", "2020-01-09", [1])["priceclose"].tolist() == [10.0]
+    # the same query as the first sync, which the cache still holds
+    assert store.sync(repository, "2020-01-01", "2020-01-10", [1], refresh=True) == 10
+    assert store.load("2020-01-09", "2020-01-09", [1])["priceclose"].tolist() == [12.0]
+
+
+def test_sync_hist_miadj_pricing_matches_the_database(repository, tmp_path):
+    store = PricingStore(tmp_path / "store")
+    synced = repository.sync_hist_miadj_pricing("2020-01-02", "2020-01-08", [1, 2], store)
+    direct = repository.get_hist_miadj_pricing("2020-01-02", "2020-01-08", [1, 2])
+    key = ["pricedate", "tradingitemid"]
+    pd.testing.assert_frame_equal(synced.sort_values(key, ignore_index=True)[direct.columns],
+                                  direct.sort_values(key, ignore_index=True), check_dtype=False)
@@ -0,0 +1,150 @@
+import os
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.database.db_task_manager import TaskManagerRepository
+from common.database.query_cache import QueryCache, cache_key, normalize_query
+
+QUERY = "SELECT * FROM ciqcompany WHERE companyid = ANY(%s)"
+
+
+def frame(n=3):
+    return pd.DataFrame({"companyid": range(n), "name": [f"company {i}" for i in range(n)]})
+
+
+def test_normalize_query_ignores_formatting():
+    assert normalize_query("SELECT *\n  FROM t -- all rows\n WHERE a = %s;") == "SELECT * FROM t WHERE a = %s"
+    assert cache_key("SELECT 1", ()) == cache_key("  SELECT\t1 ;", ())
+
+
+def test_cache_key_normalizes_params():
+    assert cache_key(QUERY, ([np.int64(1), 2],)) == cache_key(QUERY, ([1, 2],))
+    assert cache_key(QUERY, (date(2020, 1, 1),)) == cache_key(QUERY, ("2020-01-01",))
+    assert cache_key(QUERY, ([1, 2],)) != cache_key(QUERY, ([2, 1],))
+    assert cache_key(QUERY, None) == cache_key(QUERY, ())
+
+
+def test_memory_hit_returns_copies(tmp_path):
+    cache = QueryCache(tmp_path)
+    assert cache.get(QUERY, ([1],)) is None
+    cache.put(QUERY, ([1],), frame())
+
+    cached = cache.get(QUERY, ([1],))
+    pd.testing.assert_frame_equal(cached, frame())
+    cached.loc[0, "name"] = "changed"
+    assert cache.get(QUERY, ([1],)).loc[0, "name"] == "company 0"
+    assert cache.stats()["memory_hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    QueryCache(tmp_path).put(QUERY, ([1],), frame())
+    cache = QueryCache(tmp_path)
+    pd.testing.assert_frame_equal(cache.get(QUERY, ([1],)), frame())
+    assert cache.stats()["disk_hits"] == 1
+    # the disk hit is promoted to memory
+    cache.get(QUERY, ([1],))
+    assert cache.stats()["memory_hits"] == 1
+
+
+def test_memory_only(tmp_path):
+    cache = QueryCache(cache_dir=None)
+    cache.put(QUERY, (), frame())
+    assert cache.get(QUERY, ()) is not None
+    assert not list(tmp_path.iterdir())
+
+
+def test_expired_disk_entry_is_a_miss(tmp_path):
+    QueryCache(tmp_path).put(QUERY, (), frame())
+    path = next(tmp_path.glob("*/*.parquet"))
+    old = time.time() - 3600
+    os.utime(path, (old, old))
+
+    assert QueryCache(tmp_path, ttl=60).get(QUERY, ()) is None
+    assert not path.exists()
+
+
+def test_memory_budget_evicts_least_recently_used(tmp_path):
+    nbytes = int(frame().memory_usage(deep=True).sum())
+    cache = QueryCache(cache_dir=None, max_memory_bytes=2 * nbytes)
+    cache.put(QUERY, (1,), frame())
+    cache.put(QUERY, (2,), frame())
+    cache.get(QUERY, (1,))
+    cache.put(QUERY, (3,), frame())
+
+    assert cache.get(QUERY, (2,)) is None
+    assert cache.get(QUERY, (1,)) is not None
+    assert cache.stats()["memory_entries"] == 2
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_budget_evicts_entries(tmp_path):
+    cache = QueryCache(tmp_path, max_memory_bytes=0, max_disk_bytes=0)
+    cache.put(QUERY, (1,), frame())
+    assert not list(tmp_path.glob("*/*.parquet"))
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate(tmp_path):
+    cache = QueryCache(tmp_path)
+    cache.put(QUERY, (1,), frame())
+    cache.put(QUERY, (2,), frame())
+
+    cache.invalidate(QUERY, (1,))
+    assert cache.get(QUERY, (1,)) is None
+    assert cache.get(QUERY, (2,)) is not None
+
+    cache.invalidate()
+    assert cache.get(QUERY, (2,)) is None
+    assert cache.stats()["memory_bytes"] == 0
+    assert not list(tmp_path.glob("*/*.parquet"))
+
+
+def test_get_or_compute_computes_once(tmp_path):
+    cache = QueryCache(tmp_path)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return frame()
+
+    first = cache.get_or_compute(QUERY, (1,), compute)
+    first.loc[0, "name"] = "changed"
+    pd.testing.assert_frame_equal(cache.get_or_compute(QUERY, (1,), compute), frame())
+    assert len(calls) == 1
+
+
+class CountingDatabase:
+    """Database stand-in counting the queries that reach it."""
+
+    def __init__(self):
+        self.queries = []
+
+    def query_all(self, query, params=(), dtypes=None):
+        self.queries.append(params)
+        return frame()
+
+
+def test_repository_serves_repeated_pulls_from_the_cache(tmp_path):
+    database = CountingDatabase()
+    repository = TaskManagerRepository(database, cache=QueryCache(tmp_path))
+    pd.testing.assert_frame_equal(repository._fetch(QUERY, ([1, 2],)), frame())
+    pd.testing.assert_frame_equal(repository._fetch(QUERY, ([1, 2],)), frame())
+    assert database.queries == [([1, 2],)]
+
+    repository._fetch(QUERY, ([3],))
+    assert database.queries == [([1, 2],), ([3],)]
+
+
+def test_sharded_result_is_cached_under_the_unsharded_params(tmp_path):
+    database = CountingDatabase()
+    repository = TaskManagerRepository(database, shard_size=2, cache=QueryCache(tmp_path))
+    for _ in range(2):
+        repository._fetch_sharded(QUERY, lambda ids, start, end: (ids,), [1, 2, 3])
+    # shards run concurrently, so they reach the database in any order
+    assert sorted(database.queries) == [([1, 2],), ([3],)]
+    assert repository.cache.get(QUERY, ([1, 2, 3],)) is not None
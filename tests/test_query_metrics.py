@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+from common.database.db_task_manager import TaskManagerRepository
+from common.database.query_metrics import QueryMetricsCollector, Stopwatch, current_label, fingerprint, labelled
+
+
+def test_fingerprint_ignores_literals_comments_and_whitespace():
+    query = "SELECT * FROM t WHERE id IN (1, 2, 3) AND d = '2020-01-01' -- daily\n LIMIT 10"
+    assert fingerprint(query) == fingerprint("select *  from t\nwhere id in (4) and d = '2021-12-31' limit 5")
+    assert fingerprint(query) != fingerprint("SELECT * FROM u WHERE id IN (1)")
+    assert len(fingerprint(query)) == 12
+
+
+def test_collector_records_and_summarizes():
+    collector = QueryMetricsCollector()
+    collector.record("SELECT 1", execute_s=1.0, fetch_s=0.5, build_s=0.25, rows=10, nbytes=80)
+    collector.record("SELECT 2", execute_s=0.5, rows=5, nbytes=40)
+
+    records = collector.records()
+    assert records["total_s"].tolist() == [1.75, 0.5]
+    assert "explain" not in records.columns
+
+    summary = collector.summary()
+    assert summary.index.tolist() == ["<unlabelled>"]
+    assert summary.loc["<unlabelled>", ["queries", "rows", "bytes"]].tolist() == [2, 15, 120]
+    assert summary.loc["<unlabelled>", "max_s"] == 1.75
+
+    collector.reset()
+    assert collector.records().empty
+
+
+def test_collector_keeps_the_latest_queries():
+    collector = QueryMetricsCollector(keep_queries=2)
+    for i in range(3):
+        collector.record(f"SELECT {i}", rows=i)
+    assert collector.records()["rows"].tolist() == [1, 2]
+
+
+def test_slow_query_log(tmp_path):
+    log_path = tmp_path / "slow.log"
+    collector = QueryMetricsCollector(slow_query_seconds=1.0, explain_seconds=5.0, slow_query_log=str(log_path))
+    collector.record("SELECT fast", execute_s=0.1)
+    collector.record("SELECT slow", execute_s=2.0, rows=3)
+    collector.record("SELECT explained", execute_s=0.1, explain=["Seq Scan"])
+
+    entries = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert [entry["query"] for entry in entries] == ["SELECT slow", "SELECT explained"]
+    assert entries[0]["rows"] == 3 and "timestamp" in entries[0]
+    assert entries[1]["explain"] == ["Seq Scan"]
+    assert not collector.should_explain(4.9) and collector.should_explain(5.0)
+    assert not QueryMetricsCollector().should_explain(100)
+
+
+def test_labelled_covers_functions_generators_and_coroutines():
+    @labelled
+    def function():
+        return current_label()
+
+    @labelled
+    def generator():
+        yield current_label()
+        yield current_label()
+
+    @labelled
+    async def coroutine():
+        await asyncio.sleep(0)
+        return current_label()
+
+    @labelled
+    async def async_generator():
+        await asyncio.sleep(0)
+        yield current_label()
+
+    async def consume():
+        return await coroutine(), [label async for label in async_generator()]
+
+    assert function() == "function"
+    labels = generator()
+    # the label is only set while the generator runs
+    assert current_label() is None
+    assert list(labels) == ["generator", "generator"]
+    assert asyncio.run(consume()) == ("coroutine", ["async_generator"])
+    assert current_label() is None
+
+
+def test_stopwatch_laps():
+    stopwatch = Stopwatch()
+    first, second = stopwatch.lap(), stopwatch.lap()
+    assert first >= 0 and second >= 0
+
+
+def test_repository_queries_are_labelled(database):
+    repository = TaskManagerRepository(database, shard_size=1)
+    repository.get_hist_miadj_pricing("2020-01-02", "2020-01-03", [1, 2])
+    database.query_all("SELECT 1")
+
+    summary = database.metrics.summary()
+    # one query per company shard, labelled although the shards run on worker threads
+    assert summary.loc["get_hist_miadj_pricing", "queries"] == 2
+    assert summary.loc["get_hist_miadj_pricing", "rows"] == 4
+    assert summary.loc["<unlabelled>", "queries"] == 1
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from common.utils.data_conversion.schema_optimizer import SchemaRegistry, infer_dtypes, int_dtype, optimize_frame, widen
+
+
+def test_int_dtype():
+    assert int_dtype(0, 127) == "int8"
+    assert int_dtype(-129, 0) == "int16"
+    assert int_dtype(0, 40_000) == "int32"
+    assert int_dtype(0, 2 ** 31) == "int64"
+
+
+def test_widen_integers_take_the_wider_width():
+    assert widen("int16", "int8") == "int16"
+    assert widen("int8", "int32") == "int32"
+
+
+def test_widen_keeps_float32_and_category():
+    assert widen("float32", "int16") == "float32"
+    assert widen("category", "category") == "category"
+    assert widen("category", "string") == "category"
+    assert widen("category", "object") == "category"
+
+
+def test_widen_otherwise_takes_the_inferred_dtype():
+    assert widen("int8", "float64") == "float64"
+    assert widen("category", "int32") == "int32"
+
+
+def test_infer_dtypes():
+    df = pd.DataFrame({
+        "companyid": [1, 2, 300, 4],
+        "big": np.array([1, 2, 3, 2 ** 40], dtype="int64"),
+        "nullable": pd.array([1, None, 3, 4], dtype="Int64"),
+        "value": [0.1, 0.2, 0.3, 0.4],
+        "currency": ["USD", "EUR", "USD", "USD"],
+        "name": ["a", "b", "c", "d"],
+        "flag": [True, False, True, True],
+    })
+    assert infer_dtypes(df) == {"companyid": "int16", "big": "int64", "currency": "category"}
+
+
+def test_infer_dtypes_threshold_and_float32():
+    df = pd.DataFrame({"name": ["a", "b", "c", "a"], "value": [0.1, 0.2, 0.3, 0.4], "other": [1.0, 2.0, 3.0, 4.0]})
+    assert infer_dtypes(df, categorical_threshold=0.75) == {"name": "category"}
+    assert infer_dtypes(df, float32=True) == {"value": "float32", "other": "float32"}
+    assert infer_dtypes(df, float32=["value"]) == {"value": "float32"}
+
+
+def test_infer_dtypes_skips_mixed_object_columns():
+    df = pd.DataFrame({"mixed": ["a", 1, "a", "a"]})
+    assert infer_dtypes(df) == {}
+
+
+def test_registry_widens_across_loads(tmp_path):
+    registry = SchemaRegistry(tmp_path / "registry.json")
+    first = optimize_frame(pd.DataFrame({"id": [1, 2], "value": [0.5, 1.5]}), "prices", registry, float32=True)
+    assert first.dtypes.astype(str).to_dict() == {"id": "int8", "value": "float32"}
+
+    second = optimize_frame(pd.DataFrame({"id": [1, 1000], "value": [0.5, 1.5]}), "prices", registry)
+    assert second.dtypes.astype(str).to_dict() == {"id": "int16", "value": "float32"}
+
+    third = optimize_frame(pd.DataFrame({"id": [1, 2]}), "prices", SchemaRegistry(tmp_path / "registry.json"))
+    assert third["id"].dtype == "int16"
+    assert SchemaRegistry(tmp_path / "registry.json").get("prices") == {"id": "int16", "value": "float32"}
@@ -0,0 +1,49 @@
+from datetime import date
+
+import pandas as pd
+
+from common.database.sharding import run_sharded, shard_date_range, shard_ids
+
+
+def test_shard_ids_dedups_and_keeps_order():
+    assert shard_ids([3, 1, 3, 2, 1, 5], 2) == [[3, 1], [2, 5]]
+
+
+def test_shard_ids_casts_to_int():
+    assert shard_ids(pd.Series([1.0, 2.0]), 1) == [[1], [2]]
+
+
+def test_shard_ids_single_shard():
+    assert shard_ids([1, 2, 3], 3) == [[1, 2, 3]]
+    assert shard_ids([1, 2, 3], 10) == [[1, 2, 3]]
+    assert shard_ids([1, 2, 3], None) == [[1, 2, 3]]
+
+
+def test_shard_date_range_without_freq():
+    assert shard_date_range("2020-03-15", "2022-06-30") == [(date(2020, 3, 15), date(2022, 6, 30))]
+
+
+def test_shard_date_range_yearly_windows_are_contiguous():
+    windows = shard_date_range("2020-03-15", "2022-06-30", freq="YS")
+    assert windows == [
+        (date(2020, 3, 15), date(2020, 12, 31)),
+        (date(2021, 1, 1), date(2021, 12, 31)),
+        (date(2022, 1, 1), date(2022, 6, 30)),
+    ]
+
+
+def test_shard_date_range_starting_on_boundary():
+    assert shard_date_range("2021-01-01", "2021-06-30", freq="QS") == [
+        (date(2021, 1, 1), date(2021, 3, 31)),
+        (date(2021, 4, 1), date(2021, 6, 30)),
+    ]
+
+
+def test_shard_date_range_single_day():
+    assert shard_date_range("2021-05-05", "2021-05-05", freq="YS") == [(date(2021, 5, 5), date(2021, 5, 5))]
+
+
+def test_run_sharded_keeps_shard_order():
+    shards = shard_ids(range(10), 3)
+    result = run_sharded(lambda ids: pd.DataFrame({"id": ids}), shards, max_workers=4)
+    assert result["id"].tolist() == list(range(10))
@@ -0,0 +1,35 @@
+from common.database.sql_utils import describe_params, numbered_placeholders, qmark_placeholders, statement_name
+
+
+def test_numbered_placeholders():
+    sql, count = numbered_placeholders("SELECT * FROM t WHERE a = %s AND b = ANY(%s)")
+    assert sql == "SELECT * FROM t WHERE a = $1 AND b = ANY($2)"
+    assert count == 2
+
+
+def test_numbered_placeholders_keeps_escaped_percent():
+    sql, count = numbered_placeholders("SELECT * FROM t WHERE name LIKE 'A%%' AND id = %s")
+    assert sql == "SELECT * FROM t WHERE name LIKE 'A%' AND id = $1"
+    assert count == 1
+
+
+def test_numbered_placeholders_without_parameters():
+    assert numbered_placeholders("SELECT 1") == ("SELECT 1", 0)
+
+
+def test_qmark_placeholders():
+    assert qmark_placeholders("SELECT * FROM t WHERE a = %s AND b LIKE '%%x' AND c = %s") == \
+        "SELECT * FROM t WHERE a = ? AND b LIKE '%x' AND c = ?"
+
+
+def test_statement_name_is_stable_per_query():
+    name = statement_name("SELECT 1")
+    assert name == statement_name("SELECT 1")
+    assert name != statement_name("SELECT 2")
+    assert name.startswith("fr_") and len(name) == len("fr_") + 16
+    assert statement_name("SELECT 1", prefix="x").startswith("x_")
+
+
+def test_describe_params_summarizes_lists():
+    assert describe_params(["2020-01-01", [1, 2, 3], (4, 5), 7]) == "('2020-01-01', <3 values>, <2 values>, 7)"
+    assert describe_params(None) == "()"
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from research.ml_forecast_estimate_error.src import universe_creater
+from research.ml_forecast_estimate_error.src.universe_creater import KEYS, PANEL_ITEMS, build_panel, load_and_process_data
+
+COMPANIES = [30, 10, 20]
+FISCALYEARS = range(2019, 2022)
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Write a small random csv for every panel item, with duplicates and keys outside the grid."""
+    rng = np.random.default_rng(0)
+    for filename, date_col, _, _ in PANEL_ITEMS:
+        n = 40
+        df = pd.DataFrame({
+            "companyid": rng.choice(COMPANIES + [99], n),
+            "fiscalyear": rng.choice([2018, 2019, 2020, 2021], n),
+            "fiscalquarter": rng.choice([1, 2, 3, 4], n),
+            "dataitemvalue": rng.normal(size=n).round(3),
+            date_col: pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 1000, n), unit="h"),
+        })
+        df.loc[rng.random(n) < 0.1, "dataitemvalue"] = np.nan
+        df.to_csv(tmp_path / filename)
+    monkeypatch.setattr(universe_creater, "ADDR", f"{tmp_path}/")
+    return tmp_path
+
+
+def merge_on_grid(companies, fiscalyears):
+    """Reference: the previous implementation, left-merging every item onto the full grid."""
+    idx = pd.MultiIndex.from_product([companies, fiscalyears, range(1, 5)], names=KEYS)
+    universe_df = pd.DataFrame(index=idx).reset_index()
+    for filename, date_col, new_col_name, add_date in PANEL_ITEMS:
+        item = load_and_process_data(filename, date_col, new_col_name, add_date=add_date)
+        universe_df = universe_df.merge(item, on=KEYS, how="left")
+    return universe_df[universe_df["EPS_actual_et"].notna() | universe_df["EPSNormalized_actual_et"].notna()
+                       | universe_df["revenue_actual_et"].notna()]
+
+
+def test_build_panel_matches_merge_on_grid(data_dir):
+    expected = merge_on_grid(COMPANIES, FISCALYEARS)
+    panel = build_panel(COMPANIES, FISCALYEARS)
+
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(panel, expected)
+
+
+def test_build_panel_drops_keys_outside_the_grid(data_dir):
+    panel = build_panel(COMPANIES, FISCALYEARS)
+    assert set(panel["companyid"]) <= set(COMPANIES)
+    assert set(panel["fiscalyear"]) <= set(FISCALYEARS)
+    assert not panel.duplicated(KEYS).any()